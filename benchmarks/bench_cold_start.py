@@ -0,0 +1,81 @@
+"""
+Cold-start time of every framework/cli.py subcommand.
+
+Each command is started in a fresh interpreter with `--help`, which imports the stage module
+and parses its arguments. The heavy dependencies that were loaded on the way are listed from
+`python -X importtime`.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "framework"))
+
+from cli import COMMANDS
+
+HEAVY_MODULES = ("torch", "sentence_transformers", "pandas", "sglang", "openai", "pyarrow", "sklearn", "requests")
+
+
+def run_command(command, importtime=False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + \
+        [os.path.join(ROOT_DIR, "framework", "cli.py"), command, "--help"]
+    start = time.perf_counter()
+    result = subprocess.run(cmd, cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return time.perf_counter() - start, result
+
+
+def interpreter_start():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"])
+    return time.perf_counter() - start
+
+
+def heavy_imports(stderr):
+    loaded = set()
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            name = line.rsplit("|", 1)[1].strip().split(".")[0]
+            if name in HEAVY_MODULES:
+                loaded.add(name)
+    return sorted(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time of the framework CLI subcommands.")
+    parser.add_argument('--repeats', type=int, default=5, help="Fresh interpreter starts per command")
+    parser.add_argument('--commands', type=str, nargs='*', default=list(COMMANDS), help="Commands to measure")
+    parser.add_argument('--output_file', type=str, default=None, help="Path to save the results as JSON")
+    args = parser.parse_args()
+
+    baseline = statistics.median(interpreter_start() for _ in range(args.repeats))
+    results = {}
+    print(f"{'command':<22}{'median (s)':>12}{'min (s)':>10}  heavy modules loaded")
+    for command in args.commands:
+        times = []
+        for _ in range(args.repeats):
+            elapsed, result = run_command(command)
+            if result.returncode != 0:
+                print(f"{command}: failed\n{result.stderr}")
+                break
+            times.append(elapsed)
+        if not times:
+            continue
+        _, traced = run_command(command, importtime=True)
+        heavy = heavy_imports(traced.stderr)
+        results[command] = {"median": statistics.median(times), "min": min(times), "heavy_modules": heavy}
+        print(f"{command:<22}{results[command]['median']:>12.3f}{results[command]['min']:>10.3f}  {', '.join(heavy) or '-'}")
+    print(f"(bare interpreter start: {baseline:.3f}s)")
+
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
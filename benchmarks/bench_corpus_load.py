@@ -0,0 +1,85 @@
+"""
+Compare corpus load time of the TSV path with the Parquet and Arrow IPC paths.
+
+For each format the benchmark times what retrival.py (IR corpus build) and
+rerank_generation.py (id -> content map) do when loading the corpus.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT_DIR, os.path.join(ROOT_DIR, "framework")]
+
+import pandas as pd
+from columnar import corpus_columns, write_columnar, read_columnar
+from retrival import process_retrieval_document, process_retrieval_columns
+from rerank_generation import read_corpus_file
+
+def synthetic_corpus(n_docs):
+    ids = list(range(1, n_docs + 1))
+    contents = [
+        json.dumps({
+            "category_name": f"Category_{i % 49}",
+            "workflow_description": f"Workflow {i} fetches data from API {i % 997} and formats the result for the user. " * 3,
+        }, ensure_ascii=False)
+        for i in ids
+    ]
+    return ids, contents
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TSV vs columnar corpus loading.")
+    parser.add_argument('--n_docs', type=int, default=200000, help="Number of synthetic corpus documents.")
+    parser.add_argument('--repeat', type=int, default=3, help="Repetitions per measurement (best is reported).")
+    parser.add_argument('--output_file', type=str, default=None, help="Path to save the benchmark results.")
+    args = parser.parse_args()
+
+    ids, contents = synthetic_corpus(args.n_docs)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tsv_path = os.path.join(tmp_dir, "corpus.tsv")
+        pd.DataFrame({"wocid": ids, "workflow_content": contents}).to_csv(tsv_path, sep='\t', index=False)
+        columns = corpus_columns(ids, contents)
+        paths = {"tsv": tsv_path}
+        for fmt in ("parquet", "arrow"):
+            paths[fmt] = os.path.join(tmp_dir, f"corpus.{fmt}")
+            write_columnar(columns, paths[fmt])
+
+        results = {
+            "n_docs": args.n_docs,
+            "tsv": {
+                "retrieval_corpus_s": timed(lambda: process_retrieval_document(pd.read_csv(tsv_path, sep='\t')), args.repeat),
+                "rerank_corpus_s": timed(lambda: read_corpus_file(tsv_path), args.repeat),
+            },
+        }
+        for fmt in ("parquet", "arrow"):
+            path = paths[fmt]
+            results[fmt] = {
+                "retrieval_corpus_s": timed(lambda: process_retrieval_columns(
+                    read_columnar(path, columns=['id', 'category_name', 'description'])), args.repeat),
+                "rerank_corpus_s": timed(lambda: read_corpus_file(path), args.repeat),
+            }
+        for fmt, path in paths.items():
+            results[fmt]["file_mb"] = os.path.getsize(path) / (1 << 20)
+
+    print(json.dumps(results, indent=4))
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
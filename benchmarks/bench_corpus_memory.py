@@ -0,0 +1,93 @@
+"""
+Peak-RSS comparison of the dict-based corpus (content -> tool info) and the CorpusStore.
+
+Each variant runs in its own child process on the same synthetic corpus. corpus_rss_mb is the
+resident memory held by the built corpus; peak_rss_mb is the peak RSS of the whole process.
+"""
+
+import gc
+import os
+import sys
+import json
+import argparse
+import resource
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT_DIR, os.path.join(ROOT_DIR, "framework")]
+
+def legacy_process_retrieval_document(documents_df):
+    # The dict-of-strings layout that process_retrieval_document used before CorpusStore
+    ir_corpus = {}
+    corpus2tool = {}
+    for row in documents_df.itertuples():
+        doc = json.loads(row.workflow_content)
+        category = doc.get('category_name', '') or ''
+        description = doc.get('workflow_description', '') or ''
+        doc_content = f"{category}, {description}"
+        ir_corpus[row.wocid] = doc_content
+        corpus2tool[doc_content] = f"{category}\t{description}"
+    corpus_list = [ir_corpus[cid] for cid in ir_corpus]
+    return corpus_list, corpus2tool
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+
+
+def run_variant(variant, n_docs):
+    import pandas as pd
+    from retrival import process_retrieval_document
+
+    documents_df = pd.DataFrame({
+        "wocid": range(1, n_docs + 1),
+        "workflow_content": [
+            json.dumps({
+                "category_name": f"Category_{i % 49}",
+                "workflow_description": f"Workflow {i} fetches data from API {i % 997} and formats the result for the user.",
+            })
+            for i in range(1, n_docs + 1)
+        ],
+    })
+    gc.collect()
+    before = current_rss_mb()
+    corpus = legacy_process_retrieval_document(documents_df) if variant == "legacy" else process_retrieval_document(documents_df)
+    gc.collect()
+    retained = current_rss_mb() - before
+    print(json.dumps({"variant": variant, "n_docs": n_docs, "peak_rss_mb": peak_rss_mb(), "corpus_rss_mb": retained}))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark peak RSS of the retrieval corpus representation.")
+    parser.add_argument('--n_docs', type=int, default=1000000, help="Number of synthetic corpus documents.")
+    parser.add_argument('--variant', type=str, default=None, choices=["legacy", "store"], help=argparse.SUPPRESS)
+    parser.add_argument('--output_file', type=str, default=None, help="Path to save the benchmark results.")
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.n_docs)
+        return
+
+    results = {}
+    for variant in ("legacy", "store"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--variant", variant, "--n_docs", str(args.n_docs)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results[variant] = json.loads(output.strip().splitlines()[-1])
+    results["reduction"] = 1 - results["store"]["corpus_rss_mb"] / results["legacy"]["corpus_rss_mb"]
+
+    print(json.dumps(results, indent=4))
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Latency / accuracy trade-offs of the cross-encoder stage.
+
+Reports cross-encoder latency per query, top-1 accuracy before and after the cross-encoder,
+recall of the pruned short list, and for each skip margin the share of queries that would
+bypass the LLM together with the accuracy on those queries.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import defaultdict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT_DIR, os.path.join(ROOT_DIR, "framework")]
+
+from rerank_generation import read_query_file, read_corpus_file, read_top_file
+from cross_encoder_rerank import CrossEncoderReranker, prune, top1_margin
+
+def load_gold(qrels_file, qids):
+    if not qrels_file:
+        return {qid: {qid} for qid in qids}
+    gold = defaultdict(set)
+    with open(qrels_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            qid, _, docid, label = line.strip().split('\t')
+            if int(label) > 0:
+                gold[qid].add(docid)
+    return gold
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cross-encoder rerank stage.")
+    parser.add_argument('--query_file', type=str, required=True, help='Path to the query file')
+    parser.add_argument('--corpus_file', type=str, required=True, help='Path to the corpus file')
+    parser.add_argument('--top_file', type=str, required=True, help='Path to the top-k retrieval result file')
+    parser.add_argument('--qrels_file', type=str, default=None, help='Path to qrels.test.tsv (default: docid == qid)')
+    parser.add_argument('--model_path', type=str, required=True, help='Cross-encoder model')
+    parser.add_argument('--keep', type=int, nargs='+', default=[3, 5, 10], help='Short-list sizes to report recall for')
+    parser.add_argument('--margins', type=float, nargs='+', default=[0.5, 1.0, 2.0, 4.0], help='Skip margins to evaluate')
+    parser.add_argument('--batch_size', type=int, default=32, help='Cross-encoder batch size')
+    parser.add_argument('--limit', type=int, default=None, help='Only use the first N queries')
+    parser.add_argument('--output_file', type=str, default=None, help='Path to save the benchmark results')
+    args = parser.parse_args()
+
+    queries = read_query_file(args.query_file)
+    workflows = read_corpus_file(args.corpus_file)
+    tops = read_top_file(args.top_file)
+    qids = [qid for qid in queries if qid in tops][:args.limit]
+    gold = load_gold(args.qrels_file, qids)
+
+    reranker = CrossEncoderReranker(args.model_path, batch_size=args.batch_size)
+    candidates = {qid: [wocid for wocid in tops[qid] if wocid in workflows] for qid in qids}
+    start = time.perf_counter()
+    scores = reranker.score_batch([queries[qid] for qid in qids],
+                                  [[workflows[wocid] for wocid in candidates[qid]] for qid in qids])
+    seconds = time.perf_counter() - start
+
+    ranked = {}
+    for qid, query_scores in zip(qids, scores):
+        ranked[qid] = prune(candidates[qid], query_scores, len(query_scores))
+
+    n = max(len(qids), 1)
+    results = {
+        "queries": len(qids),
+        "cross_encoder_ms_per_query": 1000 * seconds / n,
+        "retrieval_top1_accuracy": sum(bool(candidates[qid]) and candidates[qid][0] in gold[qid] for qid in qids) / n,
+        "cross_encoder_top1_accuracy": sum(bool(ranked[qid][0]) and ranked[qid][0][0] in gold[qid] for qid in qids) / n,
+        "recall": {
+            str(keep): sum(any(wocid in gold[qid] for wocid in ranked[qid][0][:keep]) for qid in qids) / n
+            for keep in args.keep
+        },
+        "skip": {},
+    }
+    for margin in args.margins:
+        skipped = [qid for qid in qids if ranked[qid][0] and top1_margin(ranked[qid][1]) >= margin]
+        results["skip"][str(margin)] = {
+            "llm_calls_saved": len(skipped) / n,
+            "skipped_accuracy": (sum(ranked[qid][0][0] in gold[qid] for qid in skipped) / len(skipped)) if skipped else None,
+        }
+
+    print(json.dumps(results, indent=4))
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Load-test driver for the LLM stages.
+
+Sends stage-shaped requests (planning, rerank and judge chat completions, regex-constrained
+HTTP node generation) at increasing client concurrency and reports throughput, latency
+percentiles and status codes per level. By default it starts framework/mock_server.py
+in-process with the given latency, throughput and error settings, so it runs on CPU-only
+machines; --url points it at a running server instead.
+
+    python benchmarks/bench_llm_load.py --workload rerank --concurrency 1 4 16 64 \
+        --latency_dist lognormal --latency_mean 0.2 --latency_std 0.1 --tokens_per_second 2000
+
+With --adaptive, one more level is run through the LLM client's adaptive concurrency limiter
+(starting from --adaptive_initial) instead of a fixed concurrency, and the limit it settled
+at is reported next to the fixed levels.
+
+--length_spread gives the chat prompts lengths spread over 2**length_spread (like planning prompts
+that embed whole trajectories), and --schedule length sends them longest first in buckets of
+similar length, as the stages do; with --per_prompt_token_latency the mock server's latency
+follows the prompt length:
+
+    python benchmarks/bench_llm_load.py --workload planning --concurrency 16 --length_spread 8 \
+        --per_prompt_token_latency 0.0002 --max_concurrency 16 --schedule fifo length
+
+--prompts_file sends the prompts written by planning_prompt.py instead, e.g. to compare the planning
+throughput of the whole and the --compact trajectories.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import statistics
+from collections import Counter
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT_DIR, os.path.join(ROOT_DIR, "framework")]
+
+import requests
+from framework.mock_server import add_mock_server_args, server_from_args
+from framework.llm_client import AdaptiveConcurrencyLimiter, ResilientClient, RetryPolicy, LLMCallFailed, dispatch, \
+    estimate_tokens
+from framework.prompt_Template import workflow_Plan_Prompt
+from framework.planning import load_prompts
+from prompt_Template import json_regex
+from prompt_Evaluation import prompt_Consistency
+from rerank_Template import rerank_Template_for_SGLang_top10
+
+WORKLOADS = ("planning", "rerank", "evaluation", "node")
+
+
+def build_request(workload, i, length_spread=0, prompts=None):
+    """
+    Args:
+        length_spread (int): The variable part of the prompt is repeated up to 2**length_spread times.
+        prompts (list): Planning prompt inputs (planning_prompt.py output) used in turn as the user
+            message of the planning requests instead of the synthetic text.
+
+    Returns:
+        tuple: (path, JSON payload) shaped like the requests of the stage.
+    """
+    # Deterministic, skewed towards short prompts like the ToolBench trajectories
+    repeat = 2 ** int(length_spread * ((i * 2654435761) % 1000 / 1000) ** 2) if length_spread else 1
+    if workload == "planning":
+        user = prompts[i % len(prompts)] if prompts else \
+            f"Trajectory {i}: " + "search items, then get the details of the best match. " * repeat
+        messages = [{"role": "system", "content": workflow_Plan_Prompt}, {"role": "user", "content": user}]
+        return "/v1/chat/completions", {"model": "default", "messages": messages, "temperature": 0.6, "max_tokens": 4096}
+    if workload == "rerank":
+        workflows = {f"workflow_{k}": f"Workflow {k} for query {i}." for k in range(1, 11)}
+        prompt = rerank_Template_for_SGLang_top10.format(query=f"Query {i}: " + "find a recipe with chicken. " * repeat, **workflows)
+        messages = [{"role": "system", "content": ""}, {"role": "user", "content": prompt}]
+        return "/v1/chat/completions", {"model": "default", "messages": messages, "temperature": 0.0, "max_tokens": 1024}
+    if workload == "evaluation":
+        messages = [{"role": "system", "content": prompt_Consistency},
+                    {"role": "user", "content": f"Trajectory {i} and its workflow. " * repeat}]
+        return "/v1/chat/completions", {"model": "default", "messages": messages, "temperature": 0.0, "max_tokens": 1024}
+    return "/generate", {"text": f"Generate the HTTP node {i}.\nThe JSON output is:\n",
+                         "sampling_params": {"max_new_tokens": 2048, "regex": json_regex}}
+
+
+def send(session, url, request, timeout):
+    path, payload = request
+    start = time.perf_counter()
+    try:
+        status = session.post(url + path, json=payload, timeout=timeout).status_code
+    except requests.Timeout:
+        status = "timeout"
+    except requests.RequestException:
+        status = "connection_error"
+    return status, time.perf_counter() - start
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100)[p - 1]
+
+
+def request_length(request):
+    _, payload = request
+    return estimate_tokens(payload.get("messages") or payload.get("text"))
+
+
+def run_level(url, workload, concurrency, num_requests, timeout, length_spread=0, schedule="fifo", prompts=None):
+    local = threading.local()
+    sessions = []
+
+    def send_request(request):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+            sessions.append(local.session)
+        return send(local.session, url, request, timeout)
+
+    batch = [build_request(workload, i, length_spread, prompts) for i in range(num_requests)]
+    start = time.perf_counter()
+    results = [result for _, result, _ in dispatch(batch, send_request, max_workers=concurrency,
+                                                   length=request_length if schedule == "length" else None)]
+    elapsed = time.perf_counter() - start
+    for session in sessions:
+        session.close()
+
+    statuses = Counter(str(status) for status, _ in results)
+    latencies = [latency for status, latency in results if status == 200]
+    return {
+        "concurrency": concurrency,
+        "schedule": schedule,
+        "requests": num_requests,
+        "elapsed_s": elapsed,
+        "throughput_rps": statuses.get("200", 0) / elapsed,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "statuses": dict(statuses),
+    }
+
+
+def run_adaptive(url, workload, num_requests, timeout, mode, initial_limit, max_limit, length_spread=0, schedule="fifo",
+                 prompts=None):
+    """
+    Send the requests through a ResilientClient whose AdaptiveConcurrencyLimiter picks the concurrency.
+    """
+    limiter = AdaptiveConcurrencyLimiter(initial_limit, max_limit=max_limit, mode=mode)
+    client = ResilientClient("load_test", retry=RetryPolicy(max_attempts=1), limiter=limiter, schedule=schedule)
+    local = threading.local()
+    sessions = []
+    latencies = {}
+
+    def request(i):
+        path, payload = build_request(workload, i, length_spread, prompts)
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+            sessions.append(local.session)
+
+        def post(request_timeout):
+            start = time.perf_counter()
+            response = local.session.post(url + path, json=payload, timeout=min(timeout, request_timeout))
+            response.raise_for_status()
+            latencies[i] = time.perf_counter() - start
+        client.call(post, key=str(i))
+
+    limits = []
+    statuses = Counter()
+    start = time.perf_counter()
+    work = client.dispatch(range(num_requests), request, length=lambda i: request_length(build_request(workload, i, length_spread, prompts)))
+    for _, _, error in work:
+        if isinstance(error, LLMCallFailed):
+            cause = error.error
+            status = getattr(getattr(cause, "response", None), "status_code", None)
+            statuses[str(status) if status else type(cause).__name__] += 1
+        else:
+            statuses["200"] += 1
+        limits.append(limiter.limit)
+    elapsed = time.perf_counter() - start
+    for session in sessions:
+        session.close()
+
+    values = sorted(latencies.values())
+    return {
+        "concurrency": mode,
+        "schedule": schedule,
+        "requests": num_requests,
+        "elapsed_s": elapsed,
+        "throughput_rps": statuses.get("200", 0) / elapsed,
+        "p50_s": percentile(values, 50),
+        "p95_s": percentile(values, 95),
+        "p99_s": percentile(values, 99),
+        "statuses": dict(statuses),
+        "final_limit": limiter.limit,
+        "mean_limit": statistics.fmean(limits) if limits else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the LLM endpoints at increasing client concurrency.")
+    parser.add_argument('--url', type=str, default=None, help="Server to load; default: start the mock server in-process.")
+    parser.add_argument('--workload', type=str, default="rerank", choices=WORKLOADS, help="Stage whose requests are sent.")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64], help="Client concurrency levels.")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per concurrency level.")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Client timeout per request in seconds.")
+    parser.add_argument('--output_file', type=str, default=None, help="Path to save the results as JSON.")
+    parser.add_argument('--adaptive', type=str, default=None, choices=["gradient", "aimd"],
+                        help="Also run one level with the client's adaptive concurrency limiter in this mode.")
+    parser.add_argument('--adaptive_initial', type=int, default=8, help="Starting limit of the adaptive level.")
+    parser.add_argument('--adaptive_max', type=int, default=64, help="Upper bound of the adaptive limit.")
+    parser.add_argument('--length_spread', type=int, default=0, help="Spread the prompt lengths over 2**length_spread.")
+    parser.add_argument('--schedule', type=str, nargs='+', default=["fifo"], choices=["fifo", "length"],
+                        help="Request orders to run every level with.")
+    parser.add_argument('--prompts_file', type=str, default=None,
+                        help="planning_prompt.py output whose prompts are sent by the planning workload.")
+    add_mock_server_args(parser)
+    args = parser.parse_args()
+
+    prompts = list(load_prompts(args.prompts_file).values()) if args.prompts_file else None
+    server = None
+    if args.url is None:
+        server = server_from_args(args).start()
+    url = (args.url or server.url).rstrip("/")
+    try:
+        results = []
+        print(f"{'concurrency':>12}{'schedule':>10}{'total (s)':>11}{'req/s':>10}{'p50 (s)':>10}{'p95 (s)':>10}{'p99 (s)':>10}  statuses")
+        fmt = lambda value: f"{value:>10.3f}" if value is not None else f"{'-':>10}"
+        row = lambda result: (f"{result['concurrency']:>12}{result['schedule']:>10}{result['elapsed_s']:>11.2f}"
+                              f"{result['throughput_rps']:>10.1f}{fmt(result['p50_s'])}{fmt(result['p95_s'])}"
+                              f"{fmt(result['p99_s'])}  {json.dumps(result['statuses'])}")
+        for concurrency in args.concurrency:
+            for schedule in args.schedule:
+                result = run_level(url, args.workload, concurrency, args.requests, args.timeout, args.length_spread, schedule,
+                                   prompts)
+                results.append(result)
+                print(row(result))
+        if args.adaptive:
+            for schedule in args.schedule:
+                result = run_adaptive(url, args.workload, args.requests, args.timeout, args.adaptive,
+                                      args.adaptive_initial, args.adaptive_max, args.length_spread, schedule, prompts)
+                results.append(result)
+                print(f"{row(result)}  limit: mean {result['mean_limit']:.1f}, final {result['final_limit']:.1f}")
+    finally:
+        if server is not None:
+            server.stop()
+
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            json.dump({"workload": args.workload, "url": args.url or "in-process mock", "levels": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Micro-benchmarks of the CPU-bound framework functions on synthetic ToolBench-shaped fixtures.
+
+No GPU, model or server is needed. The fixtures are generated from a fixed seed, so two runs
+with the same --seed and --scale time the same inputs.
+
+    python benchmarks/bench_micro.py --output_file micro.json
+    python benchmarks/bench_micro.py --baseline micro_baseline.json --save_baseline   # store a baseline
+    python benchmarks/bench_micro.py --baseline micro_baseline.json                   # compare against it
+
+Timings depend on the machine, so a baseline is only meaningful on the machine that wrote it.
+"""
+
+import os
+import sys
+import json
+import random
+import timeit
+import argparse
+import platform
+import tempfile
+import statistics
+import contextlib
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT_DIR, os.path.join(ROOT_DIR, "framework")]
+
+import pandas as pd
+from framework.utils import standardize, change_name, standardize_category, extract_successful_finish_trajectories
+from framework.inference import api_json_to_openai_json
+from framework.planning import process_responses
+from retrival import process_retrieval_document
+from rerank_generation import generate_prompts
+from rerank_Template import rerank_Template_for_SGLang_top10
+
+WORDS = ["get", "stock", "price", "weather", "forecast", "search", "movie", "user", "profile", "news",
+         "currency", "exchange", "rate", "flight", "status", "recipe", "lyrics", "translate", "email", "verify"]
+CATEGORIES = ["Finance", "Data", "Sports", "Business Software", "Movies, TV Shows", "Travel/Transportation",
+              "Food", "Communication", "Entertainment", "Video_Images", "Text Analysis", "eCommerce"]
+PARAM_TYPES = ["STRING", "NUMBER", "BOOLEAN", "ENUM", "ARRAY"]
+
+
+# --- Synthetic fixtures ---
+
+def api_name(rng):
+    name = " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(1, 4)))
+    # Mix in the characters standardize() has to clean up
+    return rng.choice(["", "123 ", "/", "v2 "]) + name + rng.choice(["", " (v2)", "/by-id", " - beta", " 天气"])
+
+
+def make_api_json(rng):
+    def parameter():
+        return {
+            "name": rng.choice(["from", "id", "query", "Page Size", "lang", "class", "start-date"]) + rng.choice(["", "_2"]),
+            "type": rng.choice(PARAM_TYPES),
+            "description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 60))),
+            "default": rng.choice(["", "en", 10, "2023-01-01"]),
+        }
+
+    name = api_name(rng)
+    return {
+        "category_name": rng.choice(CATEGORIES),
+        "tool_name": api_name(rng),
+        "api_name": name,
+        "api_description": f"{name} " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 80))),
+        "required_parameters": [parameter() for _ in range(rng.randint(0, 4))],
+        "optional_parameters": [parameter() for _ in range(rng.randint(0, 6))],
+        "code_cate": "", "code_tool": "", "code_api": "",
+    }
+
+
+def workflow_content(rng):
+    return json.dumps({
+        "category_name": rng.choice(CATEGORIES),
+        "workflow_description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 120))),
+        "workflow": {"nodes": [{"id": str(i), "type": "http-request"} for i in range(rng.randint(2, 6))]},
+    }, ensure_ascii=False)
+
+
+def toolbench_data(rng, n_dialogues):
+    """
+    A ToolBench answer file: {"train_messages": [dialogue, ...]}, where some dialogues finish
+    with give_answer and the others give up.
+    """
+    dialogues = []
+    for _ in range(n_dialogues):
+        dialogue = [{"role": "system", "content": "You are AutoGPT. " * 20},
+                    {"role": "user", "content": " ".join(rng.choice(WORDS) for _ in range(30))}]
+        for step in range(rng.randint(1, 6)):
+            dialogue.append({"role": "assistant", "content": "Thought: call the next API.",
+                             "function_call": {"name": f"{rng.choice(WORDS)}_for_tool",
+                                               "arguments": json.dumps({"query": rng.choice(WORDS)})}})
+            dialogue.append({"role": "function", "name": "tool", "content": json.dumps({"result": [step] * 20})})
+        return_type = rng.choice(["give_answer", "give_answer", "give_up_and_restart"])
+        dialogue.append({"role": "assistant", "content": "",
+                         "function_call": {"name": "Finish",
+                                           "arguments": json.dumps({"return_type": return_type, "final_answer": "done"})}})
+        dialogues.append(dialogue)
+    return {"train_messages": dialogues}
+
+
+def planning_responses(rng, n_responses):
+    responses = {}
+    for i in range(n_responses):
+        steps = "\n".join(f"{step + 1}. {' '.join(rng.choice(WORDS) for _ in range(12))}" for step in range(rng.randint(2, 8)))
+        responses[f"{i}_output"] = (f"<explanation>{' '.join(rng.choice(WORDS) for _ in range(60))}</explanation>\n"
+                                    f"<workflow>\n{steps}\n</workflow>")
+    return responses
+
+
+# --- Cases ---
+
+def build_cases(rng, scale, tmp_dir):
+    """
+    Returns:
+        dict: {case name: (callable, items processed per call)}
+    """
+    names = [api_name(rng) for _ in range(1000 * scale)]
+    standardized = [standardize(name) for name in names]
+    categories = [rng.choice(CATEGORIES) for _ in range(1000 * scale)]
+    api_jsons = [make_api_json(rng) for _ in range(200 * scale)]
+    documents_df = pd.DataFrame({"wocid": range(1, 2000 * scale + 1),
+                                 "workflow_content": [workflow_content(rng) for _ in range(2000 * scale)]})
+    data = toolbench_data(rng, 200 * scale)
+
+    workflows = {str(wocid): content for wocid, content in zip(documents_df.wocid, documents_df.workflow_content)}
+    queries = {str(qid): " ".join(rng.choice(WORDS) for _ in range(20)) for qid in range(200 * scale)}
+    tops = {qid: rng.sample(list(workflows), 10) for qid in queries}
+
+    responses_file = os.path.join(tmp_dir, "responses.json")
+    with open(responses_file, 'w', encoding='utf-8') as f:
+        json.dump(planning_responses(rng, 500 * scale), f)
+    output_file = os.path.join(tmp_dir, "planning.json")
+
+    def quiet_process_responses():
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            process_responses(responses_file, output_file)
+
+    return {
+        "standardize": (lambda: [standardize(name) for name in names], len(names)),
+        "change_name": (lambda: [change_name(name) for name in standardized], len(standardized)),
+        "standardize_category": (lambda: [standardize_category(category) for category in categories], len(categories)),
+        "api_json_to_openai_json": (lambda: [api_json_to_openai_json(api_json, standardize(api_json["tool_name"]))
+                                             for api_json in api_jsons], len(api_jsons)),
+        "process_retrieval_document": (lambda: process_retrieval_document(documents_df), len(documents_df)),
+        "extract_successful_finish_trajectories": (lambda: extract_successful_finish_trajectories(data),
+                                                   len(data["train_messages"])),
+        "generate_prompts": (lambda: generate_prompts(queries, workflows, tops, rerank_Template_for_SGLang_top10), len(queries)),
+        "process_responses": (quiet_process_responses, 500 * scale),
+    }
+
+
+def measure(fn, items, repeat):
+    """
+    Time `fn` with timeit: the number of calls per repetition is calibrated to take at least 0.2s.
+
+    Returns:
+        dict: best and median seconds per call, and microseconds per processed item.
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    times = [elapsed / number for elapsed in timer.repeat(repeat=repeat, number=number)]
+    best = min(times)
+    return {
+        "best_s": best,
+        "median_s": statistics.median(times),
+        "items": items,
+        "us_per_item": best / items * 1e6,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare the best times against a baseline.
+
+    Returns:
+        dict: {case: {"baseline_s", "ratio", "status"}}, where status is "regression" or
+            "improvement" when the ratio leaves [1 - threshold, 1 + threshold].
+    """
+    comparison = {}
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        ratio = result["best_s"] / baseline[case]["best_s"]
+        status = "regression" if ratio > 1 + threshold else "improvement" if ratio < 1 - threshold else "ok"
+        comparison[case] = {"baseline_s": baseline[case]["best_s"], "ratio": ratio, "status": status}
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the CPU-bound framework functions.")
+    parser.add_argument('--scale', type=int, default=1, help="Fixture size multiplier.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic fixtures.")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed repetitions per case (best and median are reported).")
+    parser.add_argument('--cases', type=str, nargs='*', default=None, help="Only run these cases.")
+    parser.add_argument('--output_file', type=str, default=None, help="Path to save the results as JSON.")
+    parser.add_argument('--baseline', type=str, default=None, help="Baseline JSON to compare against.")
+    parser.add_argument('--save_baseline', action='store_true', help="Write the results to --baseline instead of comparing.")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative slowdown reported as a regression.")
+    parser.add_argument('--fail_on_regression', action='store_true', help="Exit with status 1 if any case regressed.")
+    args = parser.parse_args()
+    if args.save_baseline and not args.baseline:
+        parser.error("--save_baseline requires --baseline")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cases = build_cases(random.Random(args.seed), args.scale, tmp_dir)
+        unknown = set(args.cases or ()) - set(cases)
+        if unknown:
+            parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+        results = {}
+        for case, (fn, items) in cases.items():
+            if args.cases and case not in args.cases:
+                continue
+            results[case] = measure(fn, items, args.repeat)
+
+    comparison = {}
+    if args.baseline and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            comparison = compare(results, json.load(f)["results"], args.threshold)
+
+    print(f"{'case':<40}{'best (ms)':>12}{'median (ms)':>13}{'us/item':>10}{'vs baseline':>13}")
+    for case, result in results.items():
+        change = f"{comparison[case]['ratio']:.2f}x {comparison[case]['status']}" if case in comparison else ""
+        print(f"{case:<40}{result['best_s'] * 1e3:>12.3f}{result['median_s'] * 1e3:>13.3f}"
+              f"{result['us_per_item']:>10.2f}  {change}")
+
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "seed": args.seed, "scale": args.scale, "repeat": args.repeat},
+        "results": results,
+    }
+    if comparison:
+        report["comparison"] = comparison
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+
+    if args.fail_on_regression and any(entry["status"] == "regression" for entry in comparison.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Compare full-JSON regex generation with skeleton filling for HTTP nodes.
+
+Reports completion tokens and latency per node for both modes on the same HTTP requests.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sglang as sgl
+from framework.inference import (
+    load_data,
+    extract_http_requests,
+    sgl_programs,
+    slot_regex,
+    fill_http_skeleton,
+)
+
+def run_regex(name, user):
+    state = sgl_programs()["character_gen"].run(name=name, user=user)
+    return state.get_meta_info("json_output")["completion_tokens"]
+
+
+def run_skeleton(name, user):
+    state = sgl_programs()["character_gen_slots"].run(name=name, user=user)
+    fill_http_skeleton(name, {slot: state[slot].strip() for slot in slot_regex})
+    return sum(state.get_meta_info(slot)["completion_tokens"] for slot in slot_regex)
+
+
+def benchmark(mode_fn, requests):
+    tokens, latencies, failures = [], [], 0
+    for name, user in requests:
+        start = time.perf_counter()
+        try:
+            tokens.append(mode_fn(name, user))
+        except Exception:
+            failures += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+    return {
+        "nodes": len(requests),
+        "failures": failures,
+        "mean_completion_tokens": statistics.mean(tokens) if tokens else None,
+        "mean_latency_s": statistics.mean(latencies) if latencies else None,
+        "p90_latency_s": statistics.quantiles(latencies, n=10)[-1] if len(latencies) > 1 else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark regex vs skeleton HTTP node generation.")
+    parser.add_argument('--input_file', type=str, required=True, help="Workflow JSON file used by inference.py.")
+    parser.add_argument('--sgl_url', type=str, default="http://localhost:30000", help="URL of the SGL backend.")
+    parser.add_argument('--limit', type=int, default=50, help="Number of HTTP nodes to generate per mode.")
+    parser.add_argument('--output_file', type=str, default=None, help="Path to save the benchmark results.")
+    args = parser.parse_args()
+
+    sgl.set_default_backend(sgl.RuntimeEndpoint(args.sgl_url))
+    http_requests = extract_http_requests(load_data(args.input_file))
+    requests = [(name, details) for name, details in http_requests.items() if details][:args.limit]
+
+    results = {
+        "regex": benchmark(run_regex, requests),
+        "skeleton": benchmark(run_skeleton, requests),
+    }
+    print(json.dumps(results, indent=4))
+    if results["regex"]["mean_completion_tokens"] and results["skeleton"]["mean_completion_tokens"]:
+        print(f"Token reduction: {results['regex']['mean_completion_tokens'] / results['skeleton']['mean_completion_tokens']:.2f}x, "
+              f"latency speedup: {results['regex']['mean_latency_s'] / results['skeleton']['mean_latency_s']:.2f}x")
+
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
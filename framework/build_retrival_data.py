@@ -2,14 +2,14 @@ import json
 import argparse
 import os
 from tqdm import tqdm
-import pandas as pd
-from sklearn.utils import shuffle
+from columnar import corpus_columns, write_columnar
+from profiling import add_profile_args, profiled
 
 """
 Build the retrieval dataset for tool matching.
 """
 
-def parse_args():
+def parse_args(argv=None):
     """
     Parse command line arguments.
     """
@@ -23,7 +23,10 @@ def parse_args():
                         default="data/test_query_ids/test_1.json",
                         help='The name of the index file')
     parser.add_argument('--dataset_name', type=str, default="G1", help='The name of the output dataset')
-    return parser.parse_args()
+    parser.add_argument('--columnar_format', type=str, default=None, choices=['parquet', 'arrow'],
+                        help='Also write the corpus and queries as pre-parsed columnar files')
+    add_profile_args(parser)
+    return parser.parse_args(argv)
 
 def load_json(file_path):
     """
@@ -70,50 +73,59 @@ def process_data(data, doc_id_map, query_id_map, documents, pairs):
                 query_id = query_id_map.setdefault(query, len(query_id_map) + 1)
                 pairs.append(([query_id, query], [query_id, 0, doc_id, 1]))
 
-def main():
-    args = parse_args()
-
-    # Load query data
-    query_data = load_json(args.query_file)
-    # Load test set index
-    test_index_data = load_json(args.index_file)
-    # Convert to set for fast lookup
-    test_index_set = set(map(int, test_index_data.keys()))
-
-    # Split test set
-    query_test = split_test_set(query_data, test_index_set)
-
-    # Initialize mappings and data structures
-    doc_id_map = {}    # Mapping from document to doc_id
-    query_id_map = {}  # Mapping from query to query_id
-    documents = []     # Document content list
-    test_pairs = []    # Test set pairs
-
-    # Process data and generate pairs
-    process_data(query_test, doc_id_map, query_id_map, documents, test_pairs)
-
-    # Shuffle pairs
-    test_pairs = shuffle(test_pairs, random_state=42)
-
-    # Split into queries and labels
-    test_queries, test_labels = zip(*test_pairs)
-
-    # DataFrame Build DataFrames
-    documents_df = pd.DataFrame(documents, columns=['docid', 'document_content'])
-    test_queries_df = pd.DataFrame(test_queries, columns=['qid', 'query_text'])
-    test_labels_df = pd.DataFrame(test_labels, columns=['qid', 'useless', 'docid', 'label'])
-
-    """
-    documents_df: Save tool API text information
-    test_queries_df: Save query text information
-    test_labels_df: Save label information (association between query and tool)
-    """
-
-    # Save as .tsv and .txt files
-    os.makedirs(args.output_dir, exist_ok=True)
-    documents_df.to_csv(os.path.join(args.output_dir, 'corpus.tsv'), sep='\t', index=False)
-    test_queries_df.to_csv(os.path.join(args.output_dir, 'test.query.txt'), sep='\t', index=False, header=False)
-    test_labels_df.to_csv(os.path.join(args.output_dir, 'qrels.test.tsv'), sep='\t', index=False, header=False)
+def main(argv=None):
+    args = parse_args(argv)
+
+    with profiled(args, "build_retrieval_data"):
+        # Load query data
+        query_data = load_json(args.query_file)
+        # Load test set index
+        test_index_data = load_json(args.index_file)
+        # Convert to set for fast lookup
+        test_index_set = set(map(int, test_index_data.keys()))
+
+        # Split test set
+        query_test = split_test_set(query_data, test_index_set)
+
+        # Initialize mappings and data structures
+        doc_id_map = {}    # Mapping from document to doc_id
+        query_id_map = {}  # Mapping from query to query_id
+        documents = []     # Document content list
+        test_pairs = []    # Test set pairs
+
+        # Process data and generate pairs
+        process_data(query_test, doc_id_map, query_id_map, documents, test_pairs)
+
+        # Shuffle pairs
+        from sklearn.utils import shuffle
+        test_pairs = shuffle(test_pairs, random_state=42)
+
+        # Split into queries and labels
+        test_queries, test_labels = zip(*test_pairs)
+
+        # DataFrame Build DataFrames
+        import pandas as pd
+        documents_df = pd.DataFrame(documents, columns=['docid', 'document_content'])
+        test_queries_df = pd.DataFrame(test_queries, columns=['qid', 'query_text'])
+        test_labels_df = pd.DataFrame(test_labels, columns=['qid', 'useless', 'docid', 'label'])
+
+        """
+        documents_df: Save tool API text information
+        test_queries_df: Save query text information
+        test_labels_df: Save label information (association between query and tool)
+        """
+
+        # Save as .tsv and .txt files
+        os.makedirs(args.output_dir, exist_ok=True)
+        documents_df.to_csv(os.path.join(args.output_dir, 'corpus.tsv'), sep='\t', index=False)
+        test_queries_df.to_csv(os.path.join(args.output_dir, 'test.query.txt'), sep='\t', index=False, header=False)
+        test_labels_df.to_csv(os.path.join(args.output_dir, 'qrels.test.tsv'), sep='\t', index=False, header=False)
+
+        if args.columnar_format:
+            write_columnar(corpus_columns(documents_df['docid'].tolist(), documents_df['document_content'].tolist()),
+                           os.path.join(args.output_dir, f'corpus.{args.columnar_format}'))
+            write_columnar({'id': test_queries_df['qid'].tolist(), 'query': test_queries_df['query_text'].tolist()},
+                           os.path.join(args.output_dir, f'test.query.{args.columnar_format}'))
 
 if __name__ == "__main__":
     main()
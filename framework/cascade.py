@@ -0,0 +1,160 @@
+"""
+Two-stage cascade: queries whose retrieval top-1 clearly leads the runner-up skip the LLM rerank.
+
+The margin threshold is calibrated on qrels.test.tsv as the lowest margin at which the retrieval
+top-1 still reaches the target precision, so LLM calls go only to ambiguous queries.
+"""
+
+import json
+import argparse
+from collections import defaultdict
+import numpy as np
+from profiling import add_profile_args, profiled
+
+def top1_margin(sorted_scores):
+    """
+    Score gap between the best and the second best candidate (inf with a single candidate).
+    """
+    if not sorted_scores:
+        return 0.0
+    if len(sorted_scores) == 1:
+        return float("inf")
+    return sorted_scores[0] - sorted_scores[1]
+
+
+def load_top_scores(top_tsv_path):
+    """
+    Read a retrieval file written by retrival.py with its retrieval_scores column.
+
+    Args:
+        top_tsv_path (str): TSV with columns qid, retrieval_ids, retrieval_scores.
+
+    Returns:
+        dict: {qid: (retrieval_ids, scores)} with scores sorted in descending order.
+    """
+    top_scores = {}
+    with open(top_tsv_path, 'r', encoding='utf-8') as file:
+        header = file.readline().rstrip('\r\n').split('\t')
+        if 'retrieval_scores' not in header:
+            raise ValueError(f"{top_tsv_path} has no retrieval_scores column; re-run retrival.py to write it.")
+        ids_column, scores_column = header.index('retrieval_ids'), header.index('retrieval_scores')
+        for line in file:
+            parts = line.rstrip('\r\n').split('\t')
+            if len(parts) <= scores_column:
+                continue
+            ids = parts[ids_column].split(',') if parts[ids_column] else []
+            scores = [float(score) for score in parts[scores_column].split(',')] if parts[scores_column] else []
+            top_scores[parts[0]] = (ids, scores)
+    return top_scores
+
+
+def load_qrels(qrels_path):
+    """
+    Load the relevant doc ids per query from a qrels file (qid, useless, docid, label).
+
+    Returns:
+        dict: {qid: set of docids with a positive label}
+    """
+    qrels = defaultdict(set)
+    with open(qrels_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            parts = line.strip().split('\t')
+            if len(parts) == 4 and parts[3].lstrip('-').isdigit() and int(parts[3]) > 0:
+                qrels[parts[0]].add(parts[2])
+    return qrels
+
+
+def calibrate_margin_threshold(margins, correct, target_precision=0.95, min_support=20):
+    """
+    Find the lowest top-1 margin above which the retrieval top-1 is right often enough.
+
+    Args:
+        margins (list): Top-1 margin per query.
+        correct (list): Whether the retrieval top-1 of the query is relevant.
+        target_precision (float): Required top-1 precision on the bypassed queries.
+        min_support (int): Minimum number of calibration queries above the threshold.
+
+    Returns:
+        dict: threshold (inf if the target cannot be met), coverage (share of queries bypassed),
+            precision and support on the calibration queries.
+    """
+    margins = np.asarray(margins, dtype=np.float64)
+    correct = np.asarray(correct, dtype=bool)
+    order = np.argsort(-margins, kind='stable')
+    sorted_margins = margins[order]
+    support = np.arange(1, len(margins) + 1)
+    precision = np.cumsum(correct[order]) / np.maximum(support, 1)
+
+    # A threshold can only sit at the end of a run of equal margins
+    group_end = np.append(sorted_margins[1:] != sorted_margins[:-1], True) if len(margins) else np.zeros(0, dtype=bool)
+    valid = np.flatnonzero(group_end & (precision >= target_precision) & (support >= min_support))
+    if not len(valid):
+        return {"threshold": float("inf"), "coverage": 0.0, "precision": None, "support": 0}
+    best = valid[-1]
+    return {
+        "threshold": float(sorted_margins[best]),
+        "coverage": float(support[best] / len(margins)),
+        "precision": float(precision[best]),
+        "support": int(support[best]),
+    }
+
+
+def fit_cascade(top_tsv_path, qrels_path=None, target_precision=0.95, min_support=20):
+    """
+    Calibrate the cascade threshold from a scored retrieval file.
+
+    Args:
+        top_tsv_path (str): Retrieval file with retrieval_scores.
+        qrels_path (str): qrels.test.tsv; without it the gold workflow id is the query id.
+        target_precision (float): Required top-1 precision on the bypassed queries.
+        min_support (int): Minimum number of calibration queries above the threshold.
+
+    Returns:
+        dict: The calibration (see calibrate_margin_threshold) plus target_precision and num_queries.
+    """
+    top_scores = load_top_scores(top_tsv_path)
+    qrels = load_qrels(qrels_path) if qrels_path else None
+    margins, correct = [], []
+    for qid, (ids, scores) in top_scores.items():
+        gold = qrels.get(qid, set()) if qrels is not None else {qid}
+        margins.append(top1_margin(scores))
+        correct.append(bool(ids) and ids[0] in gold)
+    calibration = calibrate_margin_threshold(margins, correct, target_precision, min_support)
+    calibration.update(target_precision=target_precision, num_queries=len(margins))
+    return calibration
+
+
+def cascade_bypass(top_scores, threshold):
+    """
+    Queries confident enough to take the retrieval top-1 without the LLM.
+
+    Args:
+        top_scores (dict): {qid: (retrieval_ids, scores)} as returned by load_top_scores.
+        threshold (float): Calibrated top-1 margin.
+
+    Returns:
+        list: qids whose top-1 margin is at least the threshold.
+    """
+    return [qid for qid, (ids, scores) in top_scores.items() if ids and top1_margin(scores) >= threshold]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate the retrieval-margin cascade on qrels.")
+    parser.add_argument('--top_file', type=str, required=True, help='Retrieval file written by retrival.py, with retrieval_scores')
+    parser.add_argument('--qrels_file', type=str, default=None, help='Path to qrels.test.tsv (default: docid == qid)')
+    parser.add_argument('--target_precision', type=float, default=0.95, help='Required top-1 precision on bypassed queries')
+    parser.add_argument('--min_support', type=int, default=20, help='Minimum number of calibration queries above the threshold')
+    parser.add_argument('--output_file', type=str, required=True, help='Path to save the calibration JSON')
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+
+    with profiled(args, "cascade"):
+        calibration = fit_cascade(args.top_file, args.qrels_file, args.target_precision, args.min_support)
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            json.dump(calibration, f, indent=4)
+        print(f"Margin threshold {calibration['threshold']:.4f}: {calibration['coverage']:.2%} of "
+              f"{calibration['num_queries']} queries skip the LLM. Calibration saved to {args.output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Single entry point for the framework stages:
+
+    python framework/cli.py <command> [stage arguments]
+    python framework/cli.py <command> --help
+
+A stage module is only imported when its command runs, and the stage modules import heavy
+dependencies (sentence_transformers/torch, pandas, sglang, openai) inside the functions that
+need them, so --help and file-processing steps start without loading them.
+"""
+
+import os
+import sys
+import time
+import argparse
+import importlib
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FRAMEWORK_DIR = os.path.join(ROOT_DIR, "framework")
+
+# command: (module, description)
+COMMANDS = {
+    "planning_prompt": ("framework.planning_prompt", "Build planning prompts from ToolBench trajectories."),
+    "planning": ("framework.planning", "Generate and parse workflow plans."),
+    "inference": ("framework.inference", "Generate HTTP nodes and the query file."),
+    "streaming": ("framework.streaming", "Plan workflows and generate their nodes in one streaming pass."),
+    "evaluation": ("framework.evaluation", "Judge generated workflows with the evaluation rubrics."),
+    "white_list": ("framework.white_list_api", "Build the tool white list."),
+    "schema_store": ("framework.schema_store", "Convert every API of the tool directory into OpenAI-function schemas."),
+    "build_retrieval_data": ("build_retrival_data", "Build the retrieval corpus, queries and qrels."),
+    "columnar": ("columnar", "Convert a corpus TSV into a Parquet or Arrow IPC file."),
+    "retrieval": ("retrival", "Retrieve the top-k workflows for every query."),
+    "cascade": ("cascade", "Calibrate the retrieval-margin cascade on qrels."),
+    "rerank": ("rerank_generation", "Rerank the retrieved workflows with the LLM and evaluate."),
+    "pipeline": ("framework.pipeline", "Run the stages as a cached DAG."),
+    "mock_server": ("framework.mock_server", "Serve canned LLM responses for offline load tests."),
+}
+
+
+def load_command(command):
+    """
+    Import the module of a command. Modules are addressed the way they import their own
+    dependencies, so both the repository root and framework/ are put on sys.path.
+    """
+    for path in (FRAMEWORK_DIR, ROOT_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    return importlib.import_module(COMMANDS[command][0])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Meta agent workflow framework.",
+        epilog="commands:\n" + "\n".join(f"  {name:<22}{description}" for name, (_, description) in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--startup_time', action='store_true', help="Print the time spent importing the command module.")
+    parser.add_argument('command', choices=list(COMMANDS), metavar='command', help="Stage to run, see below.")
+    parser.add_argument('args', nargs=argparse.REMAINDER, help="Arguments of the stage.")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    module = load_command(args.command)
+    if args.startup_time:
+        print(f"[cli] {args.command}: imported {COMMANDS[args.command][0]} in {time.perf_counter() - start:.3f}s",
+              file=sys.stderr)
+    return module.main(args.args)
+
+
+if __name__ == "__main__":
+    main()
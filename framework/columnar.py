@@ -0,0 +1,119 @@
+"""
+Columnar (Parquet / Arrow IPC) storage for the retrieval corpus and queries.
+
+The corpus JSON is parsed once when the file is written; readers get the category, description,
+tool and API names as plain columns. Arrow IPC files (.arrow / .feather) are memory-mapped on read.
+"""
+
+import os
+import json
+import argparse
+from profiling import add_profile_args, profiled
+
+# pyarrow is optional and imported on first use by require_pyarrow
+pa = None
+pq = None
+
+COLUMNAR_EXTENSIONS = (".parquet", ".arrow", ".feather")
+
+CORPUS_COLUMNS = ["id", "category_name", "description", "tool_name", "api_name", "content"]
+QUERY_COLUMNS = ["id", "query"]
+
+
+def is_columnar(path):
+    return str(path).lower().endswith(COLUMNAR_EXTENSIONS)
+
+
+def require_pyarrow():
+    global pa, pq
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("pyarrow is required for Parquet/Arrow corpus files: pip install pyarrow")
+        pa, pq = pyarrow, pyarrow.parquet
+
+
+def corpus_columns(ids, contents):
+    """
+    Parse corpus rows once into columns.
+
+    Args:
+        ids (list): Document ids (docid or wocid).
+        contents (list): JSON document strings (API documents from build_retrival_data or workflow documents).
+
+    Returns:
+        dict: {column: list} with the CORPUS_COLUMNS.
+    """
+    columns = {name: [] for name in CORPUS_COLUMNS}
+    for doc_id, content in zip(ids, contents):
+        doc = json.loads(content)
+        columns["id"].append(int(doc_id))
+        columns["category_name"].append(doc.get('category_name', '') or '')
+        columns["description"].append(doc.get('workflow_description') or doc.get('api_description') or '')
+        columns["tool_name"].append(doc.get('tool_name', '') or '')
+        columns["api_name"].append(doc.get('api_name', '') or '')
+        columns["content"].append(content)
+    return columns
+
+
+def write_columnar(columns, path):
+    """
+    Write a {column: list} dict as Parquet or Arrow IPC, depending on the file extension.
+    """
+    require_pyarrow()
+    table = pa.table(columns)
+    if str(path).lower().endswith(".parquet"):
+        pq.write_table(table, path)
+    else:
+        with pa.OSFile(str(path), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_columnar(path, columns=None):
+    """
+    Read a columnar file into {column: list}.
+
+    Args:
+        path (str): .parquet, .arrow or .feather file.
+        columns (list): Optional subset of columns to read.
+    """
+    require_pyarrow()
+    if str(path).lower().endswith(".parquet"):
+        table = pq.read_table(path, columns=columns)
+    else:
+        with pa.memory_map(str(path), 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+    return {name: table.column(name).to_pylist() for name in table.column_names}
+
+
+def tsv_to_columnar(tsv_path, output_path):
+    """
+    Convert a corpus TSV (docid/document_content or wocid/workflow_content) into a columnar file.
+    """
+    import pandas as pd
+
+    documents_df = pd.read_csv(tsv_path, sep='\t')
+    id_column, content_column = documents_df.columns[:2]
+    columns = corpus_columns(documents_df[id_column].tolist(), documents_df[content_column].tolist())
+    write_columnar(columns, output_path)
+    return len(columns["id"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a corpus TSV into a Parquet or Arrow IPC file.")
+    parser.add_argument('--corpus_tsv', type=str, required=True, help='Path to the corpus TSV file')
+    parser.add_argument('--output_file', type=str, required=True, help='Path of the .parquet or .arrow file to write')
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+
+    with profiled(args, "columnar"):
+        n = tsv_to_columnar(args.corpus_tsv, args.output_file)
+        print(f"{n} documents written to {args.output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+CPU-runnable cross-encoder stage between WorkflowRetriever.retrieving and the LLM rerank.
+"""
+
+import time
+from sentence_transformers import CrossEncoder
+from cascade import top1_margin
+
+class CrossEncoderReranker:
+    """
+    CrossEncoderReranker scores (query, workflow) pairs in batches, prunes the retrieved
+    candidates to a short list and tells whether the LLM rerank can be skipped.
+    """
+    def __init__(self, model_path: str, batch_size: int = 32, device: str = "cpu", max_length: int = 512):
+        """
+        Args:
+            model_path (str): Path or name of the cross-encoder model.
+            batch_size (int): Number of pairs scored per forward pass.
+            device (str): Torch device, "cpu" by default.
+            max_length (int): Maximum tokens per (query, workflow) pair.
+        """
+        self.batch_size = batch_size
+        self.model = CrossEncoder(model_path, device=device, max_length=max_length)
+
+    def score_batch(self, queries, candidates):
+        """
+        Score the candidates of many queries in shared batches.
+
+        Args:
+            queries (list): Query strings.
+            candidates (list): For each query, the list of candidate workflow texts.
+
+        Returns:
+            list: For each query, the list of candidate scores (higher is more relevant).
+        """
+        pairs = [(query, text) for query, texts in zip(queries, candidates) for text in texts]
+        if not pairs:
+            return [[] for _ in queries]
+        flat_scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        scores, start = [], 0
+        for texts in candidates:
+            scores.append([float(score) for score in flat_scores[start:start + len(texts)]])
+            start += len(texts)
+        return scores
+
+    def rerank(self, query, candidate_ids, candidate_texts, keep):
+        """
+        Rerank one query's candidates and keep the best ones.
+
+        Returns:
+            tuple: (kept_ids, kept_scores) sorted by descending cross-encoder score.
+        """
+        scores = self.score_batch([query], [candidate_texts])[0]
+        return prune(candidate_ids, scores, keep)
+
+
+def prune(candidate_ids, scores, keep):
+    """
+    Sort candidates by descending score (stable for ties) and keep the first `keep`.
+    """
+    order = sorted(range(len(scores)), key=lambda i: -scores[i])[:keep]
+    return [candidate_ids[i] for i in order], [scores[i] for i in order]
+
+
+def cross_encoder_rerank(reranker, queries, workflows, tops, keep=10, skip_margin=None, chunk_size=64):
+    """
+    Apply the cross-encoder to every query's retrieved candidates.
+
+    Args:
+        reranker (CrossEncoderReranker): The loaded reranker.
+        queries (dict): {qid: query}.
+        workflows (dict): {wocid: workflow_content}.
+        tops (dict): {qid: [wocid, ...]} retrieved candidates, e.g. the 5 * top_k hits of retrieving.
+        keep (int): Number of candidates kept per query for the LLM.
+        skip_margin (float): If set, queries whose top-1 margin is at least this value skip the LLM.
+        chunk_size (int): Number of queries scored per batch.
+
+    Returns:
+        tuple: (pruned_tops, confident_qids, seconds)
+            pruned_tops (dict): {qid: [wocid, ...]} sorted by cross-encoder score, at most `keep` long.
+            confident_qids (set): Queries whose cross-encoder top-1 is trusted without the LLM.
+            seconds (float): Total cross-encoder scoring time.
+    """
+    qids = [qid for qid in queries if qid in tops]
+    pruned_tops, confident_qids = {}, set()
+    start = time.perf_counter()
+    for chunk_start in range(0, len(qids), chunk_size):
+        chunk = qids[chunk_start:chunk_start + chunk_size]
+        candidate_ids = [[wocid for wocid in tops[qid] if wocid in workflows] for qid in chunk]
+        scores = reranker.score_batch(
+            [queries[qid] for qid in chunk],
+            [[workflows[wocid] for wocid in ids] for ids in candidate_ids],
+        )
+        for qid, ids, query_scores in zip(chunk, candidate_ids, scores):
+            kept_ids, kept_scores = prune(ids, query_scores, keep)
+            pruned_tops[qid] = kept_ids
+            if skip_margin is not None and kept_ids and top1_margin(kept_scores) >= skip_margin:
+                confident_qids.add(qid)
+    return pruned_tops, confident_qids, time.perf_counter() - start
@@ -0,0 +1,411 @@
+import os
+import re
+import json
+import argparse
+import functools
+import statistics
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from tqdm import tqdm
+from framework.workflow_graph import structural_score
+from framework.profiling import add_profile_args, profiled
+from framework.llm_client import ResilientClient, LLMCallFailed, MalformedResponseError, add_client_args, client_from_args, \
+    estimate_tokens, schedule_by_length
+from prompt_Evaluation import (
+    prompt_Consistency,
+    prompt_Accuracy,
+    prompt_Order_Accuracy,
+    prompt_Readability,
+    prompt_Reusability,
+    input_Template,
+)
+
+RUBRICS = {
+    "consistency": prompt_Consistency,
+    "accuracy": prompt_Accuracy,
+    "order_accuracy": prompt_Order_Accuracy,
+    "readability": prompt_Readability,
+    "reusability": prompt_Reusability,
+}
+
+score_pattern = re.compile(r'<score>\s*(\d+)\s*</score>')
+
+# Rubric scores run from 1 to 10, so the constrained output never needs more than two digits
+score_regex = r"<score>(10|[1-9])</score>"
+
+
+# --- SGL Function for Shared-Prefix Rubric Scoring ---
+@functools.lru_cache(maxsize=None)
+def rubric_fork_judge():
+    """
+    Build the shared-prefix rubric program on first use, so that sglang is only loaded in fork mode.
+    """
+    import sglang as sgl
+
+    @sgl.function
+    def judge(s, filled_input):
+        # The trajectory/workflow text is the shared prefix, prefilled once for all rubrics
+        s += filled_input
+        forks = s.fork(len(RUBRICS))
+        for f, (metric, rubric_prompt) in zip(forks, RUBRICS.items()):
+            f += rubric_prompt
+            f += "Score:\n"
+            f += sgl.gen(metric, max_tokens=16, regex=score_regex)
+        for f, metric in zip(forks, RUBRICS):
+            s.set_var(metric, f[metric])
+
+    return judge
+
+
+def extract_score(text):
+    """
+    Extract the integer score from a judge output.
+
+    Args:
+        text (str): Raw judge output containing a <score></score> tag.
+
+    Returns:
+        int: The score, or None if no score tag was found.
+    """
+    match = score_pattern.search(text or "")
+    return int(match.group(1)) if match else None
+
+
+def load_pairs(pairs_file):
+    """
+    Load (trajectory, workflow) pairs to be judged.
+
+    Args:
+        pairs_file (str): JSON file, either {id: {"trajectory": ..., "workflow": ...}}
+            or a list of {"id": ..., "trajectory": ..., "workflow": ...}.
+
+    Returns:
+        list: List of (pair_id, trajectory_text, workflow_text) tuples.
+    """
+    with open(pairs_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    if isinstance(data, dict):
+        items = [dict(value, id=key) for key, value in data.items()]
+    else:
+        items = [dict(value, id=value.get("id", index)) for index, value in enumerate(data)]
+
+    def as_text(value):
+        return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, indent=4)
+
+    return [(str(item["id"]), as_text(item["trajectory"]), as_text(item["workflow"])) for item in items]
+
+
+def load_finished_ids(output_file):
+    """
+    Collect the ids already present in a JSONL results file so interrupted runs can resume.
+    """
+    finished = set()
+    if not os.path.exists(output_file):
+        return finished
+    with open(output_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                finished.add(json.loads(line)["id"])
+    return finished
+
+
+def prefilter_pairs(pairs, output_file, min_score):
+    """
+    Score pairs structurally and record the ones below min_score without sending them to the judge.
+
+    Rejected pairs are appended to the output file with "prefiltered": true, their structural result
+    and no rubric scores, so resumed runs skip them as well.
+
+    Returns:
+        list: The pairs that passed the structural check.
+    """
+    finished = load_finished_ids(output_file)
+    kept = []
+    rejected = 0
+    with open(output_file, 'a', encoding='utf-8') as out:
+        for pair_id, trajectory, workflow in pairs:
+            if pair_id in finished:
+                continue
+            structural = structural_score(workflow, trajectory)
+            if structural["score"] >= min_score:
+                kept.append((pair_id, trajectory, workflow))
+                continue
+            record = {"id": pair_id, "prefiltered": True, "structural": structural,
+                      "scores": {metric: None for metric in RUBRICS}, "outputs": {}}
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            rejected += 1
+    print(f"Structural prefilter rejected {rejected} pairs, {len(kept)} pairs sent to the judge.")
+    return kept
+
+
+def judge_rubric(client, model, rubric_prompt, filled_input, max_tokens=1024, timeout=None):
+    """
+    Send one rubric prompt for one (trajectory, workflow) pair to the judge model.
+
+    Returns:
+        str: The raw judge output.
+    """
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": rubric_prompt},
+            {"role": "user", "content": filled_input},
+        ],
+        temperature=0.0,
+        max_tokens=max_tokens,
+        timeout=timeout,
+    )
+    return response.choices[0].message.content
+
+
+def run_judging(pairs, output_file, client, model="default", max_workers=64, max_tokens=1024, resilient_client=None):
+    """
+    Fan out all rubric prompts of every pair concurrently and stream finished pairs to a JSONL file.
+
+    Each line of the output file is {"id", "scores": {metric: score}, "outputs": {metric: text}}.
+    Pairs that are already in the output file are skipped. A pair with a rubric request that still
+    fails after the retries is not written, so the next run judges it again.
+
+    Args:
+        pairs (list): List of (pair_id, trajectory_text, workflow_text) tuples.
+        output_file (str): Path of the JSONL results file (appended to).
+        client (openai.Client): Client pointed at the SGLang OpenAI-compatible server.
+        model (str): Model name passed to the server.
+        max_workers (int): Maximum number of in-flight judge requests.
+        max_tokens (int): Maximum tokens generated per judge request.
+        resilient_client (ResilientClient): Retry, timeout and dead-letter policy of the judge requests.
+    """
+    resilient_client = resilient_client or ResilientClient("evaluation")
+    finished = load_finished_ids(output_file)
+    pending_pairs = [pair for pair in pairs if pair[0] not in finished]
+    if resilient_client.schedule == "length":
+        # Longest pairs first, similar lengths together; the rubrics of a pair stay adjacent
+        pending_pairs = schedule_by_length(pending_pairs, lambda pair: estimate_tokens(pair[1]) + estimate_tokens(pair[2]))
+    print(f"{len(finished)} pairs already judged, {len(pending_pairs)} pairs to go.")
+
+    def tasks():
+        for pair_id, trajectory, workflow in pending_pairs:
+            filled_input = input_Template.format(trajectory=trajectory, workflow=workflow)
+            for metric, rubric_prompt in RUBRICS.items():
+                yield pair_id, metric, rubric_prompt, filled_input
+
+    def judge(pair_id, metric, rubric_prompt, filled_input):
+        return resilient_client.call(
+            lambda timeout: judge_rubric(client, model, rubric_prompt, filled_input, max_tokens, timeout),
+            key=f"{pair_id}:{metric}", payload={"id": pair_id, "metric": metric}
+        )
+
+    partial = {}
+    failed_pairs = set()
+    with open(output_file, 'a', encoding='utf-8') as out, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            tqdm(total=len(pending_pairs), desc="Judging workflows") as progress:
+        task_iter = tasks()
+        in_flight = {}
+
+        def submit_next():
+            task = next(task_iter, None)
+            if task is None:
+                return False
+            pair_id, metric, rubric_prompt, filled_input = task
+            future = executor.submit(judge, pair_id, metric, rubric_prompt, filled_input)
+            in_flight[future] = (pair_id, metric)
+            return True
+
+        # Keep the pool saturated without materialising every request up front
+        while len(in_flight) < max_workers * 2 and submit_next():
+            pass
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                pair_id, metric = in_flight.pop(future)
+                try:
+                    output = future.result()
+                except LLMCallFailed as e:
+                    print(f"Error judging {pair_id} ({metric}): {e.error}")
+                    failed_pairs.add(pair_id)
+                    output = None
+
+                record = partial.setdefault(pair_id, {"id": pair_id, "scores": {}, "outputs": {}})
+                record["scores"][metric] = extract_score(output)
+                record["outputs"][metric] = output
+                if len(record["scores"]) == len(RUBRICS):
+                    record = partial.pop(pair_id)
+                    if pair_id not in failed_pairs:
+                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        out.flush()
+                    progress.update(1)
+                submit_next()
+
+    resilient_client.report()
+    if failed_pairs:
+        print(f"{len(failed_pairs)} pairs were not saved and are judged again on the next run.")
+    print(f"Judge results saved to {output_file}")
+
+
+def fork_judge_pair(program, filled_input):
+    """
+    Run rubric_fork_judge on one pair; a rubric without a parsable score is retried once
+    (RetryPolicy.max_malformed_attempts). SGL programs take no per-request timeout.
+
+    Returns:
+        dict: {metric: raw judge output}
+    """
+    state = program.run(filled_input=filled_input)
+    outputs = {metric: state[metric] for metric in RUBRICS}
+    missing = [metric for metric, output in outputs.items() if extract_score(output) is None]
+    if missing:
+        raise MalformedResponseError(f"No score for {', '.join(missing)}")
+    return outputs
+
+
+def run_fork_judging(pairs, output_file, resilient_client=None, program=None):
+    """
+    Score every pair with rubric_fork_judge and stream finished pairs to a JSONL file.
+
+    The trajectory/workflow prefix is shared by the five rubric branches, so it is prefilled
+    once per pair instead of once per rubric. Outputs are constrained to a bare <score></score>
+    tag. The output file has the same format as run_judging and is resumable in the same way: a
+    pair that still fails after the retries is not written, so the next run judges it again.
+
+    Args:
+        pairs (list): List of (pair_id, trajectory_text, workflow_text) tuples.
+        output_file (str): Path of the JSONL results file (appended to).
+        resilient_client (ResilientClient): Retry, concurrency, schedule and dead-letter policy of the pairs.
+        program: Object with the run interface of an SGL function (default: rubric_fork_judge()).
+    """
+    resilient_client = resilient_client or ResilientClient("evaluation")
+    program = program or rubric_fork_judge()
+    finished = load_finished_ids(output_file)
+    pending_pairs = [pair for pair in pairs if pair[0] not in finished]
+    print(f"{len(finished)} pairs already judged, {len(pending_pairs)} pairs to go.")
+
+    def judge(pair):
+        pair_id, trajectory, workflow = pair
+        filled_input = input_Template.format(trajectory=trajectory, workflow=workflow)
+        return resilient_client.call(lambda timeout: fork_judge_pair(program, filled_input),
+                                     key=pair_id, payload={"id": pair_id})
+
+    failed_pairs = set()
+    # Longest pairs first unless --schedule fifo; the client's concurrency limiter decides how many are in flight
+    work = resilient_client.dispatch(pending_pairs, judge,
+                                     length=lambda pair: estimate_tokens(pair[1]) + estimate_tokens(pair[2]))
+    with open(output_file, 'a', encoding='utf-8') as out:
+        for (pair_id, _, _), outputs, error in tqdm(work, desc="Judging workflows (fork)", total=len(pending_pairs)):
+            if isinstance(error, LLMCallFailed):
+                print(f"Error judging {pair_id}: {error.error}")
+                failed_pairs.add(pair_id)
+                continue
+            elif error is not None:
+                raise error
+            record = {"id": pair_id, "scores": {metric: extract_score(output) for metric, output in outputs.items()},
+                      "outputs": outputs}
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+
+    resilient_client.report()
+    if failed_pairs:
+        print(f"{len(failed_pairs)} pairs were not saved and are judged again on the next run.")
+    print(f"Judge results saved to {output_file}")
+
+
+def aggregate_scores(output_file):
+    """
+    Aggregate per-metric score distributions from a JSONL results file.
+
+    Args:
+        output_file (str): Path of the JSONL results file written by run_judging.
+
+    Returns:
+        dict: {metric: {"count", "missing", "mean", "stdev", "min", "median", "max", "histogram"}},
+            plus "prefiltered": number of pairs rejected by the structural prefilter.
+    """
+    scores = {metric: [] for metric in RUBRICS}
+    missing = {metric: 0 for metric in RUBRICS}
+    prefiltered = 0
+    with open(output_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("prefiltered"):
+                prefiltered += 1
+                continue
+            for metric in RUBRICS:
+                score = record["scores"].get(metric)
+                if score is None:
+                    missing[metric] += 1
+                else:
+                    scores[metric].append(score)
+
+    summary = {}
+    for metric, values in scores.items():
+        histogram = {}
+        for value in sorted(values):
+            histogram[str(value)] = histogram.get(str(value), 0) + 1
+        summary[metric] = {
+            "count": len(values),
+            "missing": missing[metric],
+            "mean": statistics.mean(values) if values else None,
+            "stdev": statistics.pstdev(values) if values else None,
+            "min": min(values) if values else None,
+            "median": statistics.median(values) if values else None,
+            "max": max(values) if values else None,
+            "histogram": histogram,
+        }
+    summary["prefiltered"] = prefiltered
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Judge generated workflows against their trajectories with the evaluation rubrics.")
+    parser.add_argument('--pairs_file', type=str, required=True, help="Path to the JSON file of (trajectory, workflow) pairs.")
+    parser.add_argument('--output_file', type=str, required=True, help="Path to the JSONL file the judge results are streamed to.")
+    parser.add_argument('--summary_file', type=str, default=None, help="Path to save the per-metric score distributions.")
+    parser.add_argument('--mode', type=str, default="fanout", choices=["fanout", "fork"],
+                        help="fanout: one request per rubric; fork: shared trajectory prefix forked into the rubrics.")
+    parser.add_argument('--base_url', type=str, default="http://127.0.0.1:30000/v1", help="OpenAI-compatible URL of the SGLang server.")
+    parser.add_argument('--sgl_url', type=str, default="http://127.0.0.1:30000", help="URL of the SGL backend (fork mode).")
+    parser.add_argument('--model_name', type=str, default="default", help="Model name passed to the server.")
+    parser.add_argument('--max_workers', type=int, default=64, help="Maximum number of concurrent judge requests (fanout mode).")
+    parser.add_argument('--max_tokens', type=int, default=1024, help="Maximum tokens generated per judge request.")
+    parser.add_argument('--prefilter_min_score', type=float, default=None,
+                        help="Skip judging pairs whose structural score (0-1) is below this value.")
+    add_client_args(parser)
+    add_profile_args(parser)
+
+    args = parser.parse_args(argv)
+
+    with profiled(args, "evaluation"):
+        pairs = load_pairs(args.pairs_file)
+        if args.prefilter_min_score is not None:
+            pairs = prefilter_pairs(pairs, args.output_file, args.prefilter_min_score)
+        resilient_client = client_from_args(args, "evaluation", f"{args.output_file}.failed.jsonl")
+        if args.mode == "fork":
+            import sglang as sgl
+            sgl.set_default_backend(sgl.RuntimeEndpoint(args.sgl_url))
+            run_fork_judging(pairs, args.output_file, resilient_client)
+        else:
+            import openai
+            client = openai.Client(base_url=args.base_url, api_key="EMPTY", max_retries=0)
+            run_judging(pairs, args.output_file, client, args.model_name, args.max_workers, args.max_tokens, resilient_client)
+
+        summary = aggregate_scores(args.output_file)
+        for metric in RUBRICS:
+            stats = summary[metric]
+            mean = f"{stats['mean']:.2f}" if stats["mean"] is not None else "n/a"
+            print(f"{metric}: mean {mean} over {stats['count']} pairs ({stats['missing']} without score)")
+        if summary["prefiltered"]:
+            print(f"{summary['prefiltered']} pairs rejected by the structural prefilter")
+
+        if args.summary_file:
+            with open(args.summary_file, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=4)
+            print(f"Score summary saved to {args.summary_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,96 @@
 import os
+import re
+import copy
 import json
+import hashlib
 import argparse
-import sglang as sgl
+import functools
+import multiprocessing
 from tqdm import tqdm
 from framework.utils import standardize, change_name
+from framework.schema_store import SchemaStore
+from framework.instrumentation import metrics, TOKEN_BUCKETS
+from framework.profiling import add_profile_args, profiled
+from framework.llm_client import ResilientClient, LLMCallFailed, MalformedResponseError, add_client_args, client_from_args, take_dead_letters, \
+    estimate_tokens
 from prompt_Template import json_regex, require
 
-# --- SGL Function for Character Generation ---
-@sgl.function
-def character_gen(s, name, user):
-    s += (
-        "You are a workflow node generation assistant. Based on the information provided by the user, you need to generate a JSON for the node. "
-        "Please fill in the following config about this workflow node.\n"
-    )
-    s += "The require is:\n"
-    s += require
-    s += user
-    s += "The constrained regex is:\n"
-    s += json_regex + "\n"
-    s += "The JSON output is:\n"
-    s += sgl.gen("json_output", max_tokens=2048, regex=json_regex)
+# --- Slots of the Skeleton-Filling Generation ---
+# Only the variable slots of the HTTP node are generated; each regex ends with a newline so the
+# constrained decoding terminates as soon as the slot is complete.
+slot_regex = {
+    "method": r"(get|post|put|delete|patch)\n",
+    "url": r"http[s]?:\/\/[\w\d\-\.]+\/[\w\d\-\.\/]*\n",
+    "params": r"[^\n]*\n",
+    "headers": r"[^\n]*\n",
+    "body_type": r"(none|raw text|json)\n",
+    "body_data": r"[^\n]*\n",
+}
+
+# --- SGL Functions for Character Generation ---
+@functools.lru_cache(maxsize=None)
+def sgl_programs():
+    """
+    Build the SGL programs on first use, so that importing this module (e.g. for --help or
+    process_queries) does not load sglang.
+
+    Returns:
+        dict: {"character_gen": whole node JSON program, "character_gen_slots": skeleton-filling program}
+    """
+    import sglang as sgl
+
+    @sgl.function
+    def character_gen(s, name, user):
+        s += (
+            "You are a workflow node generation assistant. Based on the information provided by the user, you need to generate a JSON for the node. "
+            "Please fill in the following config about this workflow node.\n"
+        )
+        s += "The require is:\n"
+        s += require
+        s += user
+        s += "The constrained regex is:\n"
+        s += json_regex + "\n"
+        s += "The JSON output is:\n"
+        s += sgl.gen("json_output", max_tokens=2048, regex=json_regex)
+
+    @sgl.function
+    def character_gen_slots(s, name, user):
+        s += (
+            "You are a workflow node generation assistant. Based on the information provided by the user, you need to generate a JSON for the node. "
+            "Please fill in the following config about this workflow node.\n"
+        )
+        s += "The require is:\n"
+        s += require
+        s += user
+        s += "The fixed fields are already filled in. Fill in the variable fields, one per line:\n"
+        for slot, regex in slot_regex.items():
+            s += f"{slot}: "
+            s += sgl.gen(slot, max_tokens=512, regex=regex)
+
+    return {"character_gen": character_gen, "character_gen_slots": character_gen_slots}
+
+def load_http_skeleton():
+    """
+    Parse the constant HTTP node skeleton out of the commented `require` template.
+
+    The title is the one json_regex forces in regex mode, so both modes emit the same nodes.
+    """
+    skeleton = json.loads(re.sub(r'//[^\n]*', '', require))
+    skeleton["data"]["title"] = "HTTP \u8BF7\u6C42"
+    return skeleton
+
+http_skeleton = load_http_skeleton()
+
+def fill_http_skeleton(name, slots):
+    node = copy.deepcopy(http_skeleton)
+    data = node["data"]
+    data["desc"] = name
+    data["method"] = slots["method"]
+    data["url"] = slots["url"]
+    data["params"] = slots["params"]
+    data["headers"] = slots["headers"]
+    data["body"] = {"data": slots["body_data"], "type": slots["body_type"]}
+    return node
 
 # --- Functions for HTTP Request Handling ---
 def load_data(file_path):
@@ -48,19 +119,113 @@ def extract_http_requests(data):
                 http_requests[key] = value
     return http_requests
 
+def node_request_hash(name, details, generation_mode="regex"):
+    payload = json.dumps([generation_mode, name, details], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def collect_unique_http_requests(data, generation_mode="regex"):
+    """
+    Deduplicate HTTP node requests across all workflows by content hash.
+
+    Returns:
+        dict: {hash: (node_name, details)} with one entry per unique node request.
+    """
+    unique_requests = {}
+    for item in data:
+        workflow_details = item.get('workflow_details', {})
+        for key, value in workflow_details.items():
+            if key.startswith('HTTP') and value:
+                unique_requests.setdefault(node_request_hash(key, value, generation_mode), (key, value))
+    return unique_requests
+
+def apply_http_updates(data, generated, generation_mode="regex"):
+    """
+    Fan generated nodes back out to every workflow that uses the same node request.
+    """
+    for item in data:
+        workflow_details = item.get('workflow_details', {})
+        for key, value in list(workflow_details.items()):
+            if key.startswith('HTTP') and value:
+                request_hash = node_request_hash(key, value, generation_mode)
+                if request_hash in generated:
+                    workflow_details[key] = generated[request_hash]
+    return data
+
+def load_node_cache(cache_file):
+    if cache_file and os.path.exists(cache_file):
+        return load_data(cache_file)
+    return {}
+
+def save_node_cache(cache, cache_file):
+    if not cache_file:
+        return
+    tmp_file = cache_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as file:
+        json.dump(cache, file, ensure_ascii=False)
+    os.replace(tmp_file, cache_file)
+
+def record_generation_tokens(state, var_names, mode):
+    """
+    Record the prompt and completion tokens of the generated variables of an SGL state.
+    """
+    try:
+        meta_infos = [state.get_meta_info(var_name) for var_name in var_names]
+        prompt_tokens = max(meta_info["prompt_tokens"] for meta_info in meta_infos)
+        completion_tokens = sum(meta_info["completion_tokens"] for meta_info in meta_infos)
+    except Exception:
+        return
+    metrics.observe("llm_prompt_tokens", prompt_tokens, buckets=TOKEN_BUCKETS, stage="node_generation", mode=mode)
+    metrics.observe("llm_completion_tokens", completion_tokens, buckets=TOKEN_BUCKETS, stage="node_generation", mode=mode)
+
+trailing_comma_pattern = re.compile(r",(\s*[}\]])")
+
 def driver_character_gen(name, user_information):
-    state = character_gen.run(name=name, user=user_information)
-    result = state.text()
+    with metrics.span("llm_request", stage="node_generation", mode="regex"):
+        state = sgl_programs()["character_gen"].run(name=name, user=user_information)
+        result = state.text()
+    record_generation_tokens(state, ["json_output"], "regex")
     json_start = result.find('The JSON output is:\n') + 20
     json_str = result[json_start:]
     try:
-        json_data = json.loads(json_str)
-        return json_data
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        pass
+    try:
+        # Outputs of the earlier json_regex, which ended the node with a trailing comma
+        return json.loads(trailing_comma_pattern.sub(r"\1", json_str))
     except json.JSONDecodeError:
+        metrics.inc("parse_failures", stage="node_generation")
         print(f"Failed to decode JSON for {name}")
         print(json_str)
         return {}
 
+def driver_character_gen_skeleton(name, user_information):
+    with metrics.span("llm_request", stage="node_generation", mode="skeleton"):
+        state = sgl_programs()["character_gen_slots"].run(name=name, user=user_information)
+        slots = {slot: state[slot].strip() for slot in slot_regex}
+    record_generation_tokens(state, list(slot_regex), "skeleton")
+    return fill_http_skeleton(name, slots)
+
+generation_drivers = {
+    "regex": driver_character_gen,
+    "skeleton": driver_character_gen_skeleton,
+}
+
+def generate_node_with_retries(client, generate_node, name, user_information, key=None):
+    """
+    Run a generation driver through the ResilientClient; an empty node (undecodable JSON) is retried
+    once (RetryPolicy.max_malformed_attempts), since the regex fixes the structure and only the
+    sampled free-text fields can differ on a retry.
+    SGL programs take no per-request timeout, so only the retries, the circuit breaker and the
+    dead-letter file apply.
+    """
+    def attempt(timeout):
+        node = generate_node(name=name, user_information=user_information)
+        if not node:
+            raise MalformedResponseError(f"No valid node JSON generated for {name}")
+        return node
+    return client.call(attempt, key=key or name, payload={"name": name, "user_information": user_information})
+
 # --- Functions for Tool and API Data Processing ---
 def get_white_list(tool_root_dir):
     white_list_dir = os.path.join(tool_root_dir)
@@ -95,6 +260,27 @@ def build_tool_description(data_dict, white_list, tool_root_dir):
     tool_descriptions = [[cont["standard_tool_name"], cont["description"]] for cont in tool_des]
     return tool_descriptions
 
+def make_api_json(cate_name, tool_json, api_dict, code_cate, code_tool, code_api):
+    api_json = {}
+    api_json["category_name"] = cate_name
+    api_json["api_name"] = api_dict["name"]
+
+    api_json['code_cate'] = code_cate
+    api_json['code_tool'] = code_tool
+    api_json['code_api'] = code_api
+
+    api_json["api_description"] = api_dict["description"]
+    api_json["required_parameters"] = api_dict["required_parameters"]
+    api_json["optional_parameters"] = api_dict["optional_parameters"]
+    api_json["tool_name"] = tool_json["tool_name"]
+    return api_json
+
+@functools.lru_cache(maxsize=None)
+def load_tool_json(path):
+    # Tool files are shared by many queries and only read, so each one is parsed once per process
+    with open(path, "r", encoding='utf-8') as reader:
+        return json.load(reader)
+
 def fetch_api_json(query_json, tool_root_dir):
     data_dict = {"api_list": []}
     for item in query_json["api_list"]:
@@ -102,7 +288,7 @@ def fetch_api_json(query_json, tool_root_dir):
         tool_name = standardize(item["tool_name"])
         api_name = change_name(standardize(item["api_name"]))
 
-        tool_json = json.load(open(os.path.join(tool_root_dir, cate_name, tool_name + ".json"), "r", encoding='utf-8'))
+        tool_json = load_tool_json(os.path.join(tool_root_dir, cate_name, tool_name + ".json"))
         append_flag = False
         api_dict_names = []
         for api_dict in tool_json["api_list"]:
@@ -110,18 +296,7 @@ def fetch_api_json(query_json, tool_root_dir):
             pure_api_name = change_name(standardize(api_dict["name"]))
             if pure_api_name != api_name:
                 continue
-            api_json = {}
-            api_json["category_name"] = cate_name
-            api_json["api_name"] = api_dict["name"]
-
-            api_json['code_cate'] = item["category_name"]
-            api_json['code_tool'] = item["tool_name"]
-            api_json['code_api'] = item["api_name"]
-
-            api_json["api_description"] = api_dict["description"]
-            api_json["required_parameters"] = api_dict["required_parameters"]
-            api_json["optional_parameters"] = api_dict["optional_parameters"]
-            api_json["tool_name"] = tool_json["tool_name"]
+            api_json = make_api_json(cate_name, tool_json, api_dict, item["category_name"], item["tool_name"], item["api_name"])
             data_dict["api_list"].append(api_json)
             append_flag = True
             break
@@ -224,66 +399,177 @@ def api_json_to_openai_json(api_json, standard_tool_name):
 
     return templete
 
-def process_queries(file_path, output_file, tool_root_dir):
+def export_openai_schemas(tool_root_dir, schema_store):
+    """
+    Convert every API of every tool under tool_root_dir into the schema store in one pass.
+    """
+    for cate in tqdm(os.listdir(tool_root_dir), desc="Exporting schemas"):
+        if not os.path.isdir(os.path.join(tool_root_dir, cate)):
+            continue
+        for file in os.listdir(os.path.join(tool_root_dir, cate)):
+            if not file.endswith(".json"):
+                continue
+            standard_tool_name = file.split(".")[0]
+            with open(os.path.join(tool_root_dir, cate, file), encoding='UTF-8') as reader:
+                tool_json = json.load(reader)
+            for api_dict in tool_json.get("api_list", []):
+                api_json = make_api_json(cate, tool_json, api_dict, cate, tool_json["tool_name"], api_dict["name"])
+                schema_store.get(api_json, standard_tool_name, api_json_to_openai_json)
+    return schema_store
+
+def process_query_item(item, tool_root_dir, white_list, schema_store):
+    data_dict = fetch_api_json(item, tool_root_dir)
+    tool_descriptions = build_tool_description(data_dict, white_list, tool_root_dir)
+
+    item_result = {
+        "query_id": item["query_id"],
+        "processed_apis": []
+    }
+
+    for k, api_json in enumerate(data_dict["api_list"]):
+        if k < len(tool_descriptions):
+            standard_tool_name = tool_descriptions[k][0]
+            openai_function_json = schema_store.get(api_json, standard_tool_name, api_json_to_openai_json)
+            item_result["processed_apis"].append(openai_function_json)
+
+    return item_result
+
+# Read-only state of a query worker process, inherited from the parent when the pool starts
+_query_worker = {}
+
+def _init_query_worker(tool_root_dir, white_list, schemas):
+    _query_worker["tool_root_dir"] = tool_root_dir
+    _query_worker["white_list"] = white_list
+    _query_worker["schema_store"] = SchemaStore()
+    _query_worker["schema_store"].schemas = schemas
+
+def _process_query_shard(shard):
+    schema_store = _query_worker["schema_store"]
+    results = [
+        process_query_item(item, _query_worker["tool_root_dir"], _query_worker["white_list"], schema_store)
+        for item in shard
+    ]
+    # Hand newly converted schemas back so the parent store can persist them
+    new_schemas = {key: schema_store.schemas[key] for key in schema_store.added}
+    stats = (schema_store.hits, schema_store.misses)
+    schema_store.added.clear()
+    schema_store.hits = schema_store.misses = 0
+    return results, new_schemas, stats
+
+def process_queries(file_path, output_file, tool_root_dir, schema_store=None, num_workers=1, shard_size=256):
     white_list = get_white_list(tool_root_dir)
+    schema_store = schema_store if schema_store is not None else SchemaStore()
 
     with open(file_path, 'r', encoding='utf-8') as file:
         data = json.load(file)
 
     processed_data = []
 
-    for item in tqdm(data):
-        data_dict = fetch_api_json(item, tool_root_dir)
-        tool_descriptions = build_tool_description(data_dict, white_list, tool_root_dir)
-
-        item_result = {
-            "query_id": item["query_id"],
-            "processed_apis": []
-        }
-
-        for k, api_json in enumerate(data_dict["api_list"]):
-            if k < len(tool_descriptions):
-                standard_tool_name = tool_descriptions[k][0]
-                openai_function_json = api_json_to_openai_json(api_json, standard_tool_name)
-                item_result["processed_apis"].append(openai_function_json)
-
-        processed_data.append(item_result)
+    if num_workers <= 1:
+        for item in tqdm(data):
+            processed_data.append(process_query_item(item, tool_root_dir, white_list, schema_store))
+    else:
+        shards = [data[start:start + shard_size] for start in range(0, len(data), shard_size)]
+        with multiprocessing.Pool(num_workers, initializer=_init_query_worker,
+                                  initargs=(tool_root_dir, white_list, schema_store.schemas)) as pool:
+            # imap yields shards in submission order, so the merged output matches the serial order
+            with tqdm(total=len(data)) as progress:
+                for results, new_schemas, (hits, misses) in pool.imap(_process_query_shard, shards):
+                    processed_data.extend(results)
+                    schema_store.merge(new_schemas)
+                    schema_store.hits += hits
+                    schema_store.misses += misses
+                    progress.update(len(results))
 
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(processed_data, f, indent=4)
 
-    print(f"Processed data saved to {output_file}")
+    schema_store.save()
+    print(f"Processed data saved to {output_file} ({schema_store.hits} schema cache hits, {schema_store.misses} conversions)")
 
 # --- Main Function to Combine Both Processes ---
-def main_processing(input_file, output_file, query_file, tool_root_dir, sgl_url):
+def main_processing(input_file, output_file, query_file, tool_root_dir, sgl_url, generation_mode="regex",
+                    node_cache_file=None, cache_save_every=100, schema_cache_file=None, num_workers=1,
+                    client=None, replay=False):
+    import sglang as sgl
     sgl.set_default_backend(sgl.RuntimeEndpoint(sgl_url))
+    generate_node = generation_drivers[generation_mode]
+    client = client or ResilientClient("node_generation", registry=metrics)
 
     data = load_data(input_file)
 
-    http_requests = extract_http_requests(data)
-    updates = {}
-    for request_name in tqdm(http_requests.keys(), desc="Processing HTTP requests"):
-        request_details = http_requests[request_name]
-        if not request_details:
-            continue
-        new_details = driver_character_gen(name=request_name, user_information=request_details)
-        updates[request_name] = new_details
-
-    updated_data = update_http_requests(data, updates)
-
-    process_queries(input_file, query_file, tool_root_dir)
+    # Each unique node request is generated once and shared by every workflow that contains it
+    unique_requests = collect_unique_http_requests(data, generation_mode)
+    node_cache = load_node_cache(node_cache_file)
+    pending = [request_hash for request_hash in unique_requests if request_hash not in node_cache]
+    print(f"{len(unique_requests)} unique HTTP requests, {len(unique_requests) - len(pending)} found in the node cache.")
+    metrics.inc("cache_hits", len(unique_requests) - len(pending), cache="node")
+    metrics.inc("cache_misses", len(pending), cache="node")
+    if replay:
+        # Every other node comes from the node cache, only the dead-lettered ones are generated again
+        failed = take_dead_letters(client.dead_letters.path) if client.dead_letters is not None else {}
+        pending = [request_hash for request_hash in pending if request_hash in failed]
+        print(f"Replaying {len(pending)} failed HTTP requests.")
+
+    def generate(request_hash):
+        request_name, request_details = unique_requests[request_hash]
+        return generate_node_with_retries(client, generate_node, request_name, request_details, request_hash)
+
+    # Nodes are generated concurrently, longest requests first; the client's concurrency limiter decides how many are in flight
+    work = client.dispatch(pending, generate, length=lambda request_hash: estimate_tokens(unique_requests[request_hash]))
+    for n, (request_hash, node, error) in enumerate(tqdm(work, desc="Processing HTTP requests", total=len(pending)), start=1):
+        if isinstance(error, LLMCallFailed):
+            # Failed generations are not cached so that they are retried on the next run
+            print(f"Failed to generate {unique_requests[request_hash][0]}: {error.error}")
+        elif error is not None:
+            raise error
+        else:
+            node_cache[request_hash] = node
+        if n % cache_save_every == 0:
+            save_node_cache(node_cache, node_cache_file)
+    save_node_cache(node_cache, node_cache_file)
+    client.report()
+
+    updated_data = apply_http_updates(data, node_cache, generation_mode)
+
+    schema_store = SchemaStore(schema_cache_file)
+    process_queries(input_file, query_file, tool_root_dir, schema_store, num_workers)
+    metrics.inc("cache_hits", schema_store.hits, cache="schema")
+    metrics.inc("cache_misses", schema_store.misses, cache="schema")
 
     save_new_json(updated_data, output_file)
 
 # --- Argument Parsing and Execution ---
-if __name__ == "__main__":
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Process workflow templates, API queries, and generate JSON outputs.")
     parser.add_argument('--input_file', type=str, required=True, help="Path to the input JSON file.")
     parser.add_argument('--output_file', type=str, required=True, help="Path to save the output JSON file.")
     parser.add_argument('--query_file', type=str, required=True, help="Path to save the query JSON file.")
     parser.add_argument('--tool_root_dir', type=str, required=True, help="Root directory of the tool JSON files.")
     parser.add_argument('--sgl_url', type=str, default="http://localhost:30000", help="URL of the SGL backend.")
+    parser.add_argument('--generation_mode', type=str, default="regex", choices=list(generation_drivers),
+                        help="regex: generate the whole node JSON; skeleton: generate only the variable fields.")
+    parser.add_argument('--node_cache', type=str, default=None, help="Path to a persistent JSON cache of generated HTTP nodes.")
+    parser.add_argument('--schema_cache', type=str, default=None, help="Path to a persistent OpenAI-function schema store.")
+    parser.add_argument('--num_workers', type=int, default=1, help="Number of processes used to build the query file.")
+    parser.add_argument('--metrics_file', type=str, default=None, help="Path to save the stage metrics (.json, otherwise OpenMetrics text).")
+    parser.add_argument('--replay', action='store_true', help="Only regenerate the nodes of the dead-letter file (requires --node_cache).")
+    add_client_args(parser)
+    add_profile_args(parser)
+
+    args = parser.parse_args(argv)
+    if args.replay and not args.node_cache:
+        parser.error("--replay requires the --node_cache of the original run")
+
+    with profiled(args, "inference"):
+        client = client_from_args(args, "node_generation", f"{args.output_file}.failed.jsonl", metrics)
+        main_processing(args.input_file, args.output_file, args.query_file, args.tool_root_dir, args.sgl_url,
+                        args.generation_mode, args.node_cache, schema_cache_file=args.schema_cache, num_workers=args.num_workers,
+                        client=client, replay=args.replay)
+
+        if args.metrics_file:
+            metrics.export(args.metrics_file)
+            print(f"Metrics saved to {args.metrics_file}")
 
-    args = parser.parse_args()
-
-    main_processing(args.input_file, args.output_file, args.query_file, args.tool_root_dir, args.sgl_url)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Counters, histograms and spans shared by the framework stages.
+
+Every stage records into the module-level `metrics` registry and exports it at the end of the
+run with `--metrics_file`: a .json path gives a JSON snapshot, any other path the OpenMetrics
+text format.
+
+    with metrics.span("llm_request", stage="rerank"):
+        ...
+    metrics.inc("cache_hits", cache="node")
+    metrics.observe("llm_completion_tokens", 123, buckets=TOKEN_BUCKETS, stage="rerank")
+"""
+
+import json
+import math
+import bisect
+import time
+import threading
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with count, sum, min and max.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        """
+        (upper bound, cumulative count) pairs, ending with (inf, count).
+        """
+        total, pairs = 0, []
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def quantile(self, q):
+        """
+        Estimate a quantile by linear interpolation inside the bucket that contains it.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower, previous = 0.0, 0
+        for bound, total in self.cumulative():
+            if total >= rank:
+                upper = self.max if math.isinf(bound) else bound
+                lower = max(lower, self.min)
+                if total == previous:
+                    return upper
+                return min(lower + (upper - lower) * (rank - previous) / (total - previous), self.max)
+            lower, previous = bound, total
+        return self.max
+
+
+class Metrics:
+    """
+    Thread-safe registry of labelled counters and histograms.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """
+        Time a block into the `<name>_seconds` histogram; failed blocks also count `<name>_errors`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc(f"{name}_errors", **labels)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - start, **labels)
+
+    def counter(self, name, **labels):
+        return self.counters.get(self.key(name, labels), 0)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: {"counters": {name: [{labels, value}]}, "histograms": {name: [{labels, count, sum, ...}]}}
+        """
+        with self.lock:
+            counters, histograms = {}, {}
+            for (name, labels), value in sorted(self.counters.items()):
+                counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                histograms.setdefault(name, []).append({
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "min": histogram.min if histogram.count else None,
+                    "max": histogram.max if histogram.count else None,
+                    "mean": histogram.sum / histogram.count if histogram.count else None,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                    "buckets": [["+Inf" if math.isinf(bound) else bound, total] for bound, total in histogram.cumulative()],
+                })
+        return {"counters": counters, "histograms": histograms}
+
+    def to_openmetrics(self):
+        """
+        Render the registry in the OpenMetrics text exposition format.
+        """
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+            return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+        lines = []
+        with self.lock:
+            families = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                families.setdefault(name, []).append((labels, value))
+            for name, samples in families.items():
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}_total{label_text(labels)} {value}" for labels, value in samples)
+
+            families = {}
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                families.setdefault(name, []).append((labels, histogram))
+            for name, samples in families.items():
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in samples:
+                    for bound, total in histogram.cumulative():
+                        le = "+Inf" if math.isinf(bound) else repr(float(bound))
+                        lines.append(f"{name}_bucket{label_text(labels, [('le', le)])} {total}")
+                    lines.append(f"{name}_sum{label_text(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{label_text(labels)} {histogram.count}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """
+        Write the metrics to `path`: JSON for .json files, OpenMetrics text otherwise.
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            if str(path).lower().endswith(".json"):
+                json.dump(self.snapshot(), f, indent=4)
+            else:
+                f.write(self.to_openmetrics())
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+metrics = Metrics()
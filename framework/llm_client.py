@@ -0,0 +1,645 @@
+"""
+Fault-tolerant call layer shared by the LLM stages.
+
+ResilientClient.call(fn, key, payload) runs fn(timeout) with
+  - jittered exponential backoff on transient failures (timeouts, connection errors, 429/5xx,
+    malformed outputs), honouring Retry-After,
+  - an adaptive timeout derived from the recent latency distribution,
+  - a circuit breaker that stops sending requests to a failing server for a cooldown,
+  - a JSONL dead-letter file for items that still fail, which a stage replays with --replay
+    instead of rerunning everything,
+  - an adaptive concurrency limit that follows the server latency (AdaptiveConcurrencyLimiter),
+    with dispatch() running a stage's items concurrently under that limit, longest prompts first
+    in buckets of similar length.
+
+The module has no framework imports, so both the framework-style and the bare-import stages use
+it; each stage passes its own metrics registry.
+"""
+
+import os
+import json
+import math
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+# Responses that mean the server is saturated; they shrink the concurrency limit
+OVERLOAD_STATUS = {429, 503, 504}
+CONCURRENCY_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+class MalformedResponseError(Exception):
+    """
+    The server answered, but the output could not be parsed; retried like a transient failure.
+    """
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised without contacting the server when the half-open trial call a caller waited for failed.
+    """
+    def __init__(self, retry_after):
+        super().__init__("Circuit breaker open: the trial call to the server failed")
+        self.retry_after = retry_after
+
+
+class LLMCallFailed(Exception):
+    """
+    Raised by ResilientClient.call once all attempts failed; the item is in the dead-letter file.
+    """
+    def __init__(self, key, attempts, error):
+        super().__init__(f"{key}: failed after {attempts} attempts: {error}")
+        self.key = key
+        self.attempts = attempts
+        self.error = error
+
+
+def status_code(error):
+    """
+    HTTP status of a requests/openai error, or None.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error):
+    """
+    Transient failures worth retrying: timeouts, connection errors, retryable HTTP statuses,
+    malformed outputs and an open circuit breaker. Client errors such as 400 are not retried.
+    """
+    if isinstance(error, (MalformedResponseError, CircuitOpenError, TimeoutError, ConnectionError)):
+        return True
+    status = status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # requests.Timeout / requests.ConnectionError and openai.APITimeoutError / APIConnectionError
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+def is_overload(error):
+    """
+    Failures that signal a saturated server: 429/503/504 and timeouts.
+    """
+    status = status_code(error)
+    if status is not None:
+        return status in OVERLOAD_STATUS
+    return isinstance(error, TimeoutError) or "Timeout" in type(error).__name__
+
+
+def retry_after(error):
+    """
+    Seconds requested by a Retry-After header or an open circuit breaker, or None.
+    """
+    if isinstance(error, CircuitOpenError):
+        return error.retry_after
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: attempt n waits uniform(0, min(max_delay, base_delay * 2**n)).
+
+    Malformed outputs get at most `max_malformed_attempts` attempts: a retry only helps when the
+    output was sampled badly, and when it is malformed on every attempt the rest of the budget
+    would be spent for nothing.
+    """
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=30.0, seed=None, max_malformed_attempts=2):
+        self.max_attempts = max_attempts
+        self.max_malformed_attempts = max_malformed_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def delay(self, attempt, error=None):
+        with self.lock:
+            delay = self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        requested = retry_after(error)
+        return max(delay, min(requested, self.max_delay)) if requested is not None else delay
+
+
+class AdaptiveTimeout:
+    """
+    Per-request timeout of `multiplier` times the p95 of the recent successful latencies,
+    clamped to [min_timeout, max_timeout]. Until `min_samples` latencies are known it is max_timeout.
+    """
+    def __init__(self, min_timeout=5.0, max_timeout=120.0, multiplier=3.0, window=200, min_samples=10):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+
+    def current(self):
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return self.max_timeout
+            ordered = sorted(self.latencies)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        return min(self.max_timeout, max(self.min_timeout, self.multiplier * p95))
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and holds calls back for `cooldown` seconds.
+    Afterwards one trial call is let through (half-open): success closes the circuit, failure
+    opens it again.
+
+    Callers wait for the breaker instead of failing fast, so a short outage does not use up the
+    attempts of every queued item. Only a failed trial counts as an attempt of the callers that
+    were waiting for it, which lets items still reach the dead-letter file when the server stays down.
+    """
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        # Incremented every time the circuit opens, so waiters can tell that a trial failed
+        self.openings = 0
+        self.condition = threading.Condition()
+
+    @property
+    def state(self):
+        with self.condition:
+            if self.opened_at is None:
+                return "closed"
+            return "open" if time.monotonic() - self.opened_at < self.cooldown else "half_open"
+
+    def before_call(self):
+        """
+        Wait until a call may go through: the circuit is closed, or this call is the half-open trial.
+
+        Raises:
+            CircuitOpenError: When a trial call failed while this caller was waiting.
+        """
+        with self.condition:
+            openings = self.openings
+            while self.opened_at is not None:
+                if self.openings != openings:
+                    # The wait for the next cooldown is done by the next before_call
+                    raise CircuitOpenError(0.0)
+                remaining = self.cooldown - (time.monotonic() - self.opened_at)
+                if remaining > 0:
+                    self.condition.wait(remaining)
+                elif not self.trial_in_flight:
+                    self.trial_in_flight = True
+                    return
+                else:
+                    self.condition.wait()
+
+    def on_success(self):
+        with self.condition:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+            self.condition.notify_all()
+
+    def on_neutral(self):
+        """
+        Record a call whose outcome says nothing about the server's health, such as a malformed
+        output or a client error: the state is kept, and a half-open trial is handed to the next caller.
+        """
+        with self.condition:
+            if self.trial_in_flight:
+                self.trial_in_flight = False
+                self.condition.notify_all()
+
+    def on_failure(self):
+        """
+        Returns:
+            bool: Whether this failure opened the circuit.
+        """
+        with self.condition:
+            self.failures += 1
+            was_trial, self.trial_in_flight = self.trial_in_flight, False
+            self.condition.notify_all()
+            if was_trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self.openings += 1
+                return True
+            return False
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limit on in-flight requests that follows the server latency, so a stage settles near the
+    server's knee point (the concurrency beyond which latency grows faster than throughput).
+
+    The latency signal is a moving average of the request latency; its minimum over the last
+    `baseline_window` samples is the baseline, i.e. the latency without queueing. Taking the
+    minimum of the average rather than of single samples keeps a mix of short and long prompts
+    from reading as congestion.
+      - gradient: every round of limit-many samples moves the limit a `smoothing` share towards
+        limit * clamp(tolerance * baseline / latency, 0.5, 1), plus sqrt(limit) while latency
+        stays within tolerance, so the limit grows by about sqrt(limit) per round until latency
+        leaves the tolerance and then shrinks in proportion to the inflation.
+      - aimd: +1 per limit-many samples within tolerance, times `backoff` (at most once per
+        limit-many samples) when latency exceeds it.
+      - fixed: the limit stays at `initial_limit`.
+    When the minimum rises from one window to the next, the limit is halved for two rounds so a
+    standing queue drains and the baseline is measured again (as in TCP BBR's ProbeRTT).
+    In every mode, overload responses (429/503/504, timeouts) multiply the limit by `backoff`.
+    The limit only grows while at least half of it is in use, so an idle stage does not inflate it.
+
+    Args:
+        initial_limit (int): Starting limit.
+        min_limit (int): Lower bound of the limit.
+        max_limit (int): Upper bound of the limit.
+        mode (str): "gradient", "aimd" or "fixed".
+        tolerance (float): Latency inflation over the baseline that is still accepted.
+        smoothing (float): Weight of a new sample in the latency average, and share of the gradient step per round.
+        backoff (float): Multiplicative decrease.
+        baseline_window (int): Samples over which the baseline minimum is taken.
+    """
+    def __init__(self, initial_limit=8, min_limit=1, max_limit=64, mode="gradient", tolerance=1.5, smoothing=0.2,
+                 backoff=0.9, baseline_window=500):
+        if mode not in ("gradient", "aimd", "fixed"):
+            raise ValueError(f"Unknown concurrency mode: {mode}")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.mode = mode
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.backoff = backoff
+        self.baseline_window = baseline_window
+        self.latency = None
+        # Minimum of the latency average in the current and the previous window
+        self.window_min = self.previous_min = math.inf
+        self.samples = 0
+        self.last_decrease = 0
+        self.probe_limit = self.probe_end = None
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    @property
+    def baseline(self):
+        return min(self.window_min, self.previous_min)
+
+    def acquire(self):
+        """
+        Wait for a free slot.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        start = time.perf_counter()
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+        return time.perf_counter() - start
+
+    def release(self, latency=None, overloaded=False):
+        """
+        Free a slot and update the limit.
+
+        Args:
+            latency (float): Latency of a successful request, or None when there is no sample.
+            overloaded (bool): The request failed with an overload response.
+        """
+        with self.condition:
+            app_limited = self.in_flight < self.limit / 2
+            self.in_flight -= 1
+            if self.mode != "fixed":
+                if overloaded:
+                    self._decrease()
+                elif latency is not None:
+                    self._update(latency, app_limited)
+            self.condition.notify_all()
+
+    def _decrease(self):
+        # Requests already in flight still report the old latency; decrease once per round of them
+        if self.samples - self.last_decrease >= self.limit or self.last_decrease == 0:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            self.last_decrease = self.samples or 1
+
+    def _update(self, latency, app_limited):
+        self.samples += 1
+        if self.latency is None:
+            self.latency = latency
+        self.latency += self.smoothing * (latency - self.latency)
+        self.window_min = min(self.window_min, self.latency)
+        if self.samples % self.baseline_window == 0:
+            if self.window_min > 1.1 * self.baseline and self.probe_end is None:
+                # A rising minimum is either a slower server or a queue that never drained; drain it
+                # for two rounds at half the limit so the next window measures the latency without it
+                self.probe_limit, self.probe_end = self.limit, self.samples + 2 * int(self.limit)
+                self.limit = max(self.min_limit, self.limit / 2)
+            self.previous_min, self.window_min = self.window_min, math.inf
+        if self.probe_end is not None:
+            if self.samples < self.probe_end:
+                return
+            self.limit, self.probe_end = self.probe_limit, None
+
+        if self.mode == "aimd":
+            if self.latency > self.tolerance * self.baseline:
+                self._decrease()
+            elif not app_limited:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            return
+        gradient = min(1.0, max(0.5, self.tolerance * self.baseline / self.latency))
+        grow = not app_limited and gradient == 1.0
+        target = self.limit * gradient + (math.sqrt(self.limit) if grow else 0)
+        # Spread the step over a round of limit-many samples, as they all report about the same latency
+        step = self.smoothing * (target - self.limit) / self.limit
+        self.limit = min(self.max_limit, max(self.min_limit, self.limit + step))
+
+
+def estimate_tokens(text):
+    """
+    Rough token count (about four characters per token), so requests can be scheduled without
+    loading the model's tokenizer. Non-string payloads are measured as JSON.
+    """
+    if not isinstance(text, str):
+        text = json.dumps(text, ensure_ascii=False)
+    return max(1, len(text) // 4)
+
+
+def schedule_by_length(items, length, base=2.0):
+    """
+    Order items by estimated length: longest bucket first, where bucket k holds the items of
+    base**k to base**(k+1) tokens, and the original order within a bucket.
+
+    Similar lengths reach the server together, which batches them with less padding and fewer
+    long prefills stalling short decodes, and the longest requests start first instead of
+    finishing last (longest-processing-time-first keeps the tail of a run short). Keeping the
+    original order within a bucket keeps prompts that share a prefix close together.
+
+    Args:
+        items (iterable): Items to order.
+        length (callable): Estimated token length of an item.
+        base (float): Ratio between the bounds of a bucket.
+
+    Returns:
+        list: The reordered items.
+    """
+    keyed = [(math.floor(math.log(max(length(item), 1), base)), n, item) for n, item in enumerate(items)]
+    keyed.sort(key=lambda entry: (-entry[0], entry[1]))
+    return [item for _, _, item in keyed]
+
+
+def dispatch(items, fn, max_workers=64, length=None):
+    """
+    Run fn(item) for every item on a thread pool and yield the results as they complete.
+
+    Only a bounded window of items is submitted at a time, so large inputs are not materialised
+    as futures up front. The number of requests actually in flight is set by the
+    AdaptiveConcurrencyLimiter of the client that fn calls, so max_workers only has to be at
+    least the limiter's max_limit.
+
+    Args:
+        items (iterable): Items to process.
+        fn (callable): Called with one item at a time.
+        max_workers (int): Threads of the pool.
+        length (callable): Estimated token length of an item. When given, items are submitted in
+            the order of schedule_by_length instead of the input order.
+
+    Yields:
+        tuple: (item, result, error), where error is the exception raised by fn or None.
+    """
+    items = iter(schedule_by_length(items, length) if length is not None else items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+
+        def submit_next():
+            item = next(items, _EXHAUSTED)
+            if item is _EXHAUSTED:
+                return False
+            in_flight[executor.submit(fn, item)] = item
+            return True
+
+        while len(in_flight) < max_workers * 2 and submit_next():
+            pass
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = in_flight.pop(future)
+                error = future.exception()
+                yield item, None if error else future.result(), error
+                submit_next()
+
+
+_EXHAUSTED = object()
+
+
+class DeadLetterFile:
+    """
+    Append-only JSONL file of items that failed all attempts: {"key", "payload", "error", "attempts", "time"}.
+    The file is only created when the first item fails.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def write(self, key, payload, error, attempts):
+        record = {"key": key, "payload": payload, "error": f"{type(error).__name__}: {error}",
+                  "attempts": attempts, "time": time.time()}
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.count += 1
+
+
+def read_dead_letters(path):
+    """
+    Read a dead-letter file; a key that failed several times keeps its last record.
+
+    Returns:
+        dict: {key: payload}
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    items = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                items[record["key"]] = record["payload"]
+    return items
+
+
+def take_dead_letters(path):
+    """
+    Read a dead-letter file for a replay and remove it, so that the replay writes only the items
+    that fail again.
+
+    Returns:
+        dict: {key: payload}
+    """
+    items = read_dead_letters(path)
+    if items:
+        os.replace(path, path + ".replayed")
+    return items
+
+
+class ResilientClient:
+    """
+    Runs LLM calls with retries, adaptive timeouts, a circuit breaker and a dead-letter file.
+
+    Args:
+        stage (str): Stage label of the recorded metrics.
+        retry (RetryPolicy): Backoff policy.
+        timeout (AdaptiveTimeout): Timeout policy.
+        breaker (CircuitBreaker): Circuit breaker shared by all calls of the stage.
+        dead_letter_file (str): Path of the JSONL dead-letter file (None to keep failures in memory only).
+        registry: Metrics registry (framework/instrumentation.py) the stage exports, or None.
+        limiter (AdaptiveConcurrencyLimiter): Limit on the requests in flight across all threads
+            using this client (None for no limit).
+        schedule (str): Order in which dispatch() sends the items: "length" (schedule_by_length)
+            or "fifo" (input order).
+    """
+    def __init__(self, stage, retry=None, timeout=None, breaker=None, dead_letter_file=None, registry=None, limiter=None,
+                 schedule="length"):
+        self.stage = stage
+        self.retry = retry or RetryPolicy()
+        self.timeout = timeout or AdaptiveTimeout()
+        self.breaker = breaker or CircuitBreaker()
+        self.dead_letters = DeadLetterFile(dead_letter_file) if dead_letter_file else None
+        self.registry = registry
+        self.limiter = limiter
+        self.schedule = schedule
+        self.failed = []
+
+    @property
+    def max_concurrency(self):
+        return self.limiter.max_limit if self.limiter is not None else 1
+
+    def _inc(self, name, **labels):
+        if self.registry is not None:
+            self.registry.inc(name, stage=self.stage, **labels)
+
+    def call(self, fn, key=None, payload=None):
+        """
+        Call fn(timeout) until it succeeds or the attempts are exhausted.
+
+        Args:
+            fn (callable): Performs one request with the given timeout in seconds and returns the
+                result; raises MalformedResponseError when the output cannot be used.
+            key (str): Item id written to the dead-letter file.
+            payload: JSON-serialisable input needed to replay the item.
+
+        Returns:
+            The result of fn.
+
+        Raises:
+            LLMCallFailed: After the item was written to the dead-letter file. Non-retryable
+                errors fail on the first attempt.
+        """
+        error = None
+        malformed = 0
+        for attempt in range(self.retry.max_attempts):
+            if attempt:
+                self._inc("llm_retries")
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError as e:
+                error = e
+            else:
+                if self.limiter is not None:
+                    queue_time = self.limiter.acquire()
+                    if self.registry is not None:
+                        self.registry.observe("llm_queue_seconds", queue_time, stage=self.stage)
+                start = time.perf_counter()
+                latency, overloaded = None, False
+                try:
+                    result = fn(self.timeout.current())
+                    latency = time.perf_counter() - start
+                except Exception as e:
+                    error = e
+                    overloaded = is_overload(e)
+                    # Malformed outputs and client errors neither count against the server nor close the circuit
+                    if isinstance(e, MalformedResponseError) or not is_retryable(e):
+                        self.breaker.on_neutral()
+                    elif self.breaker.on_failure():
+                        self._inc("circuit_breaker_opened")
+                finally:
+                    if self.limiter is not None:
+                        self.limiter.release(latency, overloaded)
+                        if self.registry is not None:
+                            self.registry.observe("concurrency_limit", self.limiter.limit, buckets=CONCURRENCY_BUCKETS,
+                                                  stage=self.stage)
+                if latency is not None:
+                    self.breaker.on_success()
+                    self.timeout.record(latency)
+                    return result
+            if isinstance(error, MalformedResponseError):
+                malformed += 1
+            if not is_retryable(error) or malformed >= self.retry.max_malformed_attempts:
+                break
+            if attempt + 1 < self.retry.max_attempts:
+                time.sleep(self.retry.delay(attempt, error))
+        attempts = attempt + 1
+        self._inc("llm_dead_letters")
+        self.failed.append(key)
+        if self.dead_letters is not None:
+            self.dead_letters.write(key, payload, error, attempts)
+        raise LLMCallFailed(key, attempts, error) from error
+
+    def dispatch(self, items, fn, length=estimate_tokens):
+        """
+        dispatch() with as many workers as the concurrency limit allows, in the order of the
+        client's schedule.
+
+        Args:
+            length (callable): Estimated token length of an item (used by the "length" schedule).
+        """
+        return dispatch(items, fn, self.max_concurrency, length if self.schedule == "length" else None)
+
+    def report(self):
+        if self.limiter is not None and self.limiter.mode != "fixed":
+            print(f"{self.stage}: adaptive concurrency limit settled at {self.limiter.limit:.1f}.")
+        if self.failed:
+            where = f" and written to {self.dead_letters.path}" if self.dead_letters is not None else ""
+            print(f"{len(self.failed)} {self.stage} items failed after retries{where}.")
+
+
+def add_client_args(parser):
+    """
+    Add the retry, timeout, circuit-breaker and dead-letter options of ResilientClient to a parser.
+    """
+    parser.add_argument('--max_attempts', type=int, default=4, help="Attempts per LLM request before it is dead-lettered.")
+    parser.add_argument('--retry_base_delay', type=float, default=0.5, help="Base delay of the jittered exponential backoff.")
+    parser.add_argument('--min_timeout', type=float, default=5.0, help="Lower bound of the adaptive request timeout.")
+    parser.add_argument('--max_timeout', type=float, default=300.0, help="Upper bound (and initial value) of the adaptive request timeout.")
+    parser.add_argument('--breaker_threshold', type=int, default=5, help="Consecutive failures that open the circuit breaker.")
+    parser.add_argument('--breaker_cooldown', type=float, default=30.0, help="Seconds the open circuit breaker rejects requests.")
+    parser.add_argument('--dead_letter_file', type=str, default=None, help="JSONL file of failed items (default: <output>.failed.jsonl).")
+    parser.add_argument('--concurrency_mode', type=str, default="gradient", choices=["gradient", "aimd", "fixed"],
+                        help="How the number of in-flight LLM requests follows the server latency.")
+    parser.add_argument('--initial_concurrency', type=int, default=8, help="Starting number of in-flight LLM requests.")
+    parser.add_argument('--max_concurrency', type=int, default=64, help="Upper bound of the in-flight LLM requests.")
+    parser.add_argument('--schedule', type=str, default="length", choices=["length", "fifo"],
+                        help="length: longest prompts first, in buckets of similar length; fifo: input order.")
+    return parser
+
+
+def client_from_args(args, stage, default_dead_letter_file, registry=None):
+    return ResilientClient(
+        stage,
+        retry=RetryPolicy(args.max_attempts, args.retry_base_delay),
+        timeout=AdaptiveTimeout(args.min_timeout, args.max_timeout),
+        breaker=CircuitBreaker(args.breaker_threshold, args.breaker_cooldown),
+        dead_letter_file=args.dead_letter_file or default_dead_letter_file,
+        registry=registry,
+        limiter=AdaptiveConcurrencyLimiter(args.initial_concurrency, max_limit=args.max_concurrency,
+                                           mode=args.concurrency_mode),
+        schedule=args.schedule,
+    )
@@ -0,0 +1,456 @@
+"""
+Local stand-in for the SGLang server, for offline load tests of the LLM stages.
+
+It serves the OpenAI-compatible /v1/chat/completions used by planning.py, evaluation.py and
+rerank_generation.py, and the SGLang /generate and /get_model_info endpoints used by
+sgl.RuntimeEndpoint (inference.py, streaming.py, evaluation.py --mode fork).
+
+Responses are canned but shaped like the real ones: planning prompts get <explanation> and
+<workflow> tags, rerank prompts get a <numbers> tag, judge prompts get a <score> tag, and
+regex-constrained /generate calls get a value that matches the regex. Latency, decode
+throughput, concurrency and error injection are configurable, so client-side concurrency,
+retries and batching can be benchmarked on CPU-only machines:
+
+    python framework/cli.py mock_server --port 30000 --latency_dist lognormal --latency_mean 0.3 \
+        --per_token_latency 0.01 --max_concurrency 32 --tokens_per_second 4000 --error_rate 0.02
+
+GET /metrics returns the request counts and latencies in the OpenMetrics text format.
+"""
+
+import re
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from framework.instrumentation import Metrics, TOKEN_BUCKETS
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal", "exponential")
+
+# --- Canned outputs ---
+
+PLANNING_OUTPUT = (
+    "<explanation>The workflow begins with the Start node to collect user input. An HTTP Request node calls the "
+    "'SearchItems' API to find matching items, and another HTTP Request node calls the 'GetItemDetails' API for the "
+    "best match. The End node returns the details to the user.</explanation>\n"
+    "<workflow>['Start', 'HTTP request (SearchItems)', 'HTTP request (GetItemDetails)', 'End']</workflow>"
+)
+
+HTTP_NODE_OUTPUT = """{
+    "data": {
+        "authorization": {
+            "config": null,
+            "type": "no-auth"
+        },
+        "body": {
+            "data": "",
+            "type": "none"
+        },
+        "desc": "",
+        "headers": "X-RapidAPI-Key:{{#1.key#}}",
+        "method": "get",
+        "params": "query:{{#1.query#}}",
+        "selected": false,
+        "timeout": {
+            "max_connect_timeout": 0,
+            "max_read_timeout": 0,
+            "max_write_timeout": 0
+        },
+        "title": "HTTP \\u8BF7\\u6C42",
+        "type": "http-request",
+        "url": "https://api.example.com/v1/items",
+        "variables": []
+    }
+}"""
+
+# Values tried in order for regex-constrained generation; the first full match is returned
+REGEX_CANDIDATES = (
+    HTTP_NODE_OUTPUT,
+    "\n",
+    "get\n",
+    "https://api.example.com/v1/items\n",
+    "none\n",
+    "<score>8</score>",
+    "<numbers>1</numbers>",
+)
+
+
+def estimate_token_count(text):
+    """
+    Rough token count (about four characters per token) used for the usage fields.
+    """
+    return max(1, len(text) // 4)
+
+
+def canned_chat_output(prompt, rng):
+    """
+    Pick the canned answer matching the tags the prompt asks for.
+    """
+    if "<numbers>" in prompt:
+        # Mostly the first candidate, like a reranker that usually agrees with retrieval
+        choice = rng.choices(range(1, 11), weights=(10, 3, 2, 1, 1, 1, 1, 1, 1, 1))[0]
+        return f"The most relevant workflow is number {choice}.\n<numbers>{choice}</numbers>"
+    if "<score>" in prompt:
+        return f"The workflow follows the trajectory closely.\n<score>{rng.randint(6, 10)}</score>"
+    return PLANNING_OUTPUT
+
+
+def canned_regex_output(regex):
+    pattern = re.compile(regex)
+    for candidate in REGEX_CANDIDATES:
+        if pattern.fullmatch(candidate):
+            return candidate
+    return ""
+
+
+# --- Latency and throughput models ---
+
+class LatencyModel:
+    """
+    Time to first token drawn from a distribution, plus a fixed prefill time per prompt token and a
+    fixed decode time per completion token.
+    """
+    def __init__(self, dist="constant", mean=0.05, std=0.0, per_token=0.0, seed=None, per_prompt_token=0.0):
+        if dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {dist}")
+        self.dist = dist
+        self.mean = mean
+        self.std = std
+        self.per_token = per_token
+        self.per_prompt_token = per_prompt_token
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def first_token(self):
+        with self.lock:
+            if self.dist == "constant":
+                value = self.mean
+            elif self.dist == "uniform":
+                value = self.rng.uniform(self.mean - math.sqrt(3) * self.std, self.mean + math.sqrt(3) * self.std)
+            elif self.dist == "normal":
+                value = self.rng.gauss(self.mean, self.std)
+            elif self.dist == "lognormal":
+                # Parameterized by the mean and standard deviation of the latency itself
+                sigma2 = math.log(1 + (self.std / self.mean) ** 2) if self.mean > 0 else 0.0
+                value = self.rng.lognormvariate(math.log(self.mean) - sigma2 / 2, math.sqrt(sigma2)) if self.mean > 0 else 0.0
+            else:
+                value = self.rng.expovariate(1 / self.mean) if self.mean > 0 else 0.0
+        return max(0.0, value)
+
+
+class DecodeThroughput:
+    """
+    Aggregate decode throughput cap: generated tokens are scheduled on a shared virtual clock,
+    so concurrent requests share `tokens_per_second` between them.
+    """
+    def __init__(self, tokens_per_second=None):
+        self.tokens_per_second = tokens_per_second
+        self.next_free = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens):
+        """
+        Returns:
+            float: Seconds to wait until the tokens have been decoded.
+        """
+        if not self.tokens_per_second:
+            return 0.0
+        now = time.monotonic()
+        with self.lock:
+            self.next_free = max(self.next_free, now) + tokens / self.tokens_per_second
+            return self.next_free - now
+
+
+# --- Server ---
+
+class _Server(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections when a load test opens many at once
+    request_queue_size = 1024
+
+
+class MockLLMServer:
+    """
+    Threaded HTTP server with the SGLang and OpenAI endpoints used by the framework.
+
+    Args:
+        host (str): Interface to bind.
+        port (int): Port to bind; 0 picks a free port.
+        latency (LatencyModel): Latency of successful requests.
+        tokens_per_second (float): Aggregate decode throughput cap (None for no cap).
+        max_concurrency (int): Requests processed at once; the others wait in a queue.
+        max_queue (int): Waiting requests beyond which new requests get a 503 (None for no limit).
+        error_rate (float): Share of requests answered with a 500 after the first-token latency.
+        rate_limit_rate (float): Share of requests answered with an immediate 429.
+        hang_rate (float): Share of requests that stall for `hang_seconds` before answering,
+            which triggers client-side timeouts.
+        hang_seconds (float): Stall duration of hanging requests.
+        model_path (str): Model name reported by /get_model_info and /v1/models.
+        seed (int): Seed of the output and error sampling.
+    """
+    def __init__(self, host="127.0.0.1", port=30000, latency=None, tokens_per_second=None, max_concurrency=64,
+                 max_queue=None, error_rate=0.0, rate_limit_rate=0.0, hang_rate=0.0, hang_seconds=120.0,
+                 model_path="mock-model", seed=None):
+        self.latency = latency or LatencyModel()
+        self.throughput = DecodeThroughput(tokens_per_second)
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.max_queue = max_queue
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.model_path = model_path
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.waiting = 0
+        self.waiting_lock = threading.Lock()
+        self.metrics = Metrics()
+        self.httpd = _Server((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """
+        Serve from a background thread (for in-process load tests).
+        """
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def draw(self):
+        """
+        Returns:
+            str: "rate_limit", "error", "hang" or "ok" for the next request.
+        """
+        with self.rng_lock:
+            value = self.rng.random()
+        for outcome, rate in (("rate_limit", self.rate_limit_rate), ("error", self.error_rate), ("hang", self.hang_rate)):
+            if value < rate:
+                return outcome
+            value -= rate
+        return "ok"
+
+    def generate(self, endpoint, prompt, completion):
+        """
+        Simulate one generation: queue for a slot, wait out the latency and the decode throughput.
+
+        Args:
+            endpoint (str): Endpoint name for the metrics.
+            prompt (str): Prompt text (for the usage fields).
+            completion (str): Canned output.
+
+        Returns:
+            tuple: (HTTP status, usage dict or error message)
+        """
+        outcome = self.draw()
+        if outcome == "rate_limit":
+            return 429, "Rate limit exceeded"
+        with self.waiting_lock:
+            if self.max_queue is not None and self.waiting >= self.max_queue:
+                return 503, "Server overloaded"
+            self.waiting += 1
+        try:
+            self.slots.acquire()
+        finally:
+            with self.waiting_lock:
+                self.waiting -= 1
+        try:
+            completion_tokens = estimate_token_count(completion)
+            if outcome == "hang":
+                time.sleep(self.hang_seconds)
+            if outcome == "error":
+                time.sleep(self.latency.first_token())
+                return 500, "Internal server error"
+            time.sleep(self.latency.first_token() + estimate_token_count(prompt) * self.latency.per_prompt_token)
+            time.sleep(max(completion_tokens * self.latency.per_token, self.throughput.reserve(completion_tokens)))
+            self.metrics.observe("mock_completion_tokens", completion_tokens, buckets=TOKEN_BUCKETS, endpoint=endpoint)
+            return 200, {"prompt_tokens": estimate_token_count(prompt), "completion_tokens": completion_tokens}
+        finally:
+            self.slots.release()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; without this, Nagle and delayed ACKs add ~40ms per response
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, payload, headers=()):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in headers:
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_error_json(self, status, message):
+                headers = [("Retry-After", "1")] if status in (429, 503) else []
+                self.send_json(status, {"error": {"message": message, "code": status}}, headers)
+
+            def do_GET(self):
+                if self.path == "/get_model_info":
+                    self.send_json(200, {"model_path": server.model_path, "tokenizer_path": server.model_path,
+                                         "is_generation": True})
+                elif self.path == "/v1/models":
+                    self.send_json(200, {"object": "list", "data": [{"id": server.model_path, "object": "model"}]})
+                elif self.path in ("/health", "/health_generate"):
+                    self.send_json(200, {})
+                elif self.path == "/metrics":
+                    body = server.metrics.to_openmetrics().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self.send_error_json(404, f"Unknown path {self.path}")
+
+            def do_POST(self):
+                start = time.perf_counter()
+                endpoint = self.path.split("?")[0]
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                except json.JSONDecodeError:
+                    request = None
+                if request is None:
+                    status = 400
+                    self.send_error_json(status, "Invalid JSON body")
+                elif endpoint == "/v1/chat/completions":
+                    status = self.chat_completions(request)
+                elif endpoint == "/generate":
+                    status = self.generate(request)
+                elif endpoint == "/flush_cache":
+                    status = 200
+                    self.send_json(status, {})
+                else:
+                    status = 404
+                    self.send_error_json(status, f"Unknown path {self.path}")
+                server.metrics.inc("mock_requests", endpoint=endpoint, status=status)
+                server.metrics.observe("mock_request_seconds", time.perf_counter() - start, endpoint=endpoint, status=status)
+
+            def chat_completions(self, request):
+                prompt = "\n".join(str(message.get("content") or "") for message in request.get("messages", []))
+                with server.rng_lock:
+                    completion = canned_chat_output(prompt, server.rng)
+                status, result = server.generate("/v1/chat/completions", prompt, completion)
+                if status != 200:
+                    self.send_error_json(status, result)
+                    return status
+                result["total_tokens"] = result["prompt_tokens"] + result["completion_tokens"]
+                self.send_json(200, {
+                    "id": f"chatcmpl-{time.monotonic_ns()}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", server.model_path),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": completion},
+                                 "finish_reason": "stop"}],
+                    "usage": result,
+                })
+                return status
+
+            def generate(self, request):
+                texts = request.get("text", "")
+                batch = isinstance(texts, list)
+                sampling_params = request.get("sampling_params") or {}
+                if isinstance(sampling_params, list):
+                    sampling_params = sampling_params[0] if sampling_params else {}
+                outputs = []
+                for text in (texts if batch else [texts]):
+                    if sampling_params.get("max_new_tokens") == 0:
+                        # Prefix caching call of the SGLang interpreter
+                        completion = ""
+                    elif sampling_params.get("regex"):
+                        completion = canned_regex_output(sampling_params["regex"])
+                    else:
+                        with server.rng_lock:
+                            completion = canned_chat_output(text, server.rng)
+                    status, result = server.generate("/generate", text, completion)
+                    if status != 200:
+                        self.send_error_json(status, result)
+                        return status
+                    outputs.append({"text": completion, "meta_info": {
+                        "id": f"mock-{time.monotonic_ns()}",
+                        "prompt_tokens": result["prompt_tokens"],
+                        "completion_tokens": result["completion_tokens"] if completion else 0,
+                        "cached_tokens": 0,
+                        "finish_reason": {"type": "stop", "matched": None},
+                    }})
+                self.send_json(200, outputs if batch else outputs[0])
+                return 200
+
+        return Handler
+
+
+def add_mock_server_args(parser):
+    """
+    Add the latency, throughput and error-injection options of MockLLMServer to a parser.
+    """
+    parser.add_argument('--latency_dist', type=str, default="constant", choices=LATENCY_DISTRIBUTIONS, help="Distribution of the time to first token.")
+    parser.add_argument('--latency_mean', type=float, default=0.05, help="Mean time to first token in seconds.")
+    parser.add_argument('--latency_std', type=float, default=0.0, help="Standard deviation of the time to first token.")
+    parser.add_argument('--per_token_latency', type=float, default=0.0, help="Decode time per completion token in seconds.")
+    parser.add_argument('--per_prompt_token_latency', type=float, default=0.0, help="Prefill time per prompt token in seconds.")
+    parser.add_argument('--tokens_per_second', type=float, default=None, help="Aggregate decode throughput cap.")
+    parser.add_argument('--max_concurrency', type=int, default=64, help="Requests processed at once; the others queue.")
+    parser.add_argument('--max_queue', type=int, default=None, help="Queued requests beyond which the server answers 503.")
+    parser.add_argument('--error_rate', type=float, default=0.0, help="Share of requests answered with a 500.")
+    parser.add_argument('--rate_limit_rate', type=float, default=0.0, help="Share of requests answered with a 429.")
+    parser.add_argument('--hang_rate', type=float, default=0.0, help="Share of requests that stall for --hang_seconds.")
+    parser.add_argument('--hang_seconds', type=float, default=120.0, help="Stall duration of hanging requests.")
+    parser.add_argument('--seed', type=int, default=None, help="Seed of the latency, output and error sampling.")
+    return parser
+
+
+def server_from_args(args, host="127.0.0.1", port=0):
+    latency = LatencyModel(args.latency_dist, args.latency_mean, args.latency_std, args.per_token_latency, args.seed,
+                           args.per_prompt_token_latency)
+    return MockLLMServer(host, port, latency, args.tokens_per_second, args.max_concurrency, args.max_queue,
+                         args.error_rate, args.rate_limit_rate, args.hang_rate, args.hang_seconds, seed=args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock SGLang/OpenAI server for offline load tests.")
+    parser.add_argument('--host', type=str, default="127.0.0.1", help="Interface to bind.")
+    parser.add_argument('--port', type=int, default=30000, help="Port to bind.")
+    add_mock_server_args(parser)
+    args = parser.parse_args(argv)
+
+    server = server_from_args(args, args.host, args.port)
+    print(f"Mock LLM server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Run the framework stages as a DAG, skipping stages whose inputs and outputs are unchanged.
+
+pipeline.json at the repository root is the default config. It runs the planning chain
+(planning_prompt -> planning -> inference) and the retrieval chain (build_retrieval_data ->
+retrieval -> rerank) with the arguments of the README. Each stage is run as
+`python -m <module> <args>`; paths are relative to the repository root:
+
+{
+    "cache_file": "data/.pipeline_cache.json",
+    "stages": [
+        {"name": "planning_prompt", "module": "framework.planning_prompt",
+         "args": ["data/toolbench", "data/extract_trajectories.json", "--compact"],
+         "inputs": ["data/toolbench"], "outputs": ["data/extract_trajectories.json"]},
+        ...
+    ]
+}
+
+A stage depends on every stage that produces one of its inputs; extra edges can be given with "deps".
+"""
+
+import os
+import ast
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FRAMEWORK_DIR = os.path.join(ROOT_DIR, "framework")
+
+
+class Stage:
+    """
+    A single pipeline step executed as `python -m <module> <args>`.
+    """
+    def __init__(self, name, module, args=None, inputs=None, outputs=None, deps=None):
+        self.name = name
+        self.module = module
+        self.args = [str(arg) for arg in (args or [])]
+        self.inputs = inputs or []
+        self.outputs = outputs or []
+        self.deps = set(deps or [])
+
+
+class FileHasher:
+    """
+    Content hashes of files and directories, memoized on (size, mtime) so unchanged
+    large inputs such as the ToolBench directories are not re-read on every run.
+    """
+    def __init__(self, memo=None):
+        self.memo = memo or {}
+
+    def hash_file(self, path):
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        cached = self.memo.get(path)
+        if cached and cached["signature"] == signature:
+            return cached["sha256"]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        self.memo[path] = {"signature": signature, "sha256": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def hash_path(self, path):
+        """
+        Hash a file or a directory tree; returns None if the path does not exist.
+        """
+        if os.path.isfile(path):
+            return self.hash_file(path)
+        if not os.path.isdir(path):
+            return None
+        digest = hashlib.sha256()
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                file_path = os.path.join(dirpath, filename)
+                digest.update(os.path.relpath(file_path, path).encode("utf-8"))
+                digest.update(self.hash_file(file_path).encode("utf-8"))
+        return digest.hexdigest()
+
+
+def load_stages(config):
+    """
+    Build the stages from a config dict and infer dependencies from inputs and outputs.
+
+    Returns:
+        dict: {stage_name: Stage} in config order.
+    """
+    stages = {}
+    for entry in config["stages"]:
+        stage = Stage(**entry)
+        stages[stage.name] = stage
+
+    producers = {}
+    for stage in stages.values():
+        for output in stage.outputs:
+            producers[os.path.normpath(output)] = stage.name
+    for stage in stages.values():
+        for path in stage.inputs:
+            producer = producers.get(os.path.normpath(path))
+            if producer and producer != stage.name:
+                stage.deps.add(producer)
+        unknown = stage.deps - set(stages)
+        if unknown:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {sorted(unknown)}")
+    return stages
+
+
+def module_file(module):
+    """
+    Path of a repository module as the stages import it (from the repository root or framework/),
+    or None for third-party and standard library modules.
+    """
+    relative = os.path.join(*module.split(".")) + ".py"
+    for directory in (ROOT_DIR, FRAMEWORK_DIR):
+        path = os.path.join(directory, relative)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def module_sources(module):
+    """
+    Source files of a stage module and of every repository module it imports, directly or through
+    other repository modules, including the imports inside functions.
+
+    Returns:
+        list: Sorted file paths.
+    """
+    files = set()
+    pending = [module]
+    while pending:
+        path = module_file(pending.pop())
+        if path is None or path in files:
+            continue
+        files.add(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module:
+                # Relative imports only occur inside framework/
+                pending.append(f"framework.{node.module}" if node.level else node.module)
+    return sorted(files)
+
+
+def stage_fingerprint(stage, hasher):
+    """
+    Hash of the stage command, the source code it runs and the content of all its inputs.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([stage.module, stage.args]).encode("utf-8"))
+    for path in module_sources(stage.module):
+        digest.update(os.path.relpath(path, ROOT_DIR).encode("utf-8"))
+        digest.update(hasher.hash_file(path).encode("utf-8"))
+    for path in stage.inputs:
+        digest.update(path.encode("utf-8"))
+        digest.update(str(hasher.hash_path(os.path.join(ROOT_DIR, path))).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def outputs_fingerprint(stage, hasher):
+    return {path: hasher.hash_path(os.path.join(ROOT_DIR, path)) for path in stage.outputs}
+
+
+def run_stage(stage):
+    """
+    Run a stage in a child process and measure its wall time and peak memory.
+
+    Returns:
+        dict: {"returncode", "wall_time", "max_rss_mb"}
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT_DIR, FRAMEWORK_DIR, env.get("PYTHONPATH")]))
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", stage.module] + stage.args, cwd=ROOT_DIR, env=env)
+    # wait4 gives the resource usage of this child only, even when stages run concurrently
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        "returncode": process.returncode,
+        "wall_time": time.perf_counter() - start,
+        "max_rss_mb": usage.ru_maxrss / 1024,
+    }
+
+
+def run_pipeline(stages, cache_file, max_parallel=2, force=()):
+    """
+    Execute the stage DAG, overlapping independent stages and skipping cached ones.
+
+    A stage is skipped when its command, source and input hashes match the cache and its outputs still
+    have the hashes recorded after its last successful run. Stages downstream of a failed stage
+    are not run.
+
+    Args:
+        stages (dict): {stage_name: Stage}.
+        cache_file (str): Path of the JSON cache with stage fingerprints and file hash memo.
+        max_parallel (int): Maximum number of stages running at once.
+        force (iterable): Names of stages to re-run regardless of the cache.
+
+    Returns:
+        dict: {stage_name: report} with status (ran, cached, failed, blocked), wall_time and max_rss_mb.
+    """
+    cache = {"stages": {}, "files": {}}
+    if os.path.exists(cache_file):
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    hasher = FileHasher(cache.get("files"))
+
+    reports = {}
+    remaining = dict(stages)
+    running = {}
+
+    def save_cache():
+        cache["files"] = hasher.memo
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=4)
+
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        while remaining or running:
+            progressed = False
+            for name, stage in list(remaining.items()):
+                dep_status = [reports.get(dep, {}).get("status") for dep in stage.deps]
+                if any(status in ("failed", "blocked") for status in dep_status):
+                    reports[name] = {"status": "blocked", "wall_time": 0.0, "max_rss_mb": 0.0}
+                    del remaining[name]
+                    progressed = True
+                    continue
+                if not all(status in ("ran", "cached") for status in dep_status) or len(running) >= max_parallel:
+                    continue
+
+                fingerprint = stage_fingerprint(stage, hasher)
+                cached = cache["stages"].get(name)
+                if (name not in force and cached and cached["fingerprint"] == fingerprint
+                        and cached["outputs"] == outputs_fingerprint(stage, hasher)):
+                    print(f"[pipeline] {name}: unchanged, skipped")
+                    reports[name] = {"status": "cached", "wall_time": 0.0, "max_rss_mb": 0.0}
+                else:
+                    print(f"[pipeline] {name}: running python -m {stage.module} {' '.join(stage.args)}")
+                    running[executor.submit(run_stage, stage)] = (name, fingerprint)
+                del remaining[name]
+                progressed = True
+
+            if progressed:
+                continue
+            if not running:
+                raise RuntimeError(f"Dependency cycle between stages: {sorted(remaining)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, fingerprint = running.pop(future)
+                result = future.result()
+                status = "ran" if result["returncode"] == 0 else "failed"
+                reports[name] = dict(result, status=status)
+                if status == "ran":
+                    cache["stages"][name] = {
+                        "fingerprint": fingerprint,
+                        "outputs": outputs_fingerprint(stages[name], hasher),
+                    }
+                    save_cache()
+                print(f"[pipeline] {name}: {status} in {result['wall_time']:.1f}s, peak RSS {result['max_rss_mb']:.0f} MB")
+
+    save_cache()
+    return reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the workflow pipeline stages as a cached DAG.")
+    parser.add_argument('--config', type=str, default=os.path.join(ROOT_DIR, "pipeline.json"),
+                        help="Path to the pipeline config JSON file (default: the six-stage pipeline.json).")
+    parser.add_argument('--max_parallel', type=int, default=2, help="Maximum number of stages running at once.")
+    parser.add_argument('--force', type=str, nargs='*', default=[], help="Stages to re-run regardless of the cache.")
+    parser.add_argument('--report_file', type=str, default=None, help="Path to save the per-stage report.")
+
+    args = parser.parse_args(argv)
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    stages = load_stages(config)
+    cache_file = os.path.join(ROOT_DIR, config.get("cache_file", ".pipeline_cache.json"))
+
+    start = time.perf_counter()
+    reports = run_pipeline(stages, cache_file, args.max_parallel, set(args.force))
+    total = time.perf_counter() - start
+
+    print(f"{'stage':<24}{'status':<10}{'wall time (s)':>15}{'peak RSS (MB)':>15}")
+    for name in stages:
+        report = reports[name]
+        print(f"{name:<24}{report['status']:<10}{report['wall_time']:>15.1f}{report['max_rss_mb']:>15.0f}")
+    print(f"Total wall time: {total:.1f}s")
+
+    if args.report_file:
+        with open(args.report_file, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=4)
+
+    if any(report["status"] in ("failed", "blocked") for report in reports.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
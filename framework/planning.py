@@ -1,49 +1,114 @@
 import json
-import openai
 import re
 import argparse
+import functools
 from tqdm import tqdm
 from framework.prompt_Template import workflow_Plan_Prompt
-
-client = openai.Client(
-    base_url="http://127.0.0.1:30000/v1",
-    api_key="EMPTY"
-)
-
-def generate_responses(prompts_file, responses_file, output_file_path):
+from framework.instrumentation import metrics, TOKEN_BUCKETS
+from framework.profiling import add_profile_args, profiled
+from framework.llm_client import ResilientClient, LLMCallFailed, add_client_args, client_from_args, take_dead_letters, \
+    estimate_tokens
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    # Created on first use, so that parsing responses does not import openai
+    import openai
+    # Retries are done by the ResilientClient of the stage
+    return openai.Client(
+        base_url="http://127.0.0.1:30000/v1",
+        api_key="EMPTY",
+        max_retries=0
+    )
+
+def generate_response(prompt, timeout=None):
+    with metrics.span("llm_request", stage="planning"):
+        response = get_client().chat.completions.create(
+            model="default",
+            messages=[
+                {"role": "system", "content": workflow_Plan_Prompt},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=0.6,
+            max_tokens=4096,
+            timeout=timeout,
+        )
+    if response.usage is not None:
+        metrics.observe("llm_prompt_tokens", response.usage.prompt_tokens, buckets=TOKEN_BUCKETS, stage="planning")
+        metrics.observe("llm_completion_tokens", response.usage.completion_tokens, buckets=TOKEN_BUCKETS, stage="planning")
+    return response.choices[0].message.content
+
+def request_plan(client, key, prompt):
+    """
+    Generate one planning response with the retries, timeouts and dead-lettering of `client`.
+    """
+    return client.call(lambda timeout: generate_response(prompt, timeout), key=key, payload=prompt)
+
+def load_prompts(prompts_file):
+    """
+    Read a prompts file: either {key: prompt}, or the list of {"trajectory_index", "input"} entries
+    written by planning_prompt.py, which is keyed by trajectory index.
+
+    Returns:
+        dict: {key: prompt}
+    """
     with open(prompts_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
-
-    responses = {}
-
-    for key, value in tqdm(data.items(), desc="Generating responses", total=len(data)):
-        try:
-            response = client.chat.completions.create(
-                model="default",
-                messages=[
-                    {"role": "system", "content": workflow_Plan_Prompt},
-                    {"role": "user", "content": value},
-                ],
-                temperature=0.6,
-                max_tokens=4096,
-            )
-
-            message_content = response.choices[0].message.content
-            responses[f"{key}_output"] = message_content
-
-        except Exception as e:
-            print(f"Error generating response for {key}: {e}")
-            responses[f"{key}_output"] = f"Error: {e}"
+    if isinstance(data, list):
+        return {str(entry["trajectory_index"]): entry["input"] for entry in data}
+    return data
+
+def generate_responses(prompts_file, responses_file, output_file_path, client=None, replay=False):
+    """
+    Generate the planning responses. Prompts that still fail after the retries are left out of the
+    responses file and written to the dead-letter file of `client`.
+
+    With `replay`, only the prompts of the dead-letter file are generated and merged into the
+    existing responses file.
+    """
+    client = client or ResilientClient("planning", registry=metrics)
+    if replay:
+        data = take_dead_letters(client.dead_letters.path) if client.dead_letters is not None else {}
+        with open(responses_file, 'r', encoding='utf-8') as f:
+            responses = json.load(f)
+        print(f"Replaying {len(data)} failed prompts.")
+    else:
+        data = load_prompts(prompts_file)
+        responses = {}
+
+    # Requests run concurrently, longest prompts first; the client's concurrency limiter decides how many are in flight
+    generated = {}
+    work = client.dispatch(data.items(), lambda item: request_plan(client, *item), length=lambda item: estimate_tokens(item[1]))
+    for (key, _), response, error in tqdm(work, desc="Generating responses", total=len(data)):
+        if isinstance(error, LLMCallFailed):
+            print(f"Error generating response for {key}: {error.error}")
+        elif error is not None:
+            raise error
+        else:
+            generated[key] = response
+    for key in data:
+        if key in generated:
+            responses[f"{key}_output"] = generated[key]
+    client.report()
 
     with open(responses_file, 'w', encoding='utf-8') as outfile:
         json.dump(responses, outfile, ensure_ascii=False, indent=4)
 
     print(f"All responses have been saved to {responses_file}")
 
-def process_responses(responses_file, output_file_path):
-    explanation_pattern = re.compile(r'<explanation>(.*?)</explanation>', re.DOTALL)
-    workflow_pattern = re.compile(r'<workflow>(.*?)</workflow>', re.DOTALL)
+explanation_pattern = re.compile(r'<explanation>(.*?)</explanation>', re.DOTALL)
+workflow_pattern = re.compile(r'<workflow>(.*?)</workflow>', re.DOTALL)
 
+def parse_response(value):
+    explanation_content = explanation_pattern.search(value)
+    workflow_content = workflow_pattern.search(value)
+    if not workflow_content:
+        metrics.inc("parse_failures", stage="planning")
+    return {
+        "explanation": explanation_content.group(1).strip() if explanation_content else "",
+        "workflow": workflow_content.group(1).strip() if workflow_content else ""
+    }
+
+def process_responses(responses_file, output_file_path):
     with open(responses_file, 'r', encoding='utf-8') as file:
         data = json.load(file)
 
@@ -51,31 +116,38 @@ def process_responses(responses_file, output_file_path):
     for key, value in data.items():
         numbers_prefix = key.split('_')[0]
         new_key = f"{numbers_prefix}_trajectory"
-
-        explanation_content = explanation_pattern.search(value)
-        workflow_content = workflow_pattern.search(value)
-
-        processed_data[new_key] = {
-            "explanation": explanation_content.group(1).strip() if explanation_content else "",
-            "workflow": workflow_content.group(1).strip() if workflow_content else ""
-        }
+        processed_data[new_key] = parse_response(value)
 
     with open(output_file_path, 'w', encoding='utf-8') as file:
         json.dump(processed_data, file, indent=4)
 
     print(f"Processed JSON saved to {output_file_path}")
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Generate responses and process workflow data.")
 
-    parser.add_argument('--prompts_file', type=str, required=True, help="Path to the input JSON file containing prompts.")
+    parser.add_argument('--prompts_file', type=str, default=None, help="Path to the input JSON file containing prompts.")
     parser.add_argument('--responses_file', type=str, required=True, help="Path to save the responses JSON file.")
     parser.add_argument('--output_file', type=str, required=True, help="Path to save the final processed output JSON file.")
-
-    args = parser.parse_args()
-
-    generate_responses(args.prompts_file, args.responses_file, args.responses_file)
-    process_responses(args.responses_file, args.output_file)
+    parser.add_argument('--skip_generation', action='store_true', help="Only parse an existing responses file.")
+    parser.add_argument('--replay', action='store_true', help="Only regenerate the prompts of the dead-letter file.")
+    parser.add_argument('--metrics_file', type=str, default=None, help="Path to save the stage metrics (.json, otherwise OpenMetrics text).")
+    add_client_args(parser)
+    add_profile_args(parser)
+
+    args = parser.parse_args(argv)
+
+    with profiled(args, "planning"):
+        if not args.skip_generation:
+            if not args.prompts_file and not args.replay:
+                parser.error("--prompts_file is required unless --skip_generation or --replay is given")
+            client = client_from_args(args, "planning", f"{args.responses_file}.failed.jsonl", metrics)
+            generate_responses(args.prompts_file, args.responses_file, args.responses_file, client, args.replay)
+        process_responses(args.responses_file, args.output_file)
+
+        if args.metrics_file:
+            metrics.export(args.metrics_file)
+            print(f"Metrics saved to {args.metrics_file}")
 
 if __name__ == "__main__":
     main()
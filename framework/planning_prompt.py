@@ -4,16 +4,91 @@ import re
 import argparse
 from tqdm import tqdm
 from prompt_Template import workflow_Plan_Prompt
-from .utils import extract_successful_finish_trajectories
+from framework.utils import extract_successful_finish_trajectories
+from framework.profiling import add_profile_args, profiled
+from framework.llm_client import estimate_tokens
 
 
-def process_files(directory, output_file):
+def truncate(text, max_chars):
+    """
+    Cut text to max_chars characters, noting how much was dropped.
+    """
+    if text is None or len(text) <= max_chars:
+        return text
+    return text[:max_chars] + f"... [{len(text) - max_chars} chars truncated]"
+
+
+def compact_message(message, response_chars, thought_chars):
+    """
+    Keep what the planner needs from one message: the user request, the function names and
+    arguments, and truncated tool responses and thoughts.
+    """
+    role = message.get("role")
+    if role == "function":
+        return {"role": role, "name": message.get("name"), "content": truncate(message.get("content"), response_chars)}
+    if role == "assistant":
+        compacted = {"role": role, "content": truncate(message.get("content") or "", thought_chars)}
+        if message.get("function_call"):
+            compacted["function_call"] = {"name": message["function_call"].get("name"),
+                                          "arguments": message["function_call"].get("arguments")}
+        return compacted
+    return {"role": role, "content": message.get("content")}
+
+
+def compact_answer_generation(answer_generation, token_budget=2000, response_chars=1024, thought_chars=512):
+    """
+    Reduce a ToolBench answer_generation object to its successful trajectories, with function
+    names and arguments in full and tool responses and thoughts truncated to fit a token budget.
+
+    The truncation limits are halved (responses first, down to 64 characters, then thoughts) until
+    the estimated size fits the budget; if it still does not fit, only the last successful
+    trajectory is kept. Function names and arguments are never cut, so a trajectory with many
+    calls can stay above the budget.
+
+    Args:
+        answer_generation (dict): The "answer_generation" object of a ToolBench answer file.
+        token_budget (int): Target size in estimated tokens.
+        response_chars (int): Initial truncation limit of the tool responses.
+        thought_chars (int): Initial truncation limit of the assistant thoughts.
+
+    Returns:
+        dict: {"query", "final_answer", "train_messages"} with the compacted successful trajectories.
+    """
+    trajectories = extract_successful_finish_trajectories(answer_generation)
+
+    def build(trajectories, response_chars, thought_chars):
+        return {
+            "query": answer_generation.get("query"),
+            "final_answer": answer_generation.get("final_answer"),
+            "train_messages": [[compact_message(message, response_chars, thought_chars) for message in dialogue]
+                               for dialogue in trajectories],
+        }
+
+    compacted = build(trajectories, response_chars, thought_chars)
+    while estimate_tokens(compacted) > token_budget:
+        if response_chars > 64:
+            response_chars //= 2
+        elif thought_chars > 0:
+            thought_chars //= 2
+        elif len(trajectories) > 1:
+            trajectories = trajectories[-1:]
+        else:
+            break
+        compacted = build(trajectories, response_chars, thought_chars)
+    return compacted
+
+
+def process_files(directory, output_file, compact=False, token_budget=2000):
     """
     Processes all JSON files in a specified directory, extracts successful dialogue trajectories that meet certain conditions, and generates prompts based on the template.
 
     Args:
         directory (str): The directory path that contains the input JSON files
         output_file (str): The path to the output JSON file for saving the generated prompts
+        compact (bool): Use the compacted successful trajectories (compact_answer_generation) as the
+            prompt input instead of the whole answer_generation object. planning.py sends the input as
+            the user message after the workflow_Plan_Prompt system message.
+        token_budget (int): Token budget of a compacted trajectory.
 
     Returns:
         None
@@ -22,6 +97,7 @@ def process_files(directory, output_file):
     prompts = []
     pattern = re.compile(r"(\d+)_trajectory")
     n = 0
+    full_tokens = compact_tokens = 0
 
     for filename in tqdm(os.listdir(directory), desc="Processing JSON files"):
         match = pattern.match(filename)
@@ -54,7 +130,13 @@ def process_files(directory, output_file):
                                 "query": data["answer_generation"]["query"]
                             }
 
-                            filled_prompt = workflow_Plan_Prompt.format(content=data["answer_generation"])
+                            # workflow_Plan_Prompt is the system message, so the input is the trajectory alone
+                            filled_prompt = json.dumps(data["answer_generation"], ensure_ascii=False)
+                            if compact:
+                                full_tokens += estimate_tokens(filled_prompt)
+                                compacted = compact_answer_generation(data["answer_generation"], token_budget)
+                                filled_prompt = json.dumps(compacted, ensure_ascii=False)
+                                compact_tokens += estimate_tokens(filled_prompt)
                             prompt_entry = {
                                 "trajectory_index": number,
                                 "input": filled_prompt
@@ -74,16 +156,35 @@ def process_files(directory, output_file):
         json.dump(prompts, outfile, ensure_ascii=False, indent=4)
 
     print(f"All prompts have been saved to {output_file}. {n} prompts generated.")
+    if compact and n:
+        report_compaction(n, full_tokens, compact_tokens)
+
+
+def report_compaction(n, full_tokens, compact_tokens):
+    """
+    Print the average size of the planning requests that planning.py sends (the workflow_Plan_Prompt
+    system message plus the prompt input), with and without --compact.
+    """
+    system_tokens = estimate_tokens(workflow_Plan_Prompt)
+    full_request = system_tokens + full_tokens / n
+    compact_request = system_tokens + compact_tokens / n
+    print(f"Planning requests: {compact_request:.0f} estimated tokens on average, against {full_request:.0f} "
+          f"without --compact ({1 - compact_request / full_request:.1%} smaller).")
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Process JSON files and generate workflow prompts.")
     parser.add_argument('directory', type=str, help="Directory containing input JSON files")
     parser.add_argument('output_file', type=str, help="Output file path to save the generated prompts")
+    parser.add_argument('--compact', action='store_true',
+                        help="Keep only function names, arguments and truncated responses of the successful trajectories.")
+    parser.add_argument('--token_budget', type=int, default=2000, help="Token budget of a compacted trajectory.")
+    add_profile_args(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
-    process_files(args.directory, args.output_file)
+    with profiled(args, "planning_prompt"):
+        process_files(args.directory, args.output_file, args.compact, args.token_budget)
 
 
 if __name__ == "__main__":
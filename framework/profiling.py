@@ -0,0 +1,180 @@
+"""
+Profiling mode for the framework entry points.
+
+Every entry point takes `--profile` and profiles its main loop with either
+  - sampling: a background thread records the stack of every thread at a fixed interval
+    (wall-clock, so threads waiting on the network or disk show up as such), or
+  - tracing: a deterministic sys.setprofile tracer that attributes exact self-time to every
+    Python and C function (much higher overhead).
+
+Both write collapsed stacks ("frame;frame;frame weight" per line) that flamegraph.pl,
+speedscope or inferno read directly, and print the top functions by self-time together with
+the CPU share of the wall time, which tells CPU-bound loops from I/O-bound ones.
+"""
+
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+def frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def c_function_name(function):
+    module = getattr(function, "__module__", None) or type(getattr(function, "__self__", None)).__name__
+    return f"{getattr(function, '__qualname__', repr(function))} ({module})"
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all threads from a background thread.
+
+    Weights in the collapsed output are sample counts; multiply by `interval` for seconds.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def weight_seconds(self):
+        return self.interval
+
+
+class TracingProfiler:
+    """
+    Deterministic profiler built on sys.setprofile / threading.setprofile.
+
+    Weights in the collapsed output are microseconds of self-time.
+    """
+    def __init__(self):
+        self.stacks = Counter()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def _profile(self, frame, event, arg):
+        now = time.perf_counter()
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+            self.local.root = threading.current_thread().name
+        if event == "call" or event == "c_call":
+            name = frame_name(frame.f_code) if event == "call" else c_function_name(arg)
+            # [name, start, time spent in children, is a C function]
+            stack.append([name, now, 0.0, event == "c_call"])
+        elif stack and stack[-1][3] == (event != "return"):
+            # Returns of frames entered before the tracer started have no entry and are ignored
+            name, start, children, _ = stack.pop()
+            elapsed = now - start
+            path = (self.local.root,) + tuple(entry[0] for entry in stack) + (name,)
+            with self.lock:
+                self.stacks[path] += int((elapsed - children) * 1e6)
+            if stack:
+                stack[-1][2] += elapsed
+
+    def start(self):
+        threading.setprofile(self._profile)
+        sys.setprofile(self._profile)
+
+    def stop(self):
+        sys.setprofile(None)
+        threading.setprofile(None)
+
+    def weight_seconds(self):
+        return 1e-6
+
+
+def write_collapsed(stacks, output_file):
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for stack, weight in stacks.most_common():
+            if weight > 0:
+                f.write(f"{';'.join(frame.replace(';', ',') for frame in stack)} {weight}\n")
+
+
+def self_time_summary(stacks, weight_seconds, top=20):
+    """
+    Aggregate the leaf frames of the collapsed stacks.
+
+    Returns:
+        list: (function, self seconds) pairs, largest first.
+    """
+    self_time = Counter()
+    for stack, weight in stacks.items():
+        self_time[stack[-1]] += weight
+    return [(name, weight * weight_seconds) for name, weight in self_time.most_common(top)]
+
+
+@contextmanager
+def profile_scope(mode="sampling", output_file="profile.collapsed", interval=0.005, top=20):
+    """
+    Profile the enclosed block, then write collapsed stacks and print the self-time summary.
+
+    Args:
+        mode (str): "sampling" or "tracing".
+        output_file (str): Path of the collapsed-stack file.
+        interval (float): Sampling interval in seconds (sampling mode).
+        top (int): Number of functions in the printed summary.
+    """
+    profiler = SamplingProfiler(interval) if mode == "sampling" else TracingProfiler()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        write_collapsed(profiler.stacks, output_file)
+        print(f"[profile] {mode}: wall {wall:.2f}s, cpu {cpu:.2f}s ({cpu / wall:.0%} of wall time on CPU); "
+              f"collapsed stacks saved to {output_file}", file=sys.stderr)
+        total = sum(profiler.stacks.values()) * profiler.weight_seconds() or 1.0
+        print(f"[profile] {'self (s)':>10} {'share':>7}  function", file=sys.stderr)
+        for name, seconds in self_time_summary(profiler.stacks, profiler.weight_seconds(), top):
+            print(f"[profile] {seconds:>10.3f} {seconds / total:>7.1%}  {name}", file=sys.stderr)
+
+
+def add_profile_args(parser):
+    """
+    Add --profile, --profile_mode, --profile_output and --profile_interval to an entry point parser.
+    """
+    parser.add_argument('--profile', action='store_true', help="Profile the main loop and print the top functions by self-time.")
+    parser.add_argument('--profile_mode', type=str, default="sampling", choices=["sampling", "tracing"],
+                        help="sampling: low-overhead stack sampling; tracing: exact deterministic self-times.")
+    parser.add_argument('--profile_output', type=str, default=None, help="Path of the collapsed-stack file (default: <stage>.collapsed).")
+    parser.add_argument('--profile_interval', type=float, default=0.005, help="Sampling interval in seconds.")
+    return parser
+
+
+def profiled(args, stage):
+    """
+    Context manager scoping the profiler to a stage's main loop; a no-op without --profile.
+    """
+    if not getattr(args, "profile", False):
+        return nullcontext()
+    return profile_scope(args.profile_mode, args.profile_output or f"{stage}.collapsed", args.profile_interval)
@@ -59,7 +59,7 @@ json_regex = (
     + r"""        "type": "http-request",\n"""
     + r"""        "url": "http[s]?:\/\/[\w\d\-\.]+\/[\w\d\-\.\/]*",\n"""
     + r"""        "variables": \[\]\n"""
-    + r"""    \},\n"""
+    + r"""    \}\n"""
     + r"""\}"""
 )
 
@@ -1,19 +1,26 @@
-import requests
 from tqdm import tqdm
-import pandas as pd
+import numpy as np
 import re
 import json
 import argparse
+import threading
 from rerank_Template import *
+from columnar import is_columnar, read_columnar
+from instrumentation import metrics, TOKEN_BUCKETS
+from profiling import add_profile_args, profiled
+from llm_client import ResilientClient, LLMCallFailed, add_client_args, client_from_args, take_dead_letters, estimate_tokens
 
 def read_query_file(file_path):
     """
     Read the query file and return a dictionary of queries.
     Args:
-        file_path (str): Path to the query file, each line format: qid\tquery
+        file_path (str): Path to the query file, each line format: qid\tquery (or a columnar query file)
     Returns:
         dict: {qid: query}
     """
+    if is_columnar(file_path):
+        columns = read_columnar(file_path)
+        return dict(zip(map(str, columns['id']), columns['query']))
     queries = {}
     with open(file_path, 'r', encoding='utf-8') as file:
         for line in file:
@@ -27,10 +34,13 @@ def read_corpus_file(file_path):
     """
     Read the corpus file and return a dictionary of workflow contents.
     Args:
-        file_path (str): Path to the corpus file, each line format: wocid\tworkflow_content
+        file_path (str): Path to the corpus file, each line format: wocid\tworkflow_content (or a columnar corpus)
     Returns:
         dict: {wocid: workflow_content}
     """
+    if is_columnar(file_path):
+        columns = read_columnar(file_path, columns=['id', 'content'])
+        return dict(zip(map(str, columns['id']), columns['content']))
     workflows = {}
     with open(file_path, 'r', encoding='utf-8') as file:
         for line in file:
@@ -90,83 +100,272 @@ def generate_prompts(queries, workflows, tops, template):
             prompts.append({'query_id': qid, 'input': filled_template})
     return prompts
 
-def sglang_inference_and_save(prompts, output_json_path, sglang_url, model_name):
+def write_top_file(tops, file_path):
+    """
+    Write top retrieval results in the format read by read_top_file and evaluate_rerank_metrics.
+    Args:
+        tops (dict): {qid: [retrieval_id1, retrieval_id2, ...]}
+        file_path (str): Output TSV path.
+    """
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write('qid\tretrieval_ids\n')
+        for qid, retrieval_ids in tops.items():
+            file.write(f"{qid}\t{','.join(map(str, retrieval_ids))}\n")
+
+def bypass_results(qids, source):
+    """
+    Results for queries that skip the LLM: the first candidate is taken as the answer.
+    Args:
+        qids (iterable): Query ids answered without the LLM.
+        source (str): Name of the stage that made the decision.
+    Returns:
+        list: Result dicts in the format written by sglang_inference_and_save.
+    """
+    return [{"query_id": qid, "output": "<numbers>1</numbers>", "source": source} for qid in qids]
+
+def rerank_request(session, sglang_url, model_name, prompt, timeout):
+    """
+    Send one rerank prompt to the OpenAI-compatible endpoint.
+    Returns:
+        str: The model output ("" if the response has no choices).
+    """
+    payload = {
+        "model": model_name,
+        "messages": [
+            {"role": "system", "content": ""},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.0,
+        "max_tokens": 1024
+    }
+    with metrics.span("llm_request", stage="rerank"):
+        response = session.post(sglang_url, json=payload, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+    usage = data.get("usage") or {}
+    if usage:
+        metrics.observe("llm_prompt_tokens", usage.get("prompt_tokens", 0), buckets=TOKEN_BUCKETS, stage="rerank")
+        metrics.observe("llm_completion_tokens", usage.get("completion_tokens", 0), buckets=TOKEN_BUCKETS, stage="rerank")
+    if "choices" in data and len(data["choices"]) > 0:
+        return data["choices"][0]["message"]["content"]
+    return ""
+
+def sglang_inference_and_save(prompts, output_json_path, sglang_url, model_name, bypassed=None, client=None, previous=None):
     """
     Use SGLang to perform inference on prompts and save the results as a JSON file.
+    Prompts that still fail after the retries are left out of the results and written to the
+    dead-letter file of `client`.
     Args:
         prompts (list): List of prompt dicts.
         output_json_path (str): Path to save the inference results.
         sglang_url (str): SGLang API URL.
         model_name (str): SGLang model name.
+        bypassed (list): Results of queries that skipped the LLM, saved together with the inference results.
+        client (ResilientClient): Retry, timeout and dead-letter policy of the requests.
+        previous (list): Results of an earlier run kept in the output (used when replaying failed prompts).
     """
-    results = []
-    for item in tqdm(prompts, desc="SGLang inference", total=len(prompts)):
-        query_id = item['query_id']
-        prompt = item['input']
-        try:
-            payload = {
-                "model": model_name,
-                "messages": [
-                    {"role": "system", "content": ""},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.0,
-                "max_tokens": 1024
-            }
-            response = requests.post(sglang_url, json=payload, timeout=60)
-            response.raise_for_status()
-            data = response.json()
-            if "choices" in data and len(data["choices"]) > 0:
-                output = data["choices"][0]["message"]["content"]
-            else:
-                output = ""
-        except Exception as e:
-            print(f"Inference failed: {query_id}, error: {e}")
-            output = f"Error: {e}"
-        results.append({
-            "query_id": query_id,
-            "output": output
-        })
+    import requests
+
+    client = client or ResilientClient("rerank", registry=metrics)
+    results = list(previous or [])
+    # One session per worker thread, since sessions are not safe to share between threads
+    local = threading.local()
+    sessions = []
+
+    def infer(item):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+            sessions.append(local.session)
+        return client.call(lambda timeout: rerank_request(local.session, sglang_url, model_name, item['input'], timeout),
+                           key=item['query_id'], payload=item)
+
+    outputs = {}
+    work = client.dispatch(prompts, infer, length=lambda item: estimate_tokens(item['input']))
+    for item, output, error in tqdm(work, desc="SGLang inference", total=len(prompts)):
+        if isinstance(error, LLMCallFailed):
+            print(f"Inference failed: {item['query_id']}, error: {error.error}")
+        elif error is not None:
+            raise error
+        else:
+            outputs[item['query_id']] = output
+    for session in sessions:
+        session.close()
+    for item in prompts:
+        if item['query_id'] in outputs:
+            results.append({
+                "query_id": item['query_id'],
+                "output": outputs[item['query_id']]
+            })
+    client.report()
+    for item in bypassed or []:
+        metrics.inc("rerank_bypassed", source=item["source"])
+    results.extend(bypassed or [])
 
     with open(output_json_path, 'w', encoding='utf-8') as f:
         json.dump(results, f, ensure_ascii=False, indent=4)
     print(f"SGLang inference results saved to: {output_json_path}")
 
-def evaluate_accuracy(response_json_path, top_tsv_path):
+numbers_pattern = re.compile(r'<numbers>(\d+)</numbers>')
+
+def load_top_matrix(top_tsv_path):
     """
-    Evaluate accuracy based on SGLang inference results and top-k retrieval file.
+    Load the top-k retrieval file into a padded id matrix without per-row Python work.
+    Args:
+        top_tsv_path (str): Path to top-k retrieval result TSV with columns qid, retrieval_ids.
+    Returns:
+        tuple: (qids, ids)
+            qids (np.ndarray): Query ids, shape (n,).
+            ids (np.ndarray): Retrieved doc ids, shape (n, k), padded with -1.
+    """
+    with open(top_tsv_path, 'rb') as file:
+        header = file.readline()  # header: qid, retrieval_ids[, retrieval_scores]
+        body = file.read().replace(b'\r', b'').strip() + b'\n'
+    if header.count(b'\t') > 1:
+        body = b'\n'.join(b'\t'.join(line.split(b'\t', 2)[:2]) for line in body.splitlines()) + b'\n'
+    if body == b'\n':
+        return np.zeros(0, dtype=np.int64), np.full((0, 0), -1, dtype=np.int64)
+
+    # Each line holds one qid followed by (commas + 1) retrieval ids
+    buffer = np.frombuffer(body, dtype=np.uint8)
+    line_ends = np.flatnonzero(buffer == ord('\n'))
+    commas = np.cumsum(buffer == ord(','))[line_ends]
+    lengths = np.diff(commas, prepend=0) + 1
+    flat = np.fromstring(body.replace(b'\t', b',').replace(b'\n', b',').decode(), dtype=np.int64, sep=',')
+
+    qid_positions = np.cumsum(lengths + 1) - (lengths + 1)
+    qids = flat[qid_positions]
+    id_mask = np.ones(len(flat), dtype=bool)
+    id_mask[qid_positions] = False
+
+    ids = np.full((len(qids), int(lengths.max())), -1, dtype=np.int64)
+    rows = np.repeat(np.arange(len(qids)), lengths)
+    cols = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    ids[rows, cols] = flat[id_mask]
+    return qids, ids
+
+def load_response_choices(response_json_path, qids):
+    """
+    Load the chosen workflow number for each query, aligned with the rows of the top-k matrix.
     Args:
         response_json_path (str): Path to SGLang inference result JSON.
-        top_tsv_path (str): Path to top-k retrieval result TSV.
+        qids (np.ndarray): Query ids of the top-k matrix rows.
     Returns:
-        float: Accuracy value.
+        np.ndarray: 1-based chosen position per row, 0 when no valid <numbers> tag was produced.
     """
-    # Load SGLang inference results
     with open(response_json_path, 'r', encoding='utf-8') as file:
         response_data = json.load(file)
 
-    # Extract <numbers> from output for each query_id
-    response_dict = {}
+    response_qids = []
+    response_numbers = []
     for item in response_data:
-        query_id = item["query_id"]
-        numbers_match = re.search(r'<numbers>(\d+)</numbers>', item["output"])
+        numbers_match = numbers_pattern.search(item["output"])
         if numbers_match:
-            response_dict[query_id] = int(numbers_match.group(1))
+            response_qids.append(int(item["query_id"]))
+            response_numbers.append(int(numbers_match.group(1)))
+        else:
+            metrics.inc("parse_failures", stage="rerank")
+
+    import pandas as pd
+
+    choices = np.zeros(len(qids), dtype=np.int64)
+    rows = pd.Index(qids).get_indexer(np.array(response_qids, dtype=np.int64))
+    found = rows >= 0
+    choices[rows[found]] = np.array(response_numbers, dtype=np.int64)[found]
+    return choices
 
-    # Load top-k retrieval results
-    top_df = pd.read_csv(top_tsv_path, sep='\t')
-    top_df['retrieval_ids'] = top_df['retrieval_ids'].apply(lambda x: [int(id) for id in x.split(',')])
+def relevance_matrix(qids, ids, qrels_path=None):
+    """
+    Mark which retrieved ids are relevant for their query.
+    Args:
+        qids (np.ndarray): Query ids, shape (n,).
+        ids (np.ndarray): Retrieved doc ids, shape (n, k), padded with -1.
+        qrels_path (str): Optional qrels file (qid, useless, docid, label). Without it a hit is docid == qid.
+    Returns:
+        np.ndarray: Boolean matrix of shape (n, k).
+    """
+    if qrels_path is None:
+        return (ids == qids[:, None]) & (ids >= 0)
 
-    # Calculate accuracy
-    def is_correct(row):
-        idx = response_dict.get(row['qid'])
-        return idx is not None and row['retrieval_ids'][idx - 1] == row['qid']
+    import pandas as pd
 
-    top_df['is_correct'] = top_df.apply(is_correct, axis=1)
-    accuracy = top_df['is_correct'].mean()
-    return accuracy
+    qrels_df = pd.read_csv(qrels_path, sep='\t', names=['qid', 'useless', 'docid', 'label'])
+    qrels_df = qrels_df[qrels_df['label'] > 0]
+    relevant_keys = (qrels_df['qid'].to_numpy(dtype=np.int64) << 32) | qrels_df['docid'].to_numpy(dtype=np.int64)
+    keys = (qids[:, None] << 32) | np.where(ids >= 0, ids, 0)
+    return np.isin(keys, relevant_keys) & (ids >= 0)
 
-def parse_args():
+def rank_metrics(first_hit, k_values):
+    """
+    Compute MRR and hit@k from the 0-based position of the first relevant id (-1 if none).
+    """
+    found = first_hit >= 0
+    metrics = {"mrr": float(np.mean(np.where(found, 1.0 / (np.maximum(first_hit, 0) + 1), 0.0))) if len(first_hit) else 0.0}
+    for k in k_values:
+        metrics[f"hit@{k}"] = float(np.mean(found & (first_hit < k))) if len(first_hit) else 0.0
+    return metrics
+
+def evaluate_rerank_metrics(response_json_path, top_tsv_path, qrels_path=None, k_values=(1, 3, 5, 10)):
+    """
+    Evaluate retrieval and rerank quality with vectorized NumPy operations.
+    Args:
+        response_json_path (str): Path to SGLang inference result JSON.
+        top_tsv_path (str): Path to top-k retrieval result TSV.
+        qrels_path (str): Optional path to qrels.test.tsv used as ground truth.
+        k_values (tuple): Cutoffs reported as hit@k.
+    Returns:
+        dict: accuracy, retrieval/rerank MRR and hit@k, and the gold-position x chosen-position confusion matrix.
+    """
+    qids, ids = load_top_matrix(top_tsv_path)
+    choices = load_response_choices(response_json_path, qids)
+    hits = relevance_matrix(qids, ids, qrels_path)
+    n, width = ids.shape
+    rows = np.arange(n)
+
+    # Position of the first relevant id in the retrieval list, -1 if it was not retrieved
+    first_hit = np.where(hits.any(axis=1), hits.argmax(axis=1), -1)
+
+    # Position chosen by the LLM, -1 if missing or outside the candidate list
+    chosen = choices - 1
+    chosen_valid = (chosen >= 0) & (chosen < width)
+    chosen = np.where(chosen_valid, chosen, -1)
+    chosen_valid &= ids[rows, np.maximum(chosen, 0)] >= 0
+    chosen = np.where(chosen_valid, chosen, -1)
+    is_correct = chosen_valid & hits[rows, np.maximum(chosen, 0)]
+
+    # The reranked list moves the chosen candidate to the front and keeps the rest in order
+    rerank_hit = np.where(
+        is_correct, 0,
+        np.where((first_hit >= 0) & chosen_valid & (first_hit < chosen), first_hit + 1, first_hit)
+    )
+
+    gold_bucket = np.where(first_hit >= 0, first_hit, width)
+    chosen_bucket = np.where(chosen_valid, chosen, width)
+    confusion = np.bincount(gold_bucket * (width + 1) + chosen_bucket, minlength=(width + 1) ** 2)
+
+    return {
+        "num_queries": int(n),
+        "accuracy": float(is_correct.mean()) if n else 0.0,
+        "parsed_rate": float(chosen_valid.mean()) if n else 0.0,
+        "retrieval": rank_metrics(first_hit, k_values),
+        "rerank": rank_metrics(rerank_hit, k_values),
+        # Rows: position of the gold workflow (last row = not retrieved)
+        # Columns: position chosen by the LLM (last column = no valid choice)
+        "confusion": confusion.reshape(width + 1, width + 1).tolist(),
+    }
+
+def evaluate_accuracy(response_json_path, top_tsv_path, qrels_path=None):
+    """
+    Evaluate accuracy based on SGLang inference results and top-k retrieval file.
+    Args:
+        response_json_path (str): Path to SGLang inference result JSON.
+        top_tsv_path (str): Path to top-k retrieval result TSV.
+        qrels_path (str): Optional path to qrels.test.tsv used as ground truth.
+    Returns:
+        float: Accuracy value.
+    """
+    return evaluate_rerank_metrics(response_json_path, top_tsv_path, qrels_path)["accuracy"]
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Rerank generation and evaluation script")
     parser.add_argument('--query_file', type=str, required=True, help='Path to the query file')
     parser.add_argument('--corpus_file', type=str, required=True, help='Path to the corpus file')
@@ -176,34 +375,107 @@ def parse_args():
     parser.add_argument('--sglang_url', type=str, default='http://127.0.0.1:30000/v1/chat/completions', help='SGLang API URL')
     parser.add_argument('--model_name', type=str, required=True, help='SGLang model name')
     parser.add_argument('--template_type', type=str, default='sglang', choices=['top10'], help='Prompt template type')
-    return parser.parse_args()
-
-def main():
-    args = parse_args()
-
-    # Select template
-    if args.template_type == 'sglang':
-        template = rerank_Template_for_SGLang_top10
-    else:
-        raise ValueError("Unsupported template type.")
-
-    # Step 1: Read data and generate prompts
-    queries = read_query_file(args.query_file)
-    workflows = read_corpus_file(args.corpus_file)
-    tops = read_top_file(args.top_file)
-    prompts = generate_prompts(queries, workflows, tops, template)
-
-    # Save prompts to JSON
-    with open(args.prompts_json_path, 'w', encoding='utf-8') as f:
-        json.dump(prompts, f, ensure_ascii=False, indent=4)
-    print(f"Prompts have been saved to '{args.prompts_json_path}'.")
-
-    # Step 2: SGLang inference and save results
-    sglang_inference_and_save(prompts, args.output_json_path, args.sglang_url, args.model_name)
-
-    # Step 3: Evaluate accuracy
-    accuracy = evaluate_accuracy(args.output_json_path, args.top_file)
-    print(f'Accuracy: {accuracy:.2%}')
+    parser.add_argument('--qrels_file', type=str, default=None, help='Path to qrels.test.tsv used as ground truth for evaluation')
+    parser.add_argument('--metrics_json_path', type=str, default=None, help='Path to save the evaluation metrics')
+    parser.add_argument('--cross_encoder_model', type=str, default=None, help='Cross-encoder used to prune candidates before the LLM')
+    parser.add_argument('--cross_encoder_keep', type=int, default=10, help='Number of candidates kept by the cross-encoder')
+    parser.add_argument('--cross_encoder_skip_margin', type=float, default=None, help='Skip the LLM when the cross-encoder top-1 margin reaches this value')
+    parser.add_argument('--cross_encoder_batch_size', type=int, default=32, help='Cross-encoder batch size')
+    parser.add_argument('--cascade_threshold', type=float, default=None, help='Skip the LLM when the retrieval top-1 margin reaches this value')
+    parser.add_argument('--cascade_calibration', type=str, default=None, help='Calibration JSON written by cascade.py, used for the cascade threshold')
+    parser.add_argument('--cascade_target_precision', type=float, default=None, help='Calibrate the cascade threshold on --qrels_file for this top-1 precision')
+    parser.add_argument('--metrics_file', type=str, default=None, help='Path to save the stage metrics (.json, otherwise OpenMetrics text)')
+    parser.add_argument('--reranked_top_file', type=str, default=None, help='Path to save the pruned top-k file (defaults to <top_file>.ce.tsv)')
+    parser.add_argument('--replay', action='store_true', help='Only rerun the prompts of the dead-letter file and merge them into --output_json_path')
+    add_client_args(parser)
+    add_profile_args(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    with profiled(args, "rerank"):
+        # Select template
+        if args.template_type == 'sglang':
+            template = rerank_Template_for_SGLang_top10
+        else:
+            raise ValueError("Unsupported template type.")
+
+        client = client_from_args(args, "rerank", f"{args.output_json_path}.failed.jsonl", metrics)
+        if args.replay:
+            # Rerun only the prompts that failed before and keep every other result
+            prompts = list(take_dead_letters(client.dead_letters.path).values())
+            replayed_qids = {item["query_id"] for item in prompts}
+            with open(args.output_json_path, 'r', encoding='utf-8') as f:
+                previous = [item for item in json.load(f) if item["query_id"] not in replayed_qids]
+            top_file = (args.reranked_top_file or f"{args.top_file}.ce.tsv") if args.cross_encoder_model else args.top_file
+            print(f"Replaying {len(prompts)} failed prompts.")
+            sglang_inference_and_save(prompts, args.output_json_path, args.sglang_url, args.model_name,
+                                      client=client, previous=previous)
+        else:
+            # Step 1: Read data and generate prompts
+            queries = read_query_file(args.query_file)
+            workflows = read_corpus_file(args.corpus_file)
+            tops = read_top_file(args.top_file)
+            top_file = args.top_file
+            bypassed = []
+
+            # Optional cascade: queries whose retrieval top-1 clearly leads keep it without the LLM
+            if args.cascade_threshold is not None or args.cascade_calibration or args.cascade_target_precision is not None:
+                from cascade import load_top_scores, fit_cascade, cascade_bypass
+                if args.cascade_threshold is not None:
+                    threshold = args.cascade_threshold
+                elif args.cascade_calibration:
+                    with open(args.cascade_calibration, 'r', encoding='utf-8') as f:
+                        threshold = json.load(f)["threshold"]
+                else:
+                    threshold = fit_cascade(args.top_file, args.qrels_file, args.cascade_target_precision)["threshold"]
+                confident_qids = [qid for qid in cascade_bypass(load_top_scores(args.top_file), threshold) if qid in queries]
+                bypassed = bypass_results(confident_qids, "cascade")
+                print(f"Cascade threshold {threshold:.4f}: {len(confident_qids)} of {len(queries)} queries answered without the LLM.")
+
+            # Optional cross-encoder stage: prune the retrieved candidates and answer confident queries directly
+            if args.cross_encoder_model:
+                from cross_encoder_rerank import CrossEncoderReranker, cross_encoder_rerank
+                reranker = CrossEncoderReranker(args.cross_encoder_model, batch_size=args.cross_encoder_batch_size)
+                cascade_qids = {item["query_id"] for item in bypassed}
+                pruned_tops, confident_qids, seconds = cross_encoder_rerank(
+                    reranker, {qid: query for qid, query in queries.items() if qid not in cascade_qids},
+                    workflows, tops, args.cross_encoder_keep, args.cross_encoder_skip_margin
+                )
+                tops = {qid: pruned_tops.get(qid, tops[qid]) for qid in queries if qid in tops}
+                top_file = args.reranked_top_file or f"{args.top_file}.ce.tsv"
+                write_top_file(tops, top_file)
+                bypassed += bypass_results(confident_qids, "cross_encoder")
+                metrics.observe("cross_encoder_seconds", seconds)
+                print(f"Cross-encoder scored {len(pruned_tops)} queries in {seconds:.1f}s, "
+                      f"{len(confident_qids)} answered without the LLM; pruned candidates saved to '{top_file}'.")
+
+            bypassed_qids = {item["query_id"] for item in bypassed}
+            prompts = generate_prompts({qid: query for qid, query in queries.items() if qid not in bypassed_qids},
+                                       workflows, tops, template)
+
+            # Save prompts to JSON
+            with open(args.prompts_json_path, 'w', encoding='utf-8') as f:
+                json.dump(prompts, f, ensure_ascii=False, indent=4)
+            print(f"Prompts have been saved to '{args.prompts_json_path}'.")
+
+            # Step 2: SGLang inference and save results
+            sglang_inference_and_save(prompts, args.output_json_path, args.sglang_url, args.model_name, bypassed, client)
+
+        # Step 3: Evaluate accuracy
+        evaluation = evaluate_rerank_metrics(args.output_json_path, top_file, args.qrels_file)
+        print(f'Accuracy: {evaluation["accuracy"]:.2%}')
+        for stage in ("retrieval", "rerank"):
+            summary = ', '.join(f'{name}: {value:.4f}' for name, value in evaluation[stage].items())
+            print(f'{stage.capitalize()} {summary}')
+        if args.metrics_json_path:
+            with open(args.metrics_json_path, 'w', encoding='utf-8') as f:
+                json.dump(evaluation, f, indent=4)
+            print(f"Evaluation metrics saved to: {args.metrics_json_path}")
+        if args.metrics_file:
+            metrics.export(args.metrics_file)
+            print(f"Stage metrics saved to {args.metrics_file}")
 
 if __name__ == "__main__":
     main()
@@ -1,74 +1,180 @@
 import time
+import os
 import json
-import pandas as pd
+import numpy as np
 import argparse
-from sentence_transformers import SentenceTransformer, util
+import functools
 from tqdm import tqdm
+from columnar import is_columnar, read_columnar
+from utils import CorpusStore, standardize_category
+from cascade import top1_margin
+from instrumentation import metrics
+from profiling import add_profile_args, profiled
 
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Workflow Retrieval Script")
     parser.add_argument('--query_file', type=str, default='retrieve/query.txt', help='Path to the query file')
-    parser.add_argument('--corpus_tsv', type=str, default='retrieve/corpus.tsv', help='Path to the corpus TSV file')
+    parser.add_argument('--corpus_tsv', type=str, default='retrieve/corpus.tsv', help='Path to the corpus TSV file (or a .parquet/.arrow columnar corpus)')
     parser.add_argument('--model_path', type=str, default='ToolBench/ToolBench_IR_bert_based_uncased', help='Path to the sentence transformer model')
     parser.add_argument('--output_file', type=str, default='retrieve/retrieval_top5.tsv', help='Path to save the retrieval results')
     parser.add_argument('--top_k', type=int, default=5, help='Number of top results to retrieve')
-    return parser.parse_args()
+    parser.add_argument('--categories', type=str, nargs='*', default=None, help='Only search workflows of these categories')
+    parser.add_argument('--route_k', type=int, default=None, help='Route each query to its closest categories and only search those')
+    parser.add_argument('--tool_root_dir', type=str, default=None, help='ToolBench tool directory used to check the --categories names')
+    parser.add_argument('--metrics_file', type=str, default=None, help='Path to save the stage metrics (.json, otherwise OpenMetrics text)')
+    add_profile_args(parser)
+    return parser.parse_args(argv)
 
 def process_retrieval_document(documents_df):
     """
-    Process the input DataFrame to build the IR corpus and mapping from content to tool info.
+    Process the input DataFrame into a CorpusStore holding each workflow document once.
 
     Args:
         documents_df (pd.DataFrame): DataFrame containing workflow content.
 
     Returns:
-        tuple: (ir_corpus, corpus2tool)
-            ir_corpus (dict): {docid: document_content}
-            corpus2tool (dict): {document_content: "category_name\tworkflow_description"}
+        CorpusStore: Rows of (wocid, "category_name, workflow_description", category_name).
     """
-    ir_corpus = {}
-    corpus2tool = {}
+    store = CorpusStore(label_fields=('category_name',))
     for row in documents_df.itertuples():
-        doc = json.loads(row.workflow_content)
-        category = doc.get('category_name', '') or ''
-        description = doc.get('workflow_description', '') or ''
-        doc_content = f"{category}, {description}"
-        ir_corpus[row.wocid] = doc_content
-        corpus2tool[doc_content] = f"{category}\t{description}"
-    return ir_corpus, corpus2tool
+        append_workflow_document(store, row.wocid, row.workflow_content)
+    return store
+
+def append_workflow_document(store, wocid, workflow_content):
+    """
+    Append one workflow document to a CorpusStore.
+
+    Args:
+        store (CorpusStore): Store with a category_name label.
+        wocid (int): Workflow id.
+        workflow_content (str or dict): Workflow document as a JSON string or an already parsed dict.
+    """
+    doc = json.loads(workflow_content) if isinstance(workflow_content, str) else workflow_content
+    category = doc.get('category_name', '') or ''
+    description = doc.get('workflow_description', '') or ''
+    store.append(wocid, f"{category}, {description}", category_name=category)
+
+def process_retrieval_columns(columns):
+    """
+    Build the CorpusStore from a pre-parsed columnar corpus, without per-row JSON parsing.
+
+    Args:
+        columns (dict): {column: list} as returned by columnar.read_columnar.
+
+    Returns:
+        CorpusStore: Same layout as process_retrieval_document.
+    """
+    store = CorpusStore(label_fields=('category_name',))
+    for doc_id, category, description in zip(columns['id'], columns['category_name'], columns['description']):
+        store.append(doc_id, f"{category}, {description}", category_name=category)
+    return store
+
+category_key = functools.lru_cache(maxsize=None)(standardize_category)
+
+def partition_by_category(store):
+    """
+    Reorder a CorpusStore so that the rows of each category are contiguous.
+
+    Categories are keyed by standardize_category(category_name), the name of the ToolBench
+    tool directory the workflow comes from.
+
+    Returns:
+        tuple: (sorted_store, order, partitions)
+            sorted_store (CorpusStore): The reordered store.
+            order (list): Original row of every row of sorted_store.
+            partitions (dict): {category: (start_row, end_row)} in sorted_store.
+    """
+    keys = [category_key(category) for category in store.labels['category_name']]
+    order = sorted(range(len(store)), key=keys.__getitem__)
+    sorted_store = CorpusStore(label_fields=('category_name',))
+    partitions = {}
+    for new_row, row in enumerate(order):
+        sorted_store.append(store.ids[row], store.texts[row], category_name=store.label('category_name', row))
+        start, _ = partitions.get(keys[row], (new_row, new_row))
+        partitions[keys[row]] = (start, new_row + 1)
+    return sorted_store, order, partitions
+
+def load_tool_categories(tool_root_dir):
+    """
+    List the ToolBench categories, i.e. the sub-directories of the tool root directory.
+    """
+    return sorted(name for name in os.listdir(tool_root_dir) if os.path.isdir(os.path.join(tool_root_dir, name)))
+
+def workflow_tool_info(store, row):
+    """
+    Tool info of a corpus row. The description is the part of the document text after
+    "category_name, ", so it is not stored a second time.
+    """
+    category = store.label('category_name', row)
+    return {
+        "category": category,
+        "workflow_description": store.texts[row][len(category) + 2:]
+    }
+
+def load_queries(query_file_path):
+    """
+    Load queries from a qid<TAB>query file or a columnar query file.
+
+    Returns:
+        pd.DataFrame: Columns qid, query.
+    """
+    import pandas as pd
+
+    if is_columnar(query_file_path):
+        columns = read_columnar(query_file_path)
+        return pd.DataFrame({'qid': columns['id'], 'query': columns['query']})
+    return pd.read_csv(query_file_path, sep='\t', names=['qid', 'query'])
 
 class WorkflowRetriever:
     """
     WorkflowRetriever is responsible for loading the corpus, building embeddings,
     and retrieving the most relevant tools for a given query.
+
+    Documents added after start-up go to a small delta segment that is searched together
+    with the main index; removed documents are tombstoned. Once the delta segment or the
+    tombstones reach `delta_limit` rows, both are compacted into the main index without
+    re-encoding anything.
+
+    Rows are numbered across both segments: rows below len(self.store) belong to the main
+    index, the following ones to the delta segment. The main index is sorted by category,
+    so a category filter searches contiguous slices of the embeddings instead of the whole corpus.
     """
-    def __init__(self, corpus_tsv_path: str = "", model_path: str = ""):
+    def __init__(self, corpus_tsv_path: str = "", model_path: str = "", delta_limit: int = 10000):
         """
         Initialize the retriever with corpus and model.
 
         Args:
             corpus_tsv_path (str): Path to the corpus TSV file.
             model_path (str): Path to the sentence transformer model.
+            delta_limit (int): Delta rows or tombstones that trigger a compaction.
         """
         self.corpus_tsv_path = corpus_tsv_path
         self.model_path = model_path
-        self.corpus, self.corpus2tool = self.build_retrieval_corpus()
+        self.delta_limit = delta_limit
+        self.store, _, self.partitions = partition_by_category(self.build_retrieval_corpus())
+        self.corpus = self.store.texts
         self.embedder = self.build_retrieval_embedder()
         self.corpus_embeddings = self.build_corpus_embeddings()
+        self.category_names = list(self.partitions)
+        self.category_centroids = None
+        self.delta_store = CorpusStore(label_fields=('category_name',))
+        self.delta_embeddings = None
+        self.deleted_rows = set()
 
     def build_retrieval_corpus(self):
         """
         Load and process the corpus from TSV file.
 
         Returns:
-            tuple: (corpus, corpus2tool)
+            CorpusStore: The corpus documents.
         """
         print("Building corpus...")
+        if is_columnar(self.corpus_tsv_path):
+            columns = read_columnar(self.corpus_tsv_path, columns=['id', 'category_name', 'description'])
+            return process_retrieval_columns(columns)
+        import pandas as pd
         documents_df = pd.read_csv(self.corpus_tsv_path, sep='\t')
-        corpus, corpus2tool = process_retrieval_document(documents_df)
-        corpus_ids = list(corpus.keys())
-        corpus_list = [corpus[cid] for cid in corpus_ids]
-        return corpus_list, corpus2tool
+        return process_retrieval_document(documents_df)
 
     def build_retrieval_embedder(self):
         """
@@ -78,6 +184,7 @@ class WorkflowRetriever:
             SentenceTransformer: The loaded model.
         """
         print("Building embedder...")
+        from sentence_transformers import SentenceTransformer
         embedder = SentenceTransformer(self.model_path)
         return embedder
 
@@ -89,88 +196,292 @@ class WorkflowRetriever:
             np.ndarray: Corpus embeddings.
         """
         print("Building corpus embeddings with embedder...")
-        corpus_embeddings = self.embedder.encode(self.corpus, convert_to_tensor=True)
+        with metrics.span("retrieval_corpus_encode"):
+            corpus_embeddings = self.embedder.encode(self.corpus, convert_to_tensor=True)
+        metrics.inc("retrieval_documents_encoded", len(self.corpus))
         return corpus_embeddings
 
-    def retrieving(self, query: str, top_k: int = 5):
+    def locate(self, row):
+        """
+        Map a retriever row to (store, row in that store).
+        """
+        if row < len(self.store):
+            return self.store, row
+        return self.delta_store, row - len(self.store)
+
+    def doc_id(self, row):
+        store, local_row = self.locate(row)
+        return store.ids[local_row]
+
+    def add_documents(self, documents):
+        """
+        Add or replace workflow documents without re-encoding the corpus.
+
+        Args:
+            documents (iterable): (wocid, workflow_content) pairs, the content being the JSON
+                string of corpus.tsv or the parsed dict.
+
+        Returns:
+            int: Number of documents added.
+        """
+        import torch
+
+        documents = list(documents)
+        if not documents:
+            return 0
+        self.remove_documents(wocid for wocid, _ in documents)
+        start = len(self.delta_store)
+        for wocid, workflow_content in documents:
+            append_workflow_document(self.delta_store, wocid, workflow_content)
+        with metrics.span("retrieval_delta_encode"):
+            embeddings = self.embedder.encode(self.delta_store.texts[start:], convert_to_tensor=True)
+        metrics.inc("retrieval_documents_encoded", len(documents))
+        if self.delta_embeddings is None:
+            self.delta_embeddings = embeddings
+        else:
+            self.delta_embeddings = torch.cat([self.delta_embeddings, embeddings])
+        self.category_centroids = None
+        self.maybe_compact()
+        return len(documents)
+
+    def remove_documents(self, wocids):
+        """
+        Tombstone every document with one of the given ids.
+
+        Returns:
+            int: Number of rows removed.
+        """
+        wocids = np.fromiter((int(wocid) for wocid in wocids), dtype=np.int64)
+        if not len(wocids):
+            return 0
+        removed = 0
+        for offset, store in ((0, self.store), (len(self.store), self.delta_store)):
+            if not len(store):
+                continue
+            rows = np.flatnonzero(np.isin(np.frombuffer(store.ids, dtype=np.int64), wocids)) + offset
+            new_rows = set(rows.tolist()) - self.deleted_rows
+            self.deleted_rows |= new_rows
+            removed += len(new_rows)
+        self.maybe_compact()
+        return removed
+
+    def maybe_compact(self):
+        if len(self.delta_store) >= self.delta_limit or len(self.deleted_rows) >= self.delta_limit:
+            self.compact()
+
+    def compact(self):
+        """
+        Merge the delta segment into the main index and drop tombstoned rows.
+        """
+        import torch
+
+        metrics.inc("retrieval_compactions")
+        store = CorpusStore(label_fields=('category_name',))
+        live_rows = [row for row in range(len(self.store) + len(self.delta_store)) if row not in self.deleted_rows]
+        for row in live_rows:
+            source, local_row = self.locate(row)
+            store.append(source.ids[local_row], source.texts[local_row],
+                         category_name=source.label('category_name', local_row))
+        self.store, order, self.partitions = partition_by_category(store)
+        segments = [self.corpus_embeddings]
+        if self.delta_embeddings is not None:
+            segments.append(self.delta_embeddings)
+        embeddings = torch.cat(segments) if len(segments) > 1 else segments[0]
+        rows = [live_rows[row] for row in order]
+        self.corpus_embeddings = embeddings[torch.as_tensor(rows, dtype=torch.long)]
+        self.corpus = self.store.texts
+        self.category_names = list(self.partitions)
+        self.category_centroids = None
+        self.delta_store = CorpusStore(label_fields=('category_name',))
+        self.delta_embeddings = None
+        self.deleted_rows = set()
+
+    def route(self, query_embedding, route_k):
+        """
+        Pick the categories whose mean embedding, delta segment included, is closest to the query.
+
+        Args:
+            query_embedding: Encoded query.
+            route_k (int): Number of categories to keep.
+
+        Returns:
+            list: Category names, best first.
+        """
+        import torch
+        from sentence_transformers import util
+
+        if self.category_centroids is None:
+            # Delta rows count towards their category, so categories added since the last
+            # compaction are routable too
+            sums = {category: (self.corpus_embeddings[start:end].sum(0), end - start)
+                    for category, (start, end) in self.partitions.items()}
+            for row, category in enumerate(self.delta_store.labels['category_name']):
+                category = category_key(category)
+                total, count = sums.get(category, (0, 0))
+                sums[category] = (total + self.delta_embeddings[row], count + 1)
+            self.category_names = list(sums)
+            self.category_centroids = torch.stack([total / count for total, count in sums.values()])
+        hits = util.semantic_search(
+            query_embedding, self.category_centroids, top_k=route_k, score_function=util.cos_sim
+        )
+        return [self.category_names[hit['corpus_id']] for hit in hits[0]]
+
+    def search_segments(self, categories=None):
+        """
+        Embedding blocks to search, as (embeddings, first_row, rows) triples; rows maps a hit
+        inside the block to its retriever row when the block is not contiguous.
+        """
+        import torch
+
+        if categories is None:
+            segments = [(self.corpus_embeddings, 0, None)]
+            if self.delta_embeddings is not None:
+                segments.append((self.delta_embeddings, len(self.store), None))
+            return segments
+
+        categories = {category_key(category) for category in categories}
+        segments = [
+            (self.corpus_embeddings[start:end], start, None)
+            for category, (start, end) in self.partitions.items() if category in categories
+        ]
+        delta_rows = [row for row, category in enumerate(self.delta_store.labels['category_name'])
+                      if category_key(category) in categories]
+        if delta_rows:
+            segments.append((self.delta_embeddings[torch.as_tensor(delta_rows, dtype=torch.long)],
+                             len(self.store), delta_rows))
+        return segments
+
+    def search(self, query: str, top_k: int = 5, categories=None, route_k=None):
+        """
+        Score the main index and the delta segment against a query.
+
+        Args:
+            query (str): The input query.
+            top_k (int): Number of top results to return.
+            categories (list): If given, only documents of these categories are searched.
+            route_k (int): Without categories, route the query to its route_k closest categories.
+
+        Returns:
+            list: (row, score) pairs sorted by descending cosine score.
+        """
+        from sentence_transformers import util
+
+        metrics.inc("retrieval_queries")
+        with metrics.span("retrieval_encode"):
+            query_embedding = self.embedder.encode(query, convert_to_tensor=True)
+        if categories is None and route_k:
+            with metrics.span("retrieval_route"):
+                categories = self.route(query_embedding, route_k)
+        # Ask for extra hits so that tombstoned rows do not shrink the result list
+        limit = 5 * top_k + len(self.deleted_rows)
+        hits = []
+        with metrics.span("retrieval_search"):
+            for embeddings, first_row, rows in self.search_segments(categories):
+                if not len(embeddings):
+                    continue
+                segment_hits = util.semantic_search(
+                    query_embedding, embeddings, top_k=min(limit, len(embeddings)), score_function=util.cos_sim
+                )
+                for hit in segment_hits[0]:
+                    row = first_row + (rows[hit['corpus_id']] if rows is not None else hit['corpus_id'])
+                    hits.append((row, float(hit['score'])))
+        hits = [hit for hit in hits if hit[0] not in self.deleted_rows]
+        hits.sort(key=lambda hit: -hit[1])
+        return hits[:5 * top_k]
+
+    def retrieving(self, query: str, top_k: int = 5, categories=None, route_k=None):
         """
         Retrieve the top-k relevant tools for a given query.
 
         Args:
             query (str): The input query.
             top_k (int): Number of top results to return.
+            categories (list): If given, only tools of these categories are retrieved.
+            route_k (int): Without categories, only search the route_k categories closest to the query.
 
         Returns:
             tuple: (retrieved_tools, retrieved_ids)
-                retrieved_tools (list): List of dicts with tool info.
+                retrieved_tools (list): List of dicts with tool info and the cosine score of the hit.
                 retrieved_ids (list): List of retrieved document contents.
         """
-        print("Retrieving...")
-        query_embedding = self.embedder.encode(query, convert_to_tensor=True)
-        hits = util.semantic_search(
-            query_embedding, self.corpus_embeddings, top_k=5 * top_k, score_function=util.cos_sim
-        )
         retrieved_tools = []
         retrieved_ids = []
-        for hit in hits[0]:
-            doc_content = self.corpus[hit['corpus_id']]
-            retrieved_ids.append(doc_content)
-            category, description = self.corpus2tool[doc_content].split('\t')
-            tool_info = {
-                "category": category,
-                "workflow_description": description
-            }
-            retrieved_tools.append(tool_info)
+        for row, score in self.search(query, top_k, categories, route_k):
+            store, local_row = self.locate(row)
+            retrieved_ids.append(store.texts[local_row])
+            retrieved_tools.append(dict(workflow_tool_info(store, local_row), score=score))
         return retrieved_tools, retrieved_ids
 
-def main():
-    args = parse_args()
-    query_file_path = args.query_file
-    model_path = args.model_path
-    corpus_tsv_path = args.corpus_tsv
-    output_file_path = args.output_file
-    top_k = args.top_k
+    @staticmethod
+    def margin(retrieved_tools):
+        """
+        Cosine-score gap between the first and the second retrieved tool.
+        """
+        return top1_margin([tool["score"] for tool in retrieved_tools])
 
-    # Load queries
-    query_df = pd.read_csv(query_file_path, sep='\t', names=['qid', 'query'])
+def main(argv=None):
+    args = parse_args(argv)
 
-    # Initialize retriever
-    retriever = WorkflowRetriever(corpus_tsv_path=corpus_tsv_path, model_path=model_path)
+    with profiled(args, "retrieval"):
+        import pandas as pd
 
-    # Retrieval results
-    results = []
+        query_file_path = args.query_file
+        model_path = args.model_path
+        corpus_tsv_path = args.corpus_tsv
+        output_file_path = args.output_file
+        top_k = args.top_k
 
-    # Process each query and collect retrieval results
-    for _, row in tqdm(query_df.iterrows(), total=query_df.shape[0], desc="Processing Queries"):
-        _, retrieved_ids = retriever.retrieving(row['query'], top_k=top_k)
-        results.append({
-            'qid': row['qid'],
-            'retrieval_ids': ','.join(map(str, retrieved_ids))
-        })
+        # Load queries
+        query_df = load_queries(query_file_path)
 
-    # Save results to file
-    results_df = pd.DataFrame(results)
-    results_df.to_csv(output_file_path, sep='\t', index=False)
+        if args.categories and args.tool_root_dir:
+            known_categories = set(load_tool_categories(args.tool_root_dir))
+            unknown = [category for category in args.categories if standardize_category(category) not in known_categories]
+            if unknown:
+                raise ValueError(f"Unknown categories (not in {args.tool_root_dir}): {unknown}")
 
-    # Evaluate retrieval accuracy
-    results_df = pd.read_csv(output_file_path, sep='\t')
+        # Initialize retriever
+        retriever = WorkflowRetriever(corpus_tsv_path=corpus_tsv_path, model_path=model_path)
 
-    def is_correct_retrieval(row):
-        """
-        Check if the query id is in the retrieved ids.
+        # Retrieval results
+        results = []
 
-        Args:
-            row (pd.Series): Row of the DataFrame.
+        # Process each query and collect retrieval results
+        for _, row in tqdm(query_df.iterrows(), total=query_df.shape[0], desc="Processing Queries"):
+            hits = retriever.search(row['query'], top_k=top_k, categories=args.categories, route_k=args.route_k)
+            results.append({
+                'qid': row['qid'],
+                'retrieval_ids': ','.join(str(retriever.doc_id(hit_row)) for hit_row, _ in hits),
+                'retrieval_scores': ','.join(f"{score:.6f}" for _, score in hits)
+            })
 
-        Returns:
-            bool: True if correct, False otherwise.
-        """
-        retrieval_ids = list(map(str, row['retrieval_ids'].split(',')))
-        return str(row['qid']) in retrieval_ids
+        # Save results to file
+        results_df = pd.DataFrame(results)
+        results_df.to_csv(output_file_path, sep='\t', index=False)
+
+        # Evaluate retrieval accuracy
+        results_df = pd.read_csv(output_file_path, sep='\t')
+
+        def is_correct_retrieval(row):
+            """
+            Check if the query id is in the retrieved ids.
+
+            Args:
+                row (pd.Series): Row of the DataFrame.
+
+            Returns:
+                bool: True if correct, False otherwise.
+            """
+            retrieval_ids = list(map(str, row['retrieval_ids'].split(',')))
+            return str(row['qid']) in retrieval_ids
+
+        results_df['is_correct'] = results_df.apply(is_correct_retrieval, axis=1)
+        accuracy = results_df['is_correct'].mean()
+        print(f"Retrieval Accuracy: {accuracy:.2%}")
 
-    results_df['is_correct'] = results_df.apply(is_correct_retrieval, axis=1)
-    accuracy = results_df['is_correct'].mean()
-    print(f"Retrieval Accuracy: {accuracy:.2%}")
+        if args.metrics_file:
+            metrics.export(args.metrics_file)
+            print(f"Metrics saved to {args.metrics_file}")
 
 if __name__ == "__main__":
     main()
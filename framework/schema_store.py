@@ -0,0 +1,109 @@
+"""
+Persistent store of OpenAI-function schemas, converted once per (category, tool, api).
+"""
+
+import os
+import json
+import argparse
+from framework.profiling import add_profile_args, profiled
+
+class SchemaStore:
+    """
+    SchemaStore memoizes api_json_to_openai_json results by (category, tool, api) and can be
+    saved to and reloaded from a JSON file, so the same APIs are converted once across queries and runs.
+
+    The store is keyed by names only; delete the cache file when the tool directory changes.
+    """
+    def __init__(self, cache_file=None):
+        """
+        Args:
+            cache_file (str): Optional path of the JSON file the store is loaded from and saved to.
+        """
+        self.cache_file = cache_file
+        self.schemas = {}
+        self.added = set()
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                self.schemas = json.load(f)
+
+    @staticmethod
+    def key(category_name, standard_tool_name, api_name):
+        return f"{category_name}/{standard_tool_name}/{api_name}"
+
+    def get(self, api_json, standard_tool_name, convert):
+        """
+        Return the OpenAI-function schema of an API, converting it on first use.
+
+        Args:
+            api_json (dict): API description as built by fetch_api_json.
+            standard_tool_name (str): Standardized tool name.
+            convert (callable): api_json_to_openai_json.
+
+        Returns:
+            dict: The schema. The code_* fields are taken from api_json; the nested parameters are
+                shared with the store and must be treated as read-only.
+        """
+        key = self.key(api_json["category_name"], standard_tool_name, api_json["api_name"])
+        schema = self.schemas.get(key)
+        if schema is None:
+            self.misses += 1
+            schema = convert(api_json, standard_tool_name)
+            self.schemas[key] = schema
+            self.added.add(key)
+            self.dirty = True
+        else:
+            self.hits += 1
+        if (schema["code_cate"], schema["code_tool"], schema["code_api"]) == \
+                (api_json["code_cate"], api_json["code_tool"], api_json["code_api"]):
+            return schema
+        return dict(schema, code_cate=api_json["code_cate"], code_tool=api_json["code_tool"], code_api=api_json["code_api"])
+
+    def merge(self, schemas):
+        """
+        Add schemas converted elsewhere, e.g. by worker processes.
+        """
+        for key, schema in schemas.items():
+            if key not in self.schemas:
+                self.schemas[key] = schema
+                self.added.add(key)
+                self.dirty = True
+
+    def __len__(self):
+        return len(self.schemas)
+
+    def save(self, path=None):
+        """
+        Write the store to disk if it changed since it was loaded.
+        """
+        path = path or self.cache_file
+        if not path or (not self.dirty and path == self.cache_file):
+            return
+        tmp_file = path + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.schemas, f, ensure_ascii=False)
+        os.replace(tmp_file, path)
+        self.dirty = False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert every API of the tool directory into OpenAI-function schemas in one pass.")
+    parser.add_argument('--tool_root_dir', type=str, required=True, help="Root directory of the tool JSON files.")
+    parser.add_argument('--output_file', type=str, required=True, help="Path to save the schema store JSON file.")
+    add_profile_args(parser)
+
+    args = parser.parse_args(argv)
+
+    with profiled(args, "schema_store"):
+        from framework.inference import export_openai_schemas
+
+        store = SchemaStore()
+        export_openai_schemas(args.tool_root_dir, store)
+        store.save(args.output_file)
+        print(f"{len(store)} schemas saved to {args.output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Streaming mode that overlaps workflow planning with HTTP node generation.
+
+Planned workflows are pushed through a bounded queue straight into driver_character_gen,
+so both stages keep the server busy and the run is limited by the slower stage only.
+"""
+
+import json
+import queue
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+from framework.planning import request_plan, parse_response, load_prompts
+from framework.inference import driver_character_gen, generate_node_with_retries, load_data, save_new_json, export_openai_schemas
+from framework.utils import standardize, change_name
+from framework.schema_store import SchemaStore
+from framework.workflow_graph import parse_workflow
+from framework.instrumentation import metrics
+from framework.profiling import add_profile_args, profiled
+from framework.llm_client import ResilientClient, LLMCallFailed, add_client_args, client_from_args, take_dead_letters
+
+_DONE = object()
+
+
+def index_api_schemas(schema_store):
+    """
+    Index the OpenAI-function schemas of a SchemaStore by the function names the planner sees.
+
+    Args:
+        schema_store (SchemaStore): Store filled by export_openai_schemas or loaded from --schema_cache.
+
+    Returns:
+        dict: {"<api>_for_<tool>": schema}, the names used in the ToolBench trajectories, plus the bare
+            standardized "<api>" name, which maps to the first tool that has it.
+    """
+    api_schemas = {}
+    for schema in schema_store.schemas.values():
+        api_schemas[schema["origin_api_name"]] = schema
+        api_schemas.setdefault(schema["name"], schema)
+        api_schemas.setdefault(schema["origin_api_name"].split("_for_")[0], schema)
+    return api_schemas
+
+
+def plan_to_workflow_details(plan, api_schemas=None):
+    """
+    Build the workflow_details expected by the node generation stage from a parsed plan.
+
+    The batch input of inference.py carries the ToolBench API of every HTTP node in its details.
+    Here the API is looked up by node name in api_schemas and its description and parameters are
+    added to the details; nodes whose API is unknown only get their label and the plan explanation.
+
+    Args:
+        plan (dict): {"explanation", "workflow"} as returned by parse_response.
+        api_schemas (dict): {function name: schema} as returned by index_api_schemas.
+
+    Returns:
+        dict: {"HTTP request (<api>)": details} for every HTTP node of the workflow.
+    """
+    api_schemas = api_schemas or {}
+    workflow_details = {}
+    for node in parse_workflow(plan["workflow"]):
+        if node.kind != "http":
+            continue
+        label = f"HTTP request ({node.name})"
+        details = f"Node: {label}\nWorkflow explanation: {plan['explanation']}\n"
+        schema = api_schemas.get(node.name) or api_schemas.get(change_name(standardize(node.name)))
+        if schema is not None:
+            api = {field: schema[field] for field in ("name", "cate_name", "description", "parameters")}
+            details += f"API: {json.dumps(api, ensure_ascii=False)}\n"
+        workflow_details[label] = details
+    return workflow_details
+
+
+def stream_plan_and_generate(prompts, planning_workers=8, generation_workers=8, queue_size=64, planning_client=None,
+                             node_client=None, api_schemas=None):
+    """
+    Plan every prompt and generate its HTTP nodes with the two stages running concurrently.
+
+    Args:
+        prompts (dict): {key: planning prompt}, as read by generate_responses.
+        planning_workers (int): Number of concurrent planning requests.
+        generation_workers (int): Number of concurrent node generation workers.
+        queue_size (int): Maximum number of planned workflows waiting for node generation.
+        planning_client (ResilientClient): Retry, timeout and dead-letter policy of the planning requests.
+        node_client (ResilientClient): Retry, timeout and dead-letter policy of the node requests. The two
+            stages have their own client, since planning responses are several times longer than nodes.
+        api_schemas (dict): {function name: schema} used to describe the API of every HTTP node.
+
+    Returns:
+        tuple: (responses, plans, workflows)
+            responses (dict): {"<key>_output": raw planning response}
+            plans (dict): {"<n>_trajectory": {"explanation", "workflow"}}, as written by process_responses
+            workflows (list): [{"trajectory", "workflow", "workflow_details"}] with generated node JSON
+    """
+    planning_client = planning_client or ResilientClient("planning", registry=metrics)
+    node_client = node_client or ResilientClient("node_generation", registry=metrics)
+    plan_queue = queue.Queue(maxsize=queue_size)
+    responses, plans, workflows = {}, {}, []
+    lock = threading.Lock()
+    progress = tqdm(total=len(prompts), desc="Planning + node generation")
+
+    def plan(key, prompt):
+        try:
+            response = request_plan(planning_client, key, prompt)
+        except LLMCallFailed as e:
+            print(f"Error generating response for {key}: {e.error}")
+            with lock:
+                progress.update(1)
+            return
+        parsed = parse_response(response)
+        trajectory_key = f"{str(key).split('_')[0]}_trajectory"
+        with lock:
+            responses[f"{key}_output"] = response
+            plans[trajectory_key] = parsed
+        # Blocks while node generation is behind, which bounds memory and in-flight work
+        plan_queue.put((trajectory_key, parsed))
+
+    def generate():
+        while True:
+            item = plan_queue.get()
+            if item is _DONE:
+                break
+            trajectory_key, parsed = item
+            workflow_details = plan_to_workflow_details(parsed, api_schemas)
+            for name, details in workflow_details.items():
+                try:
+                    workflow_details[name] = generate_node_with_retries(node_client, driver_character_gen, name, details,
+                                                                        f"{trajectory_key}:{name}")
+                except LLMCallFailed as e:
+                    print(f"Error generating node {name} for {trajectory_key}: {e.error}")
+                    workflow_details[name] = {}
+            with lock:
+                workflows.append({
+                    "trajectory": trajectory_key,
+                    "workflow": parsed["workflow"],
+                    "workflow_details": workflow_details,
+                })
+                progress.update(1)
+
+    consumers = [threading.Thread(target=generate, daemon=True) for _ in range(generation_workers)]
+    for consumer in consumers:
+        consumer.start()
+
+    with ThreadPoolExecutor(max_workers=planning_workers) as executor:
+        for future in [executor.submit(plan, key, prompt) for key, prompt in prompts.items()]:
+            future.result()
+
+    for _ in consumers:
+        plan_queue.put(_DONE)
+    for consumer in consumers:
+        consumer.join()
+    progress.close()
+    planning_client.report()
+    node_client.report()
+
+    order = {f"{str(key).split('_')[0]}_trajectory": index for index, key in enumerate(prompts)}
+    workflows.sort(key=lambda item: order[item["trajectory"]])
+    return responses, plans, workflows
+
+
+def regenerate_nodes(failed_nodes, client):
+    """
+    Generate the dead-lettered HTTP nodes of a streaming run again.
+
+    Args:
+        failed_nodes (dict): {"<n>_trajectory:<node label>": {"name", "user_information"}}, as read by take_dead_letters.
+        client (ResilientClient): Node generation client; nodes that fail again are dead-lettered again.
+
+    Returns:
+        dict: {"<n>_trajectory:<node label>": node JSON} for the nodes that were generated.
+    """
+    nodes = {}
+    work = client.dispatch(failed_nodes.items(), lambda item: generate_node_with_retries(
+        client, driver_character_gen, item[1]["name"], item[1]["user_information"], item[0]))
+    for (key, _), node, error in tqdm(work, desc="Replaying HTTP nodes", total=len(failed_nodes)):
+        if isinstance(error, LLMCallFailed):
+            print(f"Error generating node {key}: {error.error}")
+        elif error is not None:
+            raise error
+        else:
+            nodes[key] = node
+    client.report()
+    return nodes
+
+
+def merge_replay(responses_file, output_file, workflow_file, responses, plans, workflows, nodes):
+    """
+    Merge the results of a replay into the outputs of the original streaming run.
+
+    Returns:
+        tuple: (responses, plans, workflows) to save.
+    """
+    merged_responses = load_data(responses_file)
+    merged_responses.update(responses)
+    merged_plans = load_data(output_file)
+    merged_plans.update(plans)
+    merged_workflows = load_data(workflow_file)
+    by_trajectory = {item["trajectory"]: item for item in merged_workflows}
+    for item in workflows:
+        if item["trajectory"] in by_trajectory:
+            by_trajectory[item["trajectory"]].update(item)
+        else:
+            merged_workflows.append(item)
+            by_trajectory[item["trajectory"]] = item
+    for key, node in nodes.items():
+        trajectory_key, name = key.split(":", 1)
+        if trajectory_key in by_trajectory:
+            by_trajectory[trajectory_key]["workflow_details"][name] = node
+    return merged_responses, merged_plans, merged_workflows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan workflows and generate their HTTP nodes in one streaming pass.")
+    parser.add_argument('--prompts_file', type=str, default=None, help="Path to the input JSON file containing prompts.")
+    parser.add_argument('--responses_file', type=str, required=True, help="Path to save the responses JSON file.")
+    parser.add_argument('--output_file', type=str, required=True, help="Path to save the processed planning JSON file.")
+    parser.add_argument('--workflow_file', type=str, required=True, help="Path to save the workflows with generated nodes.")
+    parser.add_argument('--tool_root_dir', type=str, default=None, help="Root directory of the tool JSON files.")
+    parser.add_argument('--schema_cache', type=str, default=None, help="Path to a persistent OpenAI-function schema store.")
+    parser.add_argument('--sgl_url', type=str, default="http://localhost:30000", help="URL of the SGL backend.")
+    parser.add_argument('--planning_workers', type=int, default=8, help="Number of concurrent planning requests.")
+    parser.add_argument('--generation_workers', type=int, default=8, help="Number of concurrent node generation workers.")
+    parser.add_argument('--queue_size', type=int, default=64, help="Maximum number of planned workflows waiting for generation.")
+    parser.add_argument('--metrics_file', type=str, default=None, help="Path to save the stage metrics (.json, otherwise OpenMetrics text).")
+    parser.add_argument('--node_dead_letter_file', type=str, default=None,
+                        help="JSONL file of failed HTTP nodes (default: <workflow_file>.failed.jsonl).")
+    parser.add_argument('--replay', action='store_true',
+                        help="Only re-plan the failed prompts and regenerate the failed nodes, and merge them into the outputs.")
+    add_client_args(parser)
+    add_profile_args(parser)
+
+    args = parser.parse_args(argv)
+    if not args.prompts_file and not args.replay:
+        parser.error("--prompts_file is required unless --replay is given")
+
+    with profiled(args, "streaming"):
+        import sglang as sgl
+        sgl.set_default_backend(sgl.RuntimeEndpoint(args.sgl_url))
+
+        planning_client = client_from_args(args, "planning", f"{args.responses_file}.failed.jsonl", metrics)
+        node_args = argparse.Namespace(**dict(vars(args), dead_letter_file=args.node_dead_letter_file))
+        node_client = client_from_args(node_args, "node_generation", f"{args.workflow_file}.failed.jsonl", metrics)
+        if args.replay:
+            prompts = take_dead_letters(planning_client.dead_letters.path)
+            failed_nodes = take_dead_letters(node_client.dead_letters.path)
+            print(f"Replaying {len(prompts)} failed prompts and {len(failed_nodes)} failed HTTP nodes.")
+        else:
+            prompts = load_prompts(args.prompts_file)
+
+        schema_store = SchemaStore(args.schema_cache)
+        if args.tool_root_dir:
+            export_openai_schemas(args.tool_root_dir, schema_store)
+            schema_store.save()
+        if not len(schema_store):
+            print("No --tool_root_dir or --schema_cache given: HTTP nodes are generated without their API details.")
+
+        responses, plans, workflows = stream_plan_and_generate(
+            prompts, args.planning_workers, args.generation_workers, args.queue_size,
+            planning_client, node_client, index_api_schemas(schema_store)
+        )
+        if args.replay:
+            responses, plans, workflows = merge_replay(
+                args.responses_file, args.output_file, args.workflow_file, responses, plans, workflows,
+                regenerate_nodes(failed_nodes, node_client)
+            )
+
+        save_new_json(responses, args.responses_file)
+        save_new_json(plans, args.output_file)
+        save_new_json(workflows, args.workflow_file)
+        print(f"Planned {len(plans)} workflows; outputs saved to {args.output_file} and {args.workflow_file}")
+
+        if args.metrics_file:
+            metrics.export(args.metrics_file)
+            print(f"Metrics saved to {args.metrics_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import json
 import re
+from array import array
 
 def extract_successful_finish_trajectories(data):
     """
@@ -96,12 +97,70 @@ def standardize_category(category):
     return save_category
 
 
+class CorpusStore:
+    """
+    Id-indexed, array-backed document store.
+
+    Row i holds ids[i], the document text texts[i] (stored once) and the label columns,
+    e.g. category and tool names. Label values repeat across many rows and are interned,
+    so each distinct value is kept once.
+    """
+    def __init__(self, label_fields=()):
+        self.ids = array('q')
+        self.texts = []
+        self.labels = {field: [] for field in label_fields}
+        self._interned = {}
+
+    def append(self, doc_id, text, **labels):
+        self.ids.append(int(doc_id))
+        self.texts.append(text)
+        for field, values in self.labels.items():
+            value = labels.get(field, '') or ''
+            values.append(self._interned.setdefault(value, value))
+
+    def label(self, field, row):
+        return self.labels[field][row]
+
+    def __len__(self):
+        return len(self.texts)
+
+
+def build_api_corpus_store(documents_df):
+    """
+    Process the documents dataframe into a CorpusStore.
+
+    Each row stores the docid, the concatenated document details (built once) and the
+    category, tool and API names.
+
+    Args:
+        documents_df (DataFrame): DataFrame containing document information.
+
+    Returns:
+        CorpusStore: Store with label fields category_name, tool_name and api_name.
+    """
+    store = CorpusStore(label_fields=('category_name', 'tool_name', 'api_name'))
+    for row in documents_df.itertuples():
+        doc = json.loads(row.document_content)
+        text = (doc.get('category_name', '') or '') + ', ' + \
+               (doc.get('tool_name', '') or '') + ', ' + \
+               (doc.get('api_name', '') or '') + ', ' + \
+               (doc.get('api_description', '') or '') + \
+               ', required_params: ' + json.dumps(doc.get('required_parameters', '')) + \
+               ', optional_params: ' + json.dumps(doc.get('optional_parameters', '')) + \
+               ', return_schema: ' + json.dumps(doc.get('template_response', ''))
+        store.append(row.docid, text, category_name=doc['category_name'], tool_name=doc['tool_name'],
+                     api_name=doc['api_name'])
+    return store
+
+
 def process_retrieval_ducoment(documents_df):
     """
     Process the documents dataframe to create two dictionaries:
     1. A dictionary mapping docid to concatenated document details.
     2. A dictionary mapping the concatenated document details to a tab-separated string of category, tool, and API names.
 
+    build_api_corpus_store keeps the same data in a CorpusStore, with each text stored once.
+
     Args:
         documents_df (DataFrame): DataFrame containing document information.
 
@@ -110,24 +169,10 @@ def process_retrieval_ducoment(documents_df):
             - ir_corpus: Mapping of docid to concatenated document details.
             - corpus2tool: Mapping of concatenated document details to category, tool, and API names.
     """
+    store = build_api_corpus_store(documents_df)
     ir_corpus = {}
     corpus2tool = {}
-    for row in documents_df.itertuples():
-        doc = json.loads(row.document_content)
-        ir_corpus[row.docid] = (doc.get('category_name', '') or '') + ', ' + \
-                               (doc.get('tool_name', '') or '') + ', ' + \
-                               (doc.get('api_name', '') or '') + ', ' + \
-                               (doc.get('api_description', '') or '') + \
-                               ', required_params: ' + json.dumps(doc.get('required_parameters', '')) + \
-                               ', optional_params: ' + json.dumps(doc.get('optional_parameters', '')) + \
-                               ', return_schema: ' + json.dumps(doc.get('template_response', ''))
-        corpus2tool[(doc.get('category_name', '') or '') + ', ' + \
-                    (doc.get('tool_name', '') or '') + ', ' + \
-                    (doc.get('api_name', '') or '') + ', ' + \
-                    (doc.get('api_description', '') or '') + \
-                    ', required_params: ' + json.dumps(doc.get('required_parameters', '')) + \
-                    ', optional_params: ' + json.dumps(doc.get('optional_parameters', '')) + \
-                    ', return_schema: ' + json.dumps(doc.get('template_response', ''))] = doc['category_name'] + '\t' + \
-                                                                                          doc['tool_name'] + '\t' + doc[
-                                                                                              'api_name']
+    for row, (docid, text) in enumerate(zip(store.ids, store.texts)):
+        ir_corpus[docid] = text
+        corpus2tool[text] = '\t'.join(store.label(field, row) for field in ('category_name', 'tool_name', 'api_name'))
     return ir_corpus, corpus2tool
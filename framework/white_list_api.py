@@ -1,7 +1,8 @@
 import os
 import json
-import sys
+import argparse
 from framework.utils import standardize
+from framework.profiling import add_profile_args, profiled
 from tqdm import tqdm
 
 """
@@ -49,21 +50,23 @@ def get_white_list(tool_root_dir):
     return white_list
 
 
-def main():
-    if len(sys.argv) > 1:
-        tool_root_dir = sys.argv[1]
-    else:
-        tool_root_dir = r"\data\toolenv\tools"
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the white list of tools from the tool directory.")
+    parser.add_argument('tool_root_dir', type=str, nargs='?', default=r"\data\toolenv\tools", help="Root directory of the tool JSON files")
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    tool_root_dir = args.tool_root_dir
 
-    white_list = get_white_list(tool_root_dir)
-    print(white_list)
+    with profiled(args, "white_list"):
+        white_list = get_white_list(tool_root_dir)
+        print(white_list)
 
-    path = 'data/white_list.json'
+        path = 'data/white_list.json'
 
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(white_list, f, ensure_ascii=False, indent=4)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(white_list, f, ensure_ascii=False, indent=4)
 
-    print(f'White list has been saved to {path}')
+        print(f'White list has been saved to {path}')
 
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+"""
+Deterministic parsing and structural scoring of planned workflows.
+"""
+
+import re
+import ast
+import json
+from collections import namedtuple
+from framework.utils import standardize
+
+WorkflowNode = namedtuple("WorkflowNode", ["kind", "name"])
+
+node_label_pattern = re.compile(r'^\s*([^()]*?)\s*(?:\((.*)\))?\s*$', re.DOTALL)
+quoted_pattern = re.compile(r'\'([^\']*)\'|"([^"]*)"')
+function_call_pattern = re.compile(r'[\'"]function_call[\'"]\s*:\s*\{\s*[\'"]name[\'"]\s*:\s*[\'"]([^\'"]+)[\'"]')
+
+
+def classify_node(label):
+    """
+    Map a node label such as 'HTTP request (get_weather)' to a WorkflowNode.
+
+    Args:
+        label (str): A single entry of the <workflow> list.
+
+    Returns:
+        WorkflowNode: kind is one of start, end, http, llm, branch or other; name is the
+            text inside the parentheses (the API name for HTTP nodes) or the label itself.
+    """
+    match = node_label_pattern.match(label)
+    head, inner = (match.group(1), match.group(2)) if match else (label, None)
+    head_lower = head.lower()
+    if head_lower.startswith("start"):
+        kind = "start"
+    elif head_lower.startswith("end") or head_lower.startswith("finish"):
+        kind = "end"
+    elif head_lower.startswith("http"):
+        kind = "http"
+    elif head_lower.startswith("llm"):
+        kind = "llm"
+    elif head_lower.startswith("if"):
+        kind = "branch"
+    else:
+        kind = "other"
+    return WorkflowNode(kind, (inner if inner is not None else head).strip())
+
+
+def parse_workflow(workflow):
+    """
+    Parse the <workflow> content stored by process_responses into a node sequence.
+
+    Args:
+        workflow (str or list): e.g. "['Start', 'HTTP request (API name)', 'End']".
+
+    Returns:
+        list: List of WorkflowNode, empty if nothing could be parsed.
+    """
+    if isinstance(workflow, str):
+        try:
+            labels = ast.literal_eval(workflow.strip())
+        except (ValueError, SyntaxError):
+            labels = [single or double for single, double in quoted_pattern.findall(workflow)]
+    else:
+        labels = workflow
+    if not isinstance(labels, (list, tuple)):
+        return []
+    return [classify_node(str(label)) for label in labels if str(label).strip()]
+
+
+def extract_trajectory_apis(trajectory):
+    """
+    Extract the ordered API calls (excluding Finish) from a trajectory.
+
+    Args:
+        trajectory (str or list): A dialogue (list of messages), a list of dialogues as returned by
+            extract_successful_finish_trajectories (the first one is used), or its text form.
+
+    Returns:
+        list: Function names in call order.
+    """
+    if isinstance(trajectory, list) and trajectory and isinstance(trajectory[0], list):
+        trajectory = trajectory[0]
+    if isinstance(trajectory, list):
+        names = [(message.get("function_call") or {}).get("name") for message in trajectory]
+    else:
+        names = function_call_pattern.findall(trajectory if isinstance(trajectory, str) else json.dumps(trajectory))
+    return [name for name in names if name and name != "Finish"]
+
+
+def api_key(name):
+    """
+    Normalize an API name for matching: 'Get Weather' and 'get_weather_for_weatherapi' both map to 'get_weather'.
+    """
+    return standardize(name).split("_for_")[0]
+
+
+def longest_common_subsequence(a, b):
+    """
+    Length of the longest common subsequence of two sequences.
+    """
+    if not a or not b:
+        return 0
+    previous = [0] * (len(b) + 1)
+    for x in a:
+        current = [0]
+        for j, y in enumerate(b):
+            current.append(previous[j] + 1 if x == y else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+
+def structural_score(workflow, trajectory):
+    """
+    Cheap deterministic check of a planned workflow against its trajectory.
+
+    Args:
+        workflow (str or list): The <workflow> content.
+        trajectory (str or list): The trajectory the workflow was planned from.
+
+    Returns:
+        dict: {"valid", "errors", "coverage", "order", "score", "nodes"} where coverage is the share of
+            trajectory APIs that appear as HTTP nodes, order is the LCS alignment of both API sequences
+            normalized by the longer one, and score averages both (0 if the workflow is invalid).
+    """
+    nodes = parse_workflow(workflow)
+    errors = []
+    if not nodes:
+        errors.append("unparseable or empty workflow")
+    else:
+        if nodes[0].kind != "start":
+            errors.append("workflow does not begin with a Start node")
+        if nodes[-1].kind != "end":
+            errors.append("workflow does not finish with an End node")
+        if any(node.kind == "end" for node in nodes[:-1]):
+            errors.append("nodes follow an End node")
+
+    workflow_apis = [api_key(node.name) for node in nodes if node.kind == "http"]
+    trajectory_apis = [api_key(name) for name in extract_trajectory_apis(trajectory)]
+
+    if trajectory_apis:
+        coverage = len(set(trajectory_apis) & set(workflow_apis)) / len(set(trajectory_apis))
+        order = longest_common_subsequence(trajectory_apis, workflow_apis) / max(len(trajectory_apis), len(workflow_apis))
+    else:
+        coverage = order = 1.0 if not workflow_apis else 0.0
+
+    valid = not errors
+    return {
+        "valid": valid,
+        "errors": errors,
+        "coverage": coverage,
+        "order": order,
+        "score": (coverage + order) / 2 if valid else 0.0,
+        "nodes": [list(node) for node in nodes],
+    }